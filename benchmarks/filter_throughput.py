@@ -0,0 +1,135 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Micro-benchmark of the property filters on synthetic nodes and pods.
+
+    Compares the compiled plan (regexes and attribute getters built once)
+    against the previous approach of compiling the regex for every
+    candidate, and looking up the filter types on every run.
+
+    Usage:
+        python benchmarks/filter_throughput.py [number of items]
+"""
+
+import re
+import sys
+import time
+import logging
+
+from powerfulseal.k8s import Pod
+from powerfulseal.node import Node, NodeState
+from powerfulseal.policy.scenario import Scenario
+
+
+FILTERS = [
+    {"property": {"name": "name", "value": "item-[0-9]*[02468]$"}},
+    {"property": {"name": "state", "value": "NodeState.UP|Running"}},
+    {"property": {"name": "group", "value": "minion"}},
+]
+POD_FILTERS = FILTERS[:2]
+
+
+class BenchmarkScenario(Scenario):
+
+    def match(self):
+        return []
+
+    def act(self, items):
+        pass
+
+
+def legacy_match_property(scenario, candidate, criterion):
+    """ The way the property filters used to be evaluated.
+    """
+    attr = criterion.get("name")
+    attr = scenario.property_rewrite.get(attr, attr)
+    value = getattr(candidate, attr)
+    expr = re.compile(criterion.get("value"))
+    if type(value) is list:
+        return any([expr.match(str(v)) for v in value])
+    return expr.match(str(value))
+
+
+def legacy_filter(scenario, items, filters):
+    mapping = scenario.filter_methods()
+    for criterion in filters:
+        for filter_type in mapping.keys():
+            if filter_type in criterion:
+                params = criterion.get(filter_type)
+                items = [
+                    item for item in items
+                    if legacy_match_property(scenario, item, params)
+                ]
+                break
+    return items
+
+
+def make_nodes(count):
+    return [
+        Node(
+            id="id-%d" % i,
+            name="item-%d" % i,
+            ip="10.%d.%d.%d" % (i // 65536, i // 256 % 256, i % 256),
+            az="AZ%d" % (i % 3),
+            groups=["minion" if i % 10 else "master"],
+            no=i,
+            state=NodeState.UP if i % 7 else NodeState.DOWN,
+        )
+        for i in range(count)
+    ]
+
+
+def make_pods(count):
+    return [
+        Pod(
+            name="item-%d" % i,
+            namespace="ns-%d" % (i % 20),
+            uid="uid-%d" % i,
+            state="Running" if i % 7 else "Pending",
+            labels={"app": "app-%d" % (i % 100)},
+        )
+        for i in range(count)
+    ]
+
+
+def measure(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(count):
+    logging.disable(logging.CRITICAL)
+    for kind, items, filters in [
+        ("nodes", make_nodes(count), FILTERS),
+        ("pods", make_pods(count), POD_FILTERS),
+    ]:
+        scenario = BenchmarkScenario(name="benchmark", schema={"filters": filters})
+        plan = scenario.compile()
+        before, expected = measure(lambda: legacy_filter(scenario, items, filters))
+        after, result = measure(lambda: scenario.run_filters(items, plan.filters))
+        assert result == expected
+        print("%6d %s, %d filters -> %d items" % (count, kind, len(filters), len(result)))
+        print("    before: %.3fs (%d items/s)" % (before, count / before))
+        print("    after:  %.3fs (%d items/s)" % (after, count / after))
+        print("    speedup: %.1fx" % (before / after))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,116 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Micro-benchmark of K8sClient.get_nodes_groups on synthetic nodes.
+
+    Compares the set based grouping against the previous approach of
+    checking every IP against a list, for all the labels.
+
+    Usage:
+        python benchmarks/node_groups.py [number of nodes]
+"""
+
+import sys
+import time
+import logging
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from powerfulseal.k8s import K8sClient
+
+
+def make_k8s_nodes(count):
+    return [
+        SimpleNamespace(
+            metadata=SimpleNamespace(
+                name="node-%d" % i,
+                labels={
+                    "kubernetes.io/hostname": "node-%d" % i,
+                    "kubernetes.io/role": "master" if i % 50 == 0 else "node",
+                    "failure-domain.beta.kubernetes.io/zone": "zone-%d" % (i % 3),
+                    "node.kubernetes.io/instance-type": "m5.%d" % (i % 4),
+                    "pool": "pool-%d" % (i % 10),
+                },
+            ),
+            status=SimpleNamespace(addresses=[
+                SimpleNamespace(
+                    address="10.%d.%d.%d" % (i // 65536, i // 256 % 256, i % 256)),
+                SimpleNamespace(address="node-%d" % i),
+            ]),
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_get_nodes_groups(nodes):
+    """ The way the groups used to be built.
+    """
+    groups = dict()
+    for node in nodes:
+        labels = node.metadata.labels
+        addresses = node.status.addresses
+        ips = []
+        if addresses:
+            ips = [addr.address for addr in addresses]
+        for label, value in labels.items():
+            group = groups.get(value, [])
+            for ip in ips:
+                if ip not in group:
+                    group.append(ip)
+            groups[value] = group
+    return groups
+
+
+def measure(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(count, page_size=500):
+    logging.disable(logging.CRITICAL)
+    nodes = make_k8s_nodes(count)
+
+    def list_node(limit=None, _continue=None):
+        start = int(_continue or 0)
+        end = start + limit
+        token = str(end) if end < len(nodes) else None
+        return SimpleNamespace(
+            items=nodes[start:end],
+            metadata=SimpleNamespace(_continue=token),
+        )
+
+    with patch("powerfulseal.k8s.k8s_client.kubernetes"):
+        client = K8sClient(page_size=page_size)
+    client.client_corev1api.list_node = list_node
+
+    before, expected = measure(lambda: legacy_get_nodes_groups(nodes), repeat=1)
+    after, result = measure(client.get_nodes_groups)
+    selected, groups = measure(lambda: client.get_nodes_groups(
+        label_keys=["kubernetes.io/role", "pool"]))
+    assert result == dict((k, sorted(v)) for k, v in expected.items())
+    print("%d nodes, pages of %d" % (count, page_size))
+    print("    before:              %.3fs (%d groups)" % (before, len(expected)))
+    print("    after:               %.3fs (%d groups)" % (after, len(result)))
+    print("    after, 2 label keys: %.3fs (%d groups)" % (selected, len(groups)))
+    print("    speedup: %.1fx" % (before / after))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
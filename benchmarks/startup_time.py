@@ -0,0 +1,82 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+    Startup time of the cli, validating the example policy.
+
+    Runs `python -m powerfulseal.cli --validate-policy-file ...` in fresh
+    interpreters, and prints the best and median wall times, as well as
+    the heavy modules that got imported (there should be none).
+    Exits with 1 if the median is above the limit, to be usable in CI.
+
+    Usage:
+        python benchmarks/startup_time.py [runs] [limit in seconds]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLICY = os.path.join(ROOT, "tests", "policy", "example_config.yml")
+HEAVY_MODULES = ("boto3", "openstack", "kubernetes", "spur", "paramiko", "flask")
+
+CHECK_MODULES = """
+import sys
+from powerfulseal.cli.__main__ import main
+main(["--validate-policy-file", sys.argv[1]])
+print("imported:" + ",".join(m for m in %r if m in sys.modules))
+""" % (HEAVY_MODULES,)
+
+
+def run_once():
+    start = time.perf_counter()
+    subprocess.check_call(
+        [sys.executable, "-m", "powerfulseal.cli", "--validate-policy-file", POLICY],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def heavy_modules_imported():
+    output = subprocess.check_output(
+        [sys.executable, "-W", "ignore", "-c", CHECK_MODULES, POLICY],
+        cwd=ROOT,
+    )
+    last_line = output.decode().strip().splitlines()[-1]
+    return last_line[len("imported:"):]
+
+
+def run(runs, limit):
+    timings = sorted(run_once() for _ in range(runs))
+    median = timings[len(timings) // 2]
+    print("validate-policy-file, %d runs" % runs)
+    print("    best:   %.3fs" % timings[0])
+    print("    median: %.3fs" % median)
+    print("    heavy modules imported: %s" % (heavy_modules_imported() or "none"))
+    if median > limit:
+        print("Slower than the %.2fs limit" % limit)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 1.0,
+    ))
@@ -21,13 +21,17 @@ import textwrap
 import sys
 import os
 
-from ..node import NodeInventory
-from ..node.inventory import read_inventory_file_to_dict
-from ..clouddrivers import OpenStackDriver, AWSDriver, NoCloudDriver
-from ..execute import RemoteExecutor
-from ..k8s import K8sClient, K8sInventory
-from .pscmd import PSCmd
-from ..policy import PolicyRunner
+# Everything else is imported when used: the cloud SDKs, the kubernetes
+# client and paramiko take seconds to import, and validating a policy
+# doesn't need any of them. See benchmarks/startup_time.py
+
+def parse_tag(value):
+    """ Parses a key=value tag into a (key, value) tuple.
+    """
+    key, sep, tag_value = value.partition("=")
+    if not key or not sep:
+        raise argparse.ArgumentTypeError("expected KEY=VALUE, got %r" % value)
+    return key, tag_value
 
 def main(argv):
     """
@@ -55,8 +59,8 @@ def main(argv):
         help='Verbose logging.'
     )
 
-    # inventory related config
-    inventory_options = prog.add_mutually_exclusive_group(required=True)
+    # inventory related config (not needed to validate a policy)
+    inventory_options = prog.add_mutually_exclusive_group()
     inventory_options.add_argument('-i', '--inventory-file',
         default=os.environ.get("INVENTORY_FILE"),
         help='the inventory file of group of hosts to test'
@@ -66,6 +70,22 @@ def main(argv):
         help='will read all cluster nodes as inventory',
         action='store_true',
     )
+    prog.add_argument('--inventory-kubernetes-label',
+        dest='inventory_kubernetes_labels',
+        action='append',
+        help=('label key whose values become groups of nodes with '
+              '--inventory-kubernetes (can be repeated, defaults to all labels)'),
+    )
+    prog.add_argument('--inventory-snapshot',
+        default=os.environ.get("INVENTORY_SNAPSHOT"),
+        help=('file to save the resolved inventory to, and to boot from '
+              'on restart while it is reconciled in the background'),
+    )
+    prog.add_argument('--inventory-snapshot-max-age',
+        default=3600,
+        type=int,
+        help='ignore an inventory snapshot older than that many seconds',
+    )
 
     # ssh related options
     args_ssh = prog.add_argument_group('SSH settings')
@@ -85,9 +105,33 @@ def main(argv):
         default=os.environ.get("PS_PRIVATE_KEY"),
         help='Path to ssh private key',
     )
+    args_ssh.add_argument(
+        '--ssh-max-parallel',
+        default=int(os.environ.get("PS_SSH_MAX_PARALLEL", 1)),
+        type=int,
+        help='Maximum number of nodes to execute commands on concurrently',
+    )
+    args_ssh.add_argument(
+        '--ssh-timeout',
+        default=None,
+        type=float,
+        help='Timeout (seconds) for connecting and executing a command on a node',
+    )
+    args_ssh.add_argument(
+        '--ssh-pool-size',
+        default=int(os.environ.get("PS_SSH_POOL_SIZE", 32)),
+        type=int,
+        help='Maximum number of idle SSH connections kept for reuse (0 disables)',
+    )
+    args_ssh.add_argument(
+        '--ssh-pool-idle-timeout',
+        default=300,
+        type=float,
+        help='Seconds after which an idle SSH connection is closed',
+    )
 
-    # cloud driver related config
-    cloud_options = prog.add_mutually_exclusive_group(required=True)
+    # cloud driver related config (not needed to validate a policy)
+    cloud_options = prog.add_mutually_exclusive_group()
     cloud_options.add_argument('--open-stack-cloud',
         default=os.environ.get("OPENSTACK_CLOUD"),
         action='store_true',
@@ -103,6 +147,16 @@ def main(argv):
         action='store_true',
         help="don't use cloud provider",
     )
+    prog.add_argument('--aws-vpc-id',
+        default=os.environ.get("AWS_VPC_ID"),
+        help="only consider the AWS instances in this VPC",
+    )
+    prog.add_argument('--aws-tag',
+        default=[],
+        action='append',
+        type=parse_tag,
+        help="only consider the AWS instances with this tag (key=value), can be repeated",
+    )
     prog.add_argument('--open-stack-cloud-name',
         default=os.environ.get("OPENSTACK_CLOUD_NAME"),
         help="the name of the open stack cloud from your config file to use (if using config file)",
@@ -115,6 +169,41 @@ def main(argv):
         default=None,
         help='Location of kube-config file',
     )
+    args_kubernetes.add_argument(
+        '--kubernetes-page-size',
+        default=None,
+        type=int,
+        help='List pods and nodes in pages of this size (requires API server support for limit/continue)',
+    )
+    args_kubernetes.add_argument(
+        '--kubernetes-informer',
+        default=False,
+        action='store_true',
+        help='Keep an in-memory copy of all pods, updated with a watch, '
+             'instead of listing pods on every match',
+    )
+
+    # metrics
+    args_metrics = prog.add_argument_group('Metrics and profiling settings')
+    args_metrics.add_argument(
+        '--prometheus-port',
+        default=os.environ.get("PROMETHEUS_PORT"),
+        type=int,
+        help='serve Prometheus metrics on /metrics on this port, when running a policy',
+    )
+    args_metrics.add_argument(
+        '--prometheus-host',
+        default='0.0.0.0',
+        help='the address to serve the Prometheus metrics on',
+    )
+
+    args_metrics.add_argument(
+        '--profile',
+        default=None,
+        help='write the cProfile stats of the first policy loop to this file, '
+             'including the worker threads '
+             '(readable with pstats, snakeviz or flameprof)',
+    )
 
     # policy-related settings
     policy_options = prog.add_mutually_exclusive_group(required=True)
@@ -148,7 +237,21 @@ def main(argv):
     logger = logging.getLogger(__name__)
     logger.setLevel(log_level)
 
+    # validating only needs the schema, no clients and no network
+    if args.validate_policy_file:
+        from ..policy import PolicyRunner
+        PolicyRunner.validate_file(args.validate_policy_file)
+        print("All good, captain")
+        return
+    if not (args.inventory_file or args.inventory_kubernetes):
+        prog.error("one of the arguments -i/--inventory-file "
+                   "--inventory-kubernetes is required")
+    if not (args.open_stack_cloud or args.aws_cloud or args.no_cloud):
+        prog.error("one of the arguments --open-stack-cloud "
+                   "--aws-cloud --no-cloud is required")
+
     # build cloud provider driver
+    from ..clouddrivers import OpenStackDriver, AWSDriver, NoCloudDriver
     logger.debug("Building the driver")
     if args.open_stack_cloud:
         logger.info("Building OpenStack driver")
@@ -157,45 +260,84 @@ def main(argv):
         )
     elif args.aws_cloud:
         logger.info("Building AWS driver")
-        driver = AWSDriver()
+        driver = AWSDriver(
+            tags=dict(args.aws_tag),
+            vpc_id=args.aws_vpc_id,
+        )
     else:
         logger.info("No driver - some functionality disabled")
         driver = NoCloudDriver()
 
 
     # build a k8s client
+    from ..k8s import K8sClient, K8sInventory, PodInformer
     kube_config = args.kube_config
-    logger.debug("Creating kubernetes client with config %d", kube_config)
-    k8s_client = K8sClient(kube_config=kube_config)
-    k8s_inventory = K8sInventory(k8s_client=k8s_client)
+    logger.debug("Creating kubernetes client with config %s", kube_config)
+    k8s_client = K8sClient(
+        kube_config=kube_config,
+        page_size=args.kubernetes_page_size,
+    )
+    informer = None
+    if args.kubernetes_informer:
+        logger.info("Starting the pod informer")
+        informer = PodInformer(k8s_client=k8s_client)
+        informer.start()
+        k8s_client.selector_cache.follow(k8s_client)
+    k8s_inventory = K8sInventory(k8s_client=k8s_client, informer=informer)
 
     # read the local inventory
-    logger.debug("Fetching the inventory")
-    if args.inventory_file:
-        groups_to_restrict_to = read_inventory_file_to_dict(
-            args.inventory_file
-        )
-    else:
+    from ..node import NodeInventory
+    from ..node.inventory import read_inventory_file_to_dict
+    def get_groups():
+        logger.debug("Fetching the inventory")
+        if args.inventory_file:
+            return read_inventory_file_to_dict(args.inventory_file)
         logger.info("Attempting to read the inventory from kubernetes")
-        groups_to_restrict_to = k8s_client.get_nodes_groups()
-
-    logger.debug("Restricting inventory to %s" % groups_to_restrict_to)
+        return k8s_client.get_nodes_groups(
+            label_keys=args.inventory_kubernetes_labels,
+        )
 
-    inventory = NodeInventory(
-        driver=driver,
-        restrict_to_groups=groups_to_restrict_to,
-    )
-    inventory.sync()
+    inventory = NodeInventory(driver=driver)
+    snapshot, snapshot_data = None, None
+    if args.inventory_snapshot:
+        from ..node import InventorySnapshot
+        snapshot = InventorySnapshot(
+            args.inventory_snapshot,
+            max_age=args.inventory_snapshot_max_age,
+        )
+        snapshot_data = snapshot.load()
+    if snapshot_data is not None:
+        # boot from the snapshot, and catch up in the background
+        snapshot.restore(inventory, snapshot_data)
+        snapshot.reconcile(inventory, get_groups)
+    else:
+        groups_to_restrict_to = get_groups()
+        logger.debug("Restricting inventory to %s" % groups_to_restrict_to)
+        inventory.set_groups(groups_to_restrict_to)
+        inventory.sync()
+        if snapshot is not None:
+            snapshot.save(inventory)
 
     # create an executor
+    from ..execute import RemoteExecutor, SSHConnectionPool
+    pool = None
+    if args.ssh_pool_size > 0:
+        pool = SSHConnectionPool(
+            max_size=args.ssh_pool_size,
+            idle_timeout=args.ssh_pool_idle_timeout,
+        )
     executor = RemoteExecutor(
         user=args.remote_user,
         ssh_allow_missing_host_keys=args.ssh_allow_missing_host_keys,
         ssh_path_to_private_key=args.ssh_path_to_private_key,
+        max_parallel=args.ssh_max_parallel,
+        timeout=args.ssh_timeout,
+        pool=pool,
     )
 
     if args.interactive:
         # create a command parser
+        from .pscmd import PSCmd
         cmd = PSCmd(
             inventory=inventory,
             driver=driver,
@@ -212,12 +354,16 @@ def main(argv):
                 input()
             except KeyboardInterrupt:
                 sys.exit(0)
-    elif args.validate_policy_file:
-        PolicyRunner.validate_file(args.validate_policy_file)
-        print("All good, captain")
     elif args.run_policy_file:
+        from ..policy import PolicyRunner, LoggingHook
         policy = PolicyRunner.validate_file(args.run_policy_file)
-        PolicyRunner.run(policy, inventory, k8s_inventory, driver, executor)
+        if args.prometheus_port is not None:
+            from ..metrics.server import start_server
+            start_server(args.prometheus_host, args.prometheus_port)
+        PolicyRunner.run(policy, inventory, k8s_inventory, driver, executor,
+            hooks=[LoggingHook()],
+            profile=args.profile,
+        )
 
 
 def start():
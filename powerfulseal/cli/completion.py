@@ -0,0 +1,95 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from bisect import bisect_left
+
+
+class PrefixIndex():
+    """ Case-insensitive prefix lookups over a set of values,
+        kept as a sorted array and searched with bisect, so that
+        a lookup costs O(log n + k) for k results.
+    """
+
+    def __init__(self, values=()):
+        self.update(values)
+
+    def update(self, values):
+        """ Replaces the indexed values.
+        """
+        pairs = sorted(set(
+            (str(value).lower(), str(value))
+            for value in values
+            if value is not None
+        ))
+        self.keys = [key for key, _ in pairs]
+        self.values = [value for _, value in pairs]
+
+    def complete(self, prefix=None):
+        """ Returns the values starting with the prefix (all if None).
+        """
+        prefix = (prefix or "").lower()
+        position = bisect_left(self.keys, prefix)
+        results = []
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            results.append(self.values[position])
+            position += 1
+        return results
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class CompletionIndex():
+    """ Everything the interactive shell completes, indexed in memory.
+
+        Refreshed explicitly (on sync, and when namespaces or deployments
+        are listed), so that completing never calls any API.
+    """
+
+    NODE_ATTRIBUTES = ("ip", "id", "name", "no")
+
+    def __init__(self):
+        self.nodes = PrefixIndex()
+        self.namespaces = PrefixIndex()
+        self.deployments = dict()
+
+    def update_nodes(self, inventory):
+        """ Indexes the AZs, groups and node attributes of an inventory.
+        """
+        values = ["all"]
+        values.extend(inventory.get_azs())
+        values.extend(inventory.get_groups())
+        for node in inventory.find_nodes():
+            for attr in self.NODE_ATTRIBUTES:
+                values.append(getattr(node, attr))
+            # "UP", not "NodeState.UP", so that "up" completes it
+            values.append(node.state.name)
+        self.nodes.update(values)
+
+    def update_namespaces(self, namespaces):
+        self.namespaces.update(namespaces)
+        # forget the deployments of the namespaces that are gone
+        for namespace in set(self.deployments) - set(namespaces):
+            del self.deployments[namespace]
+
+    def update_deployments(self, namespace, deployments):
+        self.deployments.setdefault(namespace, PrefixIndex()).update(deployments)
+
+    def complete_deployments(self, namespace, prefix=None):
+        index = self.deployments.get(namespace)
+        if index is None:
+            return []
+        return index.complete(prefix)
@@ -31,6 +31,7 @@ except:
 from ..execute import (
     RemoteExecutor,
 )
+from .completion import CompletionIndex
 
 DEFAULT_COLOR_KEYWORDS = {
     "UP": "green",
@@ -84,35 +85,30 @@ class PSCmd(cmd.Cmd):
         self.prompt = "(seal) $ "
         self.executor = executor
         self.k8s_inventory = k8s_inventory
+        self.completion = CompletionIndex()
+        self.refresh_completion()
 
-    def completedefault(self, text, line, begidx, endidx):
-        suggestions = []
-        text_lower = text.lower()
+    def refresh_completion(self):
+        """ Rebuilds the completion index from the inventories.
+            Completers only read the index, and never call the APIs.
+        """
+        self.completion.update_nodes(self.inventory)
         try:
-            # try to match AZ
-            for az in self.inventory.get_azs():
-                if text_lower in az.lower():
-                    suggestions.append(str(az))
-            # try to match group name
-            for group in self.inventory.get_groups():
-                if text_lower in group.lower():
-                    suggestions.append(str(group))
-            # try to match name, id, state, ip
-            for node in self.inventory.find_nodes():
-                for attr in ["ip", "id", "state", "name", "no"]:
-                    val = str(getattr(node, attr))
-                    if text_lower in val.lower():
-                        suggestions.append(val)
-            # extras
-            for extra in ("all",):
-                if extra.lower().startswith(text.lower()):
-                    suggestions.append(extra)
+            self.refresh_k8s_completion(self.k8s_inventory.find_namespaces())
         except Exception as e:
-            # sadly, if an exception is thrown here, it's just
-            # silently swallowed...
             print(e)
 
-        return suggestions
+    def refresh_k8s_completion(self, namespaces):
+        """ Indexes the namespaces, and the deployments of each of them.
+        """
+        self.completion.update_namespaces(namespaces)
+        for namespace in namespaces:
+            self.completion.update_deployments(
+                namespace, self.k8s_inventory.find_deployments(namespace),
+            )
+
+    def completedefault(self, text, line, begidx, endidx):
+        return self.completion.nodes.complete(text)
 
 
     ###########################################################################
@@ -139,8 +135,14 @@ class PSCmd(cmd.Cmd):
         """
         Synchronises the state with the remote API
         """
-        self.inventory.sync()
+        diff = self.inventory.sync()
+        self.refresh_completion()
         self.do_nodes("")
+        print("Added {added}, removed {removed}, changed {changed}".format(
+            added=len(diff.added),
+            removed=len(diff.removed),
+            changed=len(diff.changed),
+        ))
 
     def do_zones(self, line):
         """
@@ -161,24 +163,30 @@ class PSCmd(cmd.Cmd):
         Brings up a subset of machines
         """
         cmd = Command(line)
-        for node in self.inventory.find_nodes(cmd.get(0)):
+        nodes = list(self.inventory.find_nodes(cmd.get(0)))
+        for node in nodes:
             print("Starting %s" % (node))
-            try:
-                self.driver.start(node)
-            except Exception as e:
-                print(e)
+        try:
+            failures = self.driver.start_many(nodes)
+        except Exception as e:
+            return print(e)
+        for node, error in failures:
+            print("%s: %s" % (node, error))
 
     def do_stop(self, line):
         """
         Brings down a subset of machines
         """
         cmd = Command(line)
-        for node in self.inventory.find_nodes(cmd.get(0)):
+        nodes = list(self.inventory.find_nodes(cmd.get(0)))
+        for node in nodes:
             print("Stopping %s" % (node))
-            try:
-                self.driver.stop(node)
-            except Exception as e:
-                print(e)
+        try:
+            failures = self.driver.stop_many(nodes)
+        except Exception as e:
+            return print(e)
+        for node, error in failures:
+            print("%s: %s" % (node, error))
 
     def do_delete(self, line):
         """
@@ -216,10 +224,17 @@ class PSCmd(cmd.Cmd):
         """
         Executes a line in shell on specified boxes
         """
+        # in sequential mode, print the results as they come,
+        # otherwise fan out to all the nodes at once
+        nodes = list(nodes)
+        if self.executor.max_parallel > 1:
+            batches = [nodes]
+        else:
+            batches = [[node] for node in nodes]
         try:
-            for node in nodes:
+            for batch in batches:
                 for key, value in self.executor.execute(
-                    command, nodes=[node]
+                    command, nodes=batch
                 ).items():
                     if value["ret_code"] > 0:
                         print(colored("-" * 80, "red"))
@@ -237,6 +252,16 @@ class PSCmd(cmd.Cmd):
             print(colored("-" * 80, "red"))
             print(colored("Interrupted by user", "red"))
 
+    def do_ssh_pool(self, line):
+        """
+        Prints the SSH connection pool statistics
+        """
+        pool = self.executor.pool
+        if pool is None:
+            return print("SSH connection pool disabled")
+        for key, value in sorted(pool.stats().items()):
+            print("%s: %s" % (key, value))
+
     def do_exec(self, line, prefix=None):
         """
         Executes a line in shell on specified boxes
@@ -299,14 +324,19 @@ class PSCmd(cmd.Cmd):
         """
             Prints all the namespaces available
         """
-        for namespace in self.k8s_inventory.find_namespaces():
+        namespaces = self.k8s_inventory.find_namespaces()
+        for namespace in namespaces:
             print(namespace)
+        try:
+            self.refresh_k8s_completion(namespaces)
+        except Exception as e:
+            print(e)
 
     def complete_deployments(self, text, line, begidx, endidx):
         """
             Auto-complete for k8s deployments
         """
-        return filter_text_insensitive(self.k8s_inventory.find_namespaces(), text)
+        return self.completion.namespaces.complete(text)
 
     def do_deployments(self, line):
         """
@@ -315,10 +345,12 @@ class PSCmd(cmd.Cmd):
             deployments [namespace=default]
         """
         cmd = Command(line)
-        namespace = cmd.get(0)
-        for deploy in self.k8s_inventory.find_deployments(
+        namespace = cmd.get(0) or "default"
+        deployments = self.k8s_inventory.find_deployments(
             namespace=namespace,
-        ):
+        )
+        self.completion.update_deployments(namespace, deployments)
+        for deploy in deployments:
             print(deploy)
 
     def complete_pods(self, text, line, begidx, endidx):
@@ -328,7 +360,7 @@ class PSCmd(cmd.Cmd):
         cmd = Command(line)
         namespace = cmd.get(1)
         if len(cmd) == 1 or (len(cmd) == 2 and not cmd.finished):
-            return filter_text_insensitive(self.k8s_inventory.find_namespaces(), namespace)
+            return self.completion.namespaces.complete(namespace)
         return []
 
     def do_pods(self, line):
@@ -354,10 +386,10 @@ class PSCmd(cmd.Cmd):
         cmd = Command(line)
         namespace = cmd.get(1)
         if len(cmd) == 1 or (len(cmd) == 2 and not cmd.finished):
-            return filter_text_insensitive(self.k8s_inventory.find_namespaces(), namespace)
+            return self.completion.namespaces.complete(namespace)
         else:
             op = cmd.get(2)
-            return filter_text_insensitive(self.k8s_inventory.find_deployments(namespace), op)
+            return self.completion.complete_deployments(namespace, op)
 
     def do_pods_for_deployment(self, line):
         """
@@ -391,7 +423,11 @@ class PSCmd(cmd.Cmd):
         """
             Auto-complete for k8s pods killing
         """
-        # TODO
+        cmd = Command(line)
+        if len(cmd) == 1 or (len(cmd) == 2 and not cmd.finished):
+            return filter_text_insensitive(
+                [str(pod.num) for pod in self.k8s_inventory.last_pods], cmd.get(1),
+            )
         return []
 
     def do_kill(self, line):
@@ -1,11 +1,15 @@
 import logging
-import boto3
+import ipaddress
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from . import AbstractDriver
 from ..node import Node, NodeState
 
 
 def create_connection_from_config():
     """ Creates a new aws api connection """
+    # imported here, as boto3 is slow to import and not needed to validate
+    import boto3
     conn = boto3.resource('ec2')
     return conn
 
@@ -29,6 +33,23 @@ MAPPING_STATES_STATUS = {
 def server_status_to_state(status):
     return MAPPING_STATES_STATUS.get(status['Name'].upper(), NodeState.UNKNOWN)
 
+class Instance(object):
+    """ Lightweight view of an instance returned by describe_instances,
+        with the same attributes as boto3's ec2.Instance that we use.
+    """
+
+    __slots__ = ("id", "private_ip_address", "public_ip_address", "placement", "state")
+
+    def __init__(self, data):
+        self.id = data.get("InstanceId")
+        self.private_ip_address = data.get("PrivateIpAddress")
+        self.public_ip_address = data.get("PublicIpAddress")
+        self.placement = data.get("Placement", {})
+        self.state = data.get("State", {})
+
+    def __repr__(self):
+        return "Instance(%s)" % self.id
+
 def create_node_from_server(server, ip):
     """ Translate AWS EC2 Instance representation into a Node object.
     """
@@ -43,36 +64,138 @@ def create_node_from_server(server, ip):
 class AWSDriver(AbstractDriver):
     """
         Concrete implementation of the AWS cloud driver.
+
+        When synced with a list of IPs, only the instances with these
+        private or public IPs are fetched, using describe_instances filters.
+        The results can further be restricted by tags and VPC.
     """
 
-    def __init__(self, cloud=None, conn=None, logger=None):
+    reports_states = True
+
+    # maximum number of values in a single describe_instances filter
+    MAX_FILTER_VALUES = 200
+
+    # maximum number of instance ids in a single start/stop/terminate call
+    MAX_INSTANCE_IDS = 1000
+
+    def __init__(self, cloud=None, conn=None, logger=None,
+                 tags=None, vpc_id=None, max_parallel=4):
         self.logger = logger or logging.getLogger(__name__)
-        self.conn = create_connection_from_config()
-        self.instances = []
+        self.conn = conn or create_connection_from_config()
+        self.tags = tags or {}
+        self.vpc_id = vpc_id
+        self.max_parallel = max_parallel
+        self.remote_servers = []
 
-    def sync(self):
-        """ Downloads a fresh set of nodes form the API.
+    @property
+    def remote_servers(self):
+        return self._remote_servers
+
+    @remote_servers.setter
+    def remote_servers(self, servers):
+        """ Setting new servers invalidates the IP index.
         """
-        self.logger.info("Synchronizing remote nodes")
+        self._remote_servers = servers
+        self._servers_by_ip = None
+
+    def sync(self, ips=None):
         """ Downloads a fresh set of nodes form the API.
         """
         self.logger.info("Synchronizing remote nodes")
-        self.remote_servers = self.conn.instances.all()
-        self.amount_of_servers = list(self.conn.instances.all())
-        self.logger.info("Fetched %s remote servers" % len(self.amount_of_servers))
+        queries = self.build_queries(ips)
+        if len(queries) > 1 and self.max_parallel > 1:
+            workers = min(self.max_parallel, len(queries))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(self.describe_instances, queries))
+        else:
+            results = [self.describe_instances(query) for query in queries]
+        # the same instance can be found by both its private and public IP
+        instances = OrderedDict()
+        for result in results:
+            for instance in result:
+                instances.setdefault(instance.id, instance)
+        self.remote_servers = list(instances.values())
+        self.logger.info("Fetched %s remote servers" % len(self.remote_servers))
+        self.get_index()
+
+    def build_queries(self, ips=None):
+        """ Builds the lists of describe_instances filters to fetch
+            the instances with the given IPs, in chunks of the API limit.
+        """
+        filters = []
+        for key, value in sorted(self.tags.items()):
+            filters.append({"Name": "tag:%s" % key, "Values": [value]})
+        if self.vpc_id:
+            filters.append({"Name": "vpc-id", "Values": [self.vpc_id]})
+        if ips is None:
+            return [filters]
+        # skip the hostnames, we can only filter on IPs
+        valid_ips = []
+        for ip in ips:
+            try:
+                ipaddress.ip_address(ip)
+                valid_ips.append(ip)
+            except ValueError:
+                continue
+        queries = []
+        for start in range(0, len(valid_ips), self.MAX_FILTER_VALUES):
+            chunk = valid_ips[start:start + self.MAX_FILTER_VALUES]
+            for name in ("private-ip-address", "ip-address"):
+                queries.append(filters + [{"Name": name, "Values": chunk}])
+        return queries
+
+    def describe_instances(self, filters):
+        """ Fetches all the pages of instances matching the filters.
+        """
+        paginator = self.conn.meta.client.get_paginator("describe_instances")
+        instances = []
+        for page in paginator.paginate(Filters=filters):
+            for reservation in page.get("Reservations", []):
+                for data in reservation.get("Instances", []):
+                    instances.append(Instance(data))
+        return instances
+
+    def get_index(self):
+        """ Returns the IP -> instance index, building it if needed.
+            If many instances share an IP, the first one wins.
+        """
+        if self._servers_by_ip is None:
+            index = dict()
+            for server in self.remote_servers:
+                addresses = [addr for addr in get_all_ips(server) if addr]
+                if not addresses:
+                    self.logger.warning("No addresses found: %s", server)
+                for addr in addresses:
+                    index.setdefault(addr, server)
+            self._servers_by_ip = index
+        return self._servers_by_ip
 
     def get_by_ip(self, ip):
         """ Retreive an instance of Node by its IP.
         """
-        for server in self.remote_servers:
-            addresses = get_all_ips(server)
-            if not addresses:
-                self.logger.warning("No addresses found: %s", server)
-            else:
-                for addr in addresses:
-                    if addr == ip:
-                        return create_node_from_server(server, ip)
-        return None
+        server = self.get_index().get(ip)
+        if server is None:
+            return None
+        return create_node_from_server(server, ip)
+
+    def get_state(self, node):
+        """ Fetches the current state of a Node.
+        """
+        return self.get_states([node]).get(node.id, NodeState.UNKNOWN)
+
+    def get_states(self, nodes):
+        """ Fetches the current states of many Nodes, with one
+            describe_instances per chunk of instance ids.
+        """
+        ids = [node.id for node in nodes]
+        states = dict()
+        for start in range(0, len(ids), self.MAX_FILTER_VALUES):
+            chunk = ids[start:start + self.MAX_FILTER_VALUES]
+            for instance in self.describe_instances(
+                [{"Name": "instance-id", "Values": chunk}]
+            ):
+                states[instance.id] = server_status_to_state(instance.state)
+        return states
 
     def stop(self, node):
         """ Stop a Node.
@@ -88,3 +211,41 @@ class AWSDriver(AbstractDriver):
         """ Delete a Node permanently.
         """
         self.conn.instances.filter(InstanceIds=(node.id.split())).terminate()
+
+    def stop_many(self, nodes):
+        """ Stop many Nodes, with one API call per chunk of instances.
+        """
+        return self.batch_call("stop_instances", nodes, self.stop)
+
+    def start_many(self, nodes):
+        """ Start many Nodes, with one API call per chunk of instances.
+        """
+        return self.batch_call("start_instances", nodes, self.start)
+
+    def delete_many(self, nodes):
+        """ Delete many Nodes permanently, with one API call per chunk
+            of instances.
+        """
+        return self.batch_call("terminate_instances", nodes, self.delete)
+
+    def batch_call(self, operation, nodes, fallback):
+        """ Calls the EC2 operation on the nodes, in chunks of the API limit.
+            A single bad instance id fails the whole call, so when a chunk
+            fails, its nodes are retried one by one with the fallback.
+            Returns a list of (node, exception) for the nodes that failed.
+        """
+        method = getattr(self.conn.meta.client, operation)
+        nodes = list(nodes)
+        failures = []
+        for start in range(0, len(nodes), self.MAX_INSTANCE_IDS):
+            chunk = nodes[start:start + self.MAX_INSTANCE_IDS]
+            try:
+                method(InstanceIds=[node.id for node in chunk])
+            except Exception as e:
+                if len(chunk) == 1:
+                    failures.append((chunk[0], e))
+                    continue
+                self.logger.warning("Batch %s failed, retrying one by one: %s",
+                    operation, e)
+                failures.extend(self.apply_each(fallback, chunk))
+        return failures
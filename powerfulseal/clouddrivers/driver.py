@@ -23,14 +23,41 @@ class AbstractDriver(metaclass=abc.ABCMeta):
         All concrete drivers should implement this.
     """
 
+    # whether get_state reports the actual states of the nodes (drivers
+    # implementing it set it), there's no point waiting for a state otherwise
+    reports_states = False
+
     @abc.abstractmethod
-    def sync(self):
+    def sync(self, ips=None):
+        """ Downloads a fresh set of nodes from the API.
+            If ips are given, the driver can restrict itself to the nodes
+            with these IPs.
+        """
         pass #pragma: no cover
 
     @abc.abstractmethod
     def get_by_ip(self, ip):
         pass #pragma: no cover
 
+    def get_by_ips(self, ips):
+        """ Retrieves the Nodes for many IPs at once.
+            Returns a dict of IP -> Node (or None, if not found).
+            Drivers can override it to do better than one lookup per IP.
+        """
+        return dict((ip, self.get_by_ip(ip)) for ip in ips)
+
+    def get_state(self, node):
+        """ Fetches the current state of a Node from the API.
+        """
+        raise NotImplementedError("%s can't fetch node states" % type(self).__name__)
+
+    def get_states(self, nodes):
+        """ Fetches the current states of many Nodes.
+            Returns a dict of node id -> NodeState.
+            Drivers can override it to do better than one call per node.
+        """
+        return dict((node.id, self.get_state(node)) for node in nodes)
+
     @abc.abstractmethod
     def stop(self, node):
         pass #pragma: no cover
@@ -42,3 +69,34 @@ class AbstractDriver(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def delete(self, node):
         pass #pragma: no cover
+
+    def stop_many(self, nodes):
+        """ Stops many Nodes.
+            Returns a list of (node, exception) for the nodes that failed.
+            Drivers can override it to act on many nodes per API call.
+        """
+        return self.apply_each(self.stop, nodes)
+
+    def start_many(self, nodes):
+        """ Starts many Nodes.
+            Returns a list of (node, exception) for the nodes that failed.
+        """
+        return self.apply_each(self.start, nodes)
+
+    def delete_many(self, nodes):
+        """ Deletes many Nodes permanently.
+            Returns a list of (node, exception) for the nodes that failed.
+        """
+        return self.apply_each(self.delete, nodes)
+
+    def apply_each(self, method, nodes):
+        """ Calls the method on the nodes one by one, carrying on
+            after a failure.
+        """
+        failures = []
+        for node in nodes:
+            try:
+                method(node)
+            except Exception as e:
+                failures.append((node, e))
+        return failures
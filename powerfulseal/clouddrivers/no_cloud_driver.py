@@ -30,10 +30,12 @@ class NoCloudDriver(AbstractDriver):
         Concrete implementation of a noop driver
     """
 
+    reports_states = False
+
     def __init__(self, logger=None):
         self.logger = logger or logging.getLogger(__name__)
 
-    def sync(self):
+    def sync(self, ips=None):
         """ Noop
         """
         self.logger.error(
@@ -51,6 +53,11 @@ class NoCloudDriver(AbstractDriver):
             state=NodeState.UNKNOWN
         )
 
+    def get_state(self, node):
+        """ Noop
+        """
+        return NodeState.UNKNOWN
+
     def stop(self, node):
         """ Noop
         """
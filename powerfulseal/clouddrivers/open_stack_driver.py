@@ -15,13 +15,14 @@
 
 
 import logging
-from openstack import connection, config
 from . import AbstractDriver
 from ..node import Node, NodeState
 
 
 def create_connection_from_config(name=None):
     """ Creates a new open stack connection """
+    # imported here, as the SDK is slow to import and not needed to validate
+    from openstack import connection, config
     occ = config.OpenStackConfig()
     cloud = occ.get_one_cloud(name)
     return connection.from_config(cloud_config=cloud)
@@ -66,30 +67,60 @@ class OpenStackDriver(AbstractDriver):
         Concrete implementation of the OpenStack cloud driver.
     """
 
+    reports_states = True
+
     def __init__(self, cloud=None, conn=None, logger=None):
         self.logger = logger or logging.getLogger(__name__)
         self.conn = conn or create_connection_from_config(cloud)
         self.remote_servers = []
 
-    def sync(self):
+    @property
+    def remote_servers(self):
+        return self._remote_servers
+
+    @remote_servers.setter
+    def remote_servers(self, servers):
+        """ Setting new servers invalidates the IP index.
+        """
+        self._remote_servers = servers
+        self._servers_by_ip = None
+
+    def sync(self, ips=None):
         """ Downloads a fresh set of nodes form the API.
         """
         self.logger.info("Synchronizing remote nodes")
         self.remote_servers = list(self.conn.compute.servers())
         self.logger.info("Fetched %s remote servers" % len(self.remote_servers))
+        self.get_index()
+
+    def get_index(self):
+        """ Returns the IP -> server index, building it if needed.
+            If many servers share an IP, the first one wins.
+        """
+        if self._servers_by_ip is None:
+            index = dict()
+            for server in self.remote_servers:
+                addresses = get_all_ips(server)
+                if not addresses:
+                    self.logger.warning("No addresses found: %s", server)
+                for addr in addresses:
+                    index.setdefault(addr, server)
+            self._servers_by_ip = index
+        return self._servers_by_ip
 
     def get_by_ip(self, ip):
         """ Retreive an instance of Node by its IP.
         """
-        for server in self.remote_servers:
-            addresses = get_all_ips(server)
-            if not addresses:
-                self.logger.warning("No addresses found: %s", server)
-            else:
-                for addr in addresses:
-                    if addr == ip:
-                        return create_node_from_server(server)
-        return None
+        server = self.get_index().get(ip)
+        if server is None:
+            return None
+        return create_node_from_server(server)
+
+    def get_state(self, node):
+        """ Fetches the current state of a Node.
+        """
+        server = self.conn.compute.get_server(node.id)
+        return server_status_to_state(server.status)
 
     def stop(self, node):
         """ Stop a Node.
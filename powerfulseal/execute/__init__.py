@@ -15,3 +15,4 @@
 
 
 from .remote_executor import RemoteExecutor
+from .ssh_pool import SSHConnectionPool
@@ -1,4 +1,3 @@
-
 # Copyright 2017 Bloomberg Finance L.P.
 #
 # Licensed under the Apache License, Version 2.0 (the "License");
@@ -14,48 +13,138 @@
 # limitations under the License.
 
 
+import time
+from concurrent.futures import ThreadPoolExecutor
 import spur
+from spur import RunProcessError
+from ..metrics import SSH_SECONDS, profiled
 
 
 class RemoteExecutor(object):
     """ Executes commands on Node instances via SSH.
         Assumes password-less setup.
+
+        By default, nodes are visited one at a time. Setting `max_parallel`
+        fans the command out to up to that many nodes concurrently,
+        and `timeout` bounds the time spent on any single node.
+        If a `pool` is given, SSH connections are reused between commands.
     """
 
     PREFIX = ["sh", "-c"]
+    POLL_INTERVAL = 0.1
 
     def __init__(self, nodes=None, user="cloud-user",
-                 ssh_allow_missing_host_keys=False, ssh_path_to_private_key=None):
+                 ssh_allow_missing_host_keys=False, ssh_path_to_private_key=None,
+                 max_parallel=1, timeout=None, pool=None):
         self.nodes = nodes or []
         self.user = user
         self.missing_host_key = (spur.ssh.MissingHostKey.accept
                                  if ssh_allow_missing_host_keys
                                  else spur.ssh.MissingHostKey.raise_error)
         self.ssh_path_to_private_key = ssh_path_to_private_key
+        self.max_parallel = max_parallel
+        self.timeout = timeout
+        self.pool = pool
 
-    def execute(self, cmd, nodes=None, debug=False):
-        nodes = nodes or self.nodes
-        results = dict()
+    def execute(self, cmd, nodes=None, debug=False, max_parallel=None, timeout=None):
+        """ Executes the command on all the nodes.
+            Returns a dict of node ip -> result, in the order of the nodes.
+        """
+        nodes = list(nodes or self.nodes)
+        max_parallel = max_parallel or self.max_parallel
+        timeout = timeout or self.timeout
         cmd_full = self.PREFIX + [cmd]
-        for node in nodes:
-            shell = spur.SshShell(
+        if max_parallel <= 1 or len(nodes) <= 1:
+            results = [
+                self.execute_on_node(cmd_full, node, timeout=timeout)
+                for node in nodes
+            ]
+        else:
+            workers = min(max_parallel, len(nodes))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(
+                    profiled(
+                        lambda node: self.execute_on_node(cmd_full, node, timeout=timeout)
+                    ),
+                    nodes
+                ))
+        return dict(
+            (node.ip, result) for node, result in zip(nodes, results)
+        )
+
+    def execute_on_node(self, cmd_full, node, timeout=None):
+        """ Runs the command on a single node, never raises.
+            If a timeout is given, it applies both to establishing
+            the connection, and to the execution of the command.
+        """
+        shell = self.get_shell(node, timeout)
+        print("Executing '%s' on %s" % (cmd_full, node.name))
+        healthy = False
+        outcome = "error"
+        start = time.time()
+        try:
+            if timeout is None:
+                output = shell.run(cmd_full)
+            else:
+                output = self.run_with_timeout(shell, cmd_full, timeout)
+            healthy = True
+            outcome = "success"
+            return {
+                "ret_code": output.return_code,
+                "stdout": output.output.decode(),
+                "stderr": output.stderr_output.decode(),
+            }
+        except RunProcessError as e:
+            # the command failed, but the connection is fine
+            healthy = True
+            outcome = "failure"
+            return {
+                "ret_code": e.return_code or 1,
+                "stdout": e.output.decode(),
+                "stderr": e.stderr_output.decode(),
+                "error": str(e),
+            }
+        except Exception as e:
+            return {
+                "ret_code": 1,
+                "error": str(e),
+            }
+        finally:
+            SSH_SECONDS.observe(time.time() - start, outcome=outcome)
+            if self.pool is None:
+                shell.close()
+            else:
+                self.pool.release(shell, healthy=healthy)
+
+    def get_shell(self, node, timeout=None):
+        """ Returns a shell for the node, reusing a pooled one if possible.
+        """
+        if self.pool is not None:
+            return self.pool.acquire(
                 hostname=node.ip,
                 username=self.user,
-                missing_host_key=self.missing_host_key,
                 private_key_file=self.ssh_path_to_private_key,
+                missing_host_key=self.missing_host_key,
+                connect_timeout=timeout,
             )
-            print("Executing '%s' on %s" % (cmd_full, node.name))
-            try:
-                with shell:
-                    output = shell.run(cmd_full)
-                    results[node.ip] = {
-                        "ret_code": output.return_code,
-                        "stdout": output.output.decode(),
-                        "stderr": output.stderr_output.decode(),
-                    }
-            except Exception as e:
-                results[node.ip] = {
-                    "ret_code": 1,
-                    "error": str(e),
-                }
-        return results
+        return spur.SshShell(
+            hostname=node.ip,
+            username=self.user,
+            missing_host_key=self.missing_host_key,
+            private_key_file=self.ssh_path_to_private_key,
+            connect_timeout=timeout,
+        )
+
+    def run_with_timeout(self, shell, cmd_full, timeout):
+        """ Spawns the command and waits for it for at most `timeout` seconds.
+            On timeout, the caller discards the shell, tearing down the channel.
+        """
+        deadline = time.time() + timeout
+        process = shell.spawn(cmd_full)
+        while process.is_running():
+            if time.time() > deadline:
+                raise TimeoutError(
+                    "Timed out after %s seconds" % timeout
+                )
+            time.sleep(self.POLL_INTERVAL)
+        return process.wait_for_result()
@@ -0,0 +1,155 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+import spur
+
+
+def is_alive(shell):
+    """ Checks whether the SSH transport behind a spur shell is still usable.
+        Shells which haven't connected yet are considered alive.
+    """
+    # spur doesn't expose the paramiko client, so we need to dig it out
+    client = getattr(shell, "_client", None)
+    if client is None:
+        return True
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+
+class SSHConnectionPool(object):
+    """ Keeps authenticated SSH sessions alive between commands,
+        keyed by (host, user, private key, host key policy, connect timeout),
+        so that a shell is only reused with the settings it was opened with.
+
+        A shell is handed out to one caller at a time with acquire(),
+        and returned with release(). Idle shells are closed after
+        idle_timeout seconds (checked whenever a shell is acquired or
+        released), and at most max_size of them are kept.
+    """
+
+    def __init__(self, max_size=32, idle_timeout=300, logger=None):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> list of (shell, released_at), least recently used key first
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        # id(shell) -> key, for the shells currently handed out
+        self._in_use = dict()
+
+    def acquire(self, hostname, username=None, private_key_file=None,
+                missing_host_key=None, connect_timeout=None):
+        """ Returns a healthy pooled shell for the key, or a new one.
+        """
+        key = (hostname, username, private_key_file, missing_host_key,
+            connect_timeout)
+        with self._lock:
+            self._expire(time.time())
+            shell = self._pop_idle(key)
+            if shell is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                shell = spur.SshShell(
+                    hostname=hostname,
+                    username=username,
+                    missing_host_key=missing_host_key,
+                    private_key_file=private_key_file,
+                    connect_timeout=connect_timeout,
+                )
+            self._in_use[id(shell)] = key
+        return shell
+
+    def release(self, shell, healthy=True):
+        """ Gives the shell back to the pool.
+            Unhealthy shells are closed instead of being reused.
+        """
+        with self._lock:
+            self._expire(time.time())
+            key = self._in_use.pop(id(shell), None)
+            if key is None or not healthy or self.max_size <= 0:
+                self._close(shell)
+                return
+            self._idle.setdefault(key, []).append((shell, time.time()))
+            self._idle.move_to_end(key)
+            self._idle_count += 1
+            while self._idle_count > self.max_size:
+                oldest_key = next(iter(self._idle))
+                self._close(self._remove_idle(oldest_key, 0))
+                self.evictions += 1
+
+    def close(self):
+        """ Closes all the idle shells.
+        """
+        with self._lock:
+            for entries in self._idle.values():
+                for shell, _ in entries:
+                    self._close(shell)
+            self._idle.clear()
+            self._idle_count = 0
+
+    def stats(self):
+        """ Returns the pool counters, to see how many handshakes were saved.
+        """
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                idle=self._idle_count,
+                in_use=len(self._in_use),
+            )
+
+    def _pop_idle(self, key):
+        """ Returns the most recently used healthy idle shell for the key.
+        """
+        while self._idle.get(key):
+            shell = self._remove_idle(key, -1)
+            if is_alive(shell):
+                return shell
+            self.logger.debug("Dropping dead SSH connection to %s", key[0])
+            self._close(shell)
+        return None
+
+    def _remove_idle(self, key, index):
+        entries = self._idle[key]
+        shell, _ = entries.pop(index)
+        if not entries:
+            del self._idle[key]
+        self._idle_count -= 1
+        return shell
+
+    def _expire(self, now):
+        for key in list(self._idle.keys()):
+            while key in self._idle:
+                shell, released_at = self._idle[key][0]
+                if now - released_at < self.idle_timeout:
+                    break
+                self._close(self._remove_idle(key, 0))
+                self.evictions += 1
+
+    def _close(self, shell):
+        try:
+            shell.close()
+        except Exception:
+            self.logger.debug("Error closing SSH connection", exc_info=True)
@@ -17,3 +17,6 @@
 from .k8s_client import K8sClient
 from .k8s_inventory import K8sInventory
 from .pod import Pod
+from .pod_informer import PodInformer
+from .recovery_watcher import RecoveryWatcher
+from .selector_cache import SelectorCache
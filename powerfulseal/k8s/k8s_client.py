@@ -17,18 +17,26 @@
 import logging
 import kubernetes.client
 import kubernetes.config
+import kubernetes.watch
 from kubernetes.client.rest import ApiException
+from .selector_cache import SelectorCache
 
 
 class K8sClient():
     """ Higher level Kubernetes client.
+
+        If page_size is set, pods and nodes are listed in chunks of that
+        size, using the API's limit/continue tokens.
     """
 
-    def __init__(self, kube_config=None, logger=None):
+    def __init__(self, kube_config=None, logger=None, selector_cache=None,
+                 page_size=None):
         if kube_config:
             kubernetes.config.load_kube_config(config_file=kube_config)
         self.client_corev1api = kubernetes.client.CoreV1Api()
         self.client_extensionsv1beta1api = kubernetes.client.ExtensionsV1beta1Api()
+        self.selector_cache = selector_cache or SelectorCache()
+        self.page_size = page_size
 
         self.logger = logger or logging.getLogger(__name__)
         self.logger.info("Initializing with config: %s", kube_config)
@@ -50,38 +58,62 @@ class K8sClient():
         if payload:
             return ",".join(self.make_selector(*item) for item in payload.items())
 
-    def get_nodes_groups(self):
+    def get_nodes_groups(self, label_keys=None):
         """ Returns an inventory of nodes which form the Kubernetes cluster.
-            Returns a dict of group name -> list of nodes.
+            Returns a dict of group name -> sorted list of IPs, with
+            a group per value of the label keys (of all labels if None).
+
+            The nodes are streamed page by page (see page_size), and the
+            IPs accumulated in sets, so that it's linear in the number
+            of nodes and labels.
         """
-        nodes = self.list_nodes()
+        if label_keys is not None:
+            label_keys = set(label_keys)
         groups = dict()
-        for node in nodes:
-            name = node.metadata.name
-            labels = node.metadata.labels
-            addresses = node.status.addresses
-            ips = []
-            if addresses:
-                ips = [addr.address for addr in addresses]
-            for label, value in labels.items():
-                group = groups.get(value, [])
-                for ip in ips:
-                    if ip not in group:
-                        group.append(ip)
-                groups[value] = group
-        return groups
+        for node in self.iter_nodes():
+            addresses = node.status.addresses or []
+            ips = [addr.address for addr in addresses]
+            if not ips:
+                continue
+            for key, value in (node.metadata.labels or {}).items():
+                if label_keys is None or key in label_keys:
+                    groups.setdefault(value, set()).update(ips)
+        return dict((group, sorted(ips)) for group, ips in groups.items())
+
+    def paginate(self, method, **kwargs):
+        """ Calls a list method page by page, yielding the items
+            as they come, so that a single page is kept in memory.
+        """
+        _continue = None
+        while True:
+            if self.page_size:
+                kwargs.update(limit=self.page_size)
+                if _continue:
+                    kwargs.update(_continue=_continue)
+            try:
+                resp = method(**kwargs)
+            except ApiException as e:
+                self.logger.exception(e)
+                raise
+            for item in resp.items:
+                yield item
+            _continue = getattr(resp.metadata, "_continue", None)
+            if not self.page_size or not _continue:
+                return
+
+    def iter_nodes(self):
+        """
+            https://github.com/kubernetes-incubator/client-python/blob/master/kubernetes/docs/
+            CoreV1Api.md##list_node
+        """
+        return self.paginate(self.client_corev1api.list_node)
 
     def list_nodes(self):
         """
             https://github.com/kubernetes-incubator/client-python/blob/master/kubernetes/docs/
             CoreV1Api.md##list_node
         """
-        try:
-            resp = self.client_corev1api.list_node()
-            return resp.items
-        except ApiException as e:
-            self.logger.exception(e)
-            raise
+        return list(self.iter_nodes())
 
     def list_namespaces(self):
         """
@@ -129,7 +161,26 @@ class K8sClient():
             self.logger.exception(e)
             raise
 
-    def list_pods(self, namespace, labels=None, deployment_name=None, selector=None):
+    def get_deployment_labels(self, namespace, name):
+        """ Returns the match labels of a deployment's selector.
+            Cached, to avoid reading the deployment on every pod list.
+        """
+        return self.selector_cache.get(
+            namespace, name,
+            lambda: self.get_deployment(namespace, name).spec.selector.match_labels,
+        )
+
+    def get_pod(self, namespace, name):
+        """
+            https://github.com/kubernetes-incubator/client-python/blob/master/kubernetes/docs/
+            CoreV1Api.md#read_namespaced_pod
+        """
+        return self.client_corev1api.read_namespaced_pod(
+            namespace=namespace,
+            name=name,
+        )
+
+    def iter_pods(self, namespace, labels=None, deployment_name=None, selector=None):
         """
             https://github.com/kubernetes-incubator/client-python/blob/master/kubernetes/docs/
             CoreV1Api.md#list_namespaced_pod
@@ -137,9 +188,72 @@ class K8sClient():
         """
         selector = self.selector_or_labels(labels, selector)
         if deployment_name:
-            deployment = self.get_deployment(namespace, deployment_name)
-            selector = self.dict_to_selector(deployment.spec.selector.match_labels)
-        return self.client_corev1api.list_namespaced_pod(
+            selector = self.dict_to_selector(
+                self.get_deployment_labels(namespace, deployment_name)
+            )
+        return self.paginate(
+            self.client_corev1api.list_namespaced_pod,
             namespace=namespace,
             label_selector=selector,
-        ).items
+        )
+
+    def list_pods(self, namespace, labels=None, deployment_name=None, selector=None):
+        """
+            https://github.com/kubernetes-incubator/client-python/blob/master/kubernetes/docs/
+            CoreV1Api.md#list_namespaced_pod
+            If deployment_name is provided, it will ignore selector, and use the deployment's
+        """
+        return list(self.iter_pods(
+            namespace=namespace,
+            labels=labels,
+            deployment_name=deployment_name,
+            selector=selector,
+        ))
+
+    def iter_all_pods(self, selector=None, field_selector=None):
+        """
+            https://github.com/kubernetes-incubator/client-python/blob/master/kubernetes/docs/
+            CoreV1Api.md#list_pod_for_all_namespaces
+        """
+        return self.paginate(
+            self.client_corev1api.list_pod_for_all_namespaces,
+            label_selector=selector or "",
+            field_selector=field_selector or "",
+        )
+
+    def list_all_pods(self, selector=None, field_selector=None):
+        """
+            https://github.com/kubernetes-incubator/client-python/blob/master/kubernetes/docs/
+            CoreV1Api.md#list_pod_for_all_namespaces
+            Returns the whole response, to give access to the resource version.
+        """
+        try:
+            return self.client_corev1api.list_pod_for_all_namespaces(
+                label_selector=selector or "",
+                field_selector=field_selector or "",
+            )
+        except ApiException as e:
+            self.logger.exception(e)
+            raise
+
+    def watch_all_pods(self, resource_version, timeout_seconds=None):
+        """ Streams the pod events for all namespaces,
+            starting after the given resource version.
+            Returns a (watch, stream) tuple, use watch.stop() to interrupt.
+        """
+        watch = kubernetes.watch.Watch()
+        stream = watch.stream(
+            self.client_corev1api.list_pod_for_all_namespaces,
+            resource_version=resource_version,
+            timeout_seconds=timeout_seconds,
+        )
+        return watch, stream
+
+    def watch_all_deployments(self, timeout_seconds=None):
+        """ Streams the deployment events for all namespaces.
+        """
+        watch = kubernetes.watch.Watch()
+        return watch.stream(
+            self.client_extensionsv1beta1api.list_deployment_for_all_namespaces,
+            timeout_seconds=timeout_seconds,
+        )
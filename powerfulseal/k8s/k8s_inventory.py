@@ -19,13 +19,41 @@ from datetime import datetime
 from .pod import Pod
 
 
+def create_pod_from_item(item, num=None, keep_meta=False):
+    """ Translate a kubernetes V1Pod into a Pod object.
+        The V1Pod itself is only kept if keep_meta is set.
+    """
+    return Pod(
+        num=num,
+        name=item.metadata.name,
+        namespace=item.metadata.namespace,
+        uid=item.metadata.uid,
+        host_ip=item.status.host_ip,
+        ip=item.status.pod_ip,
+        container_ids=[
+            status.container_id
+            for status in item.status.container_statuses
+        ] if item.status.container_statuses else [],
+        state=item.status.phase,
+        labels=item.metadata.labels,
+        meta=item if keep_meta else None,
+    )
+
+
 class K8sInventory():
     """ Kubernetes inventory - deal with namespaces, deployments and pods.
         Also manages cache.
+
+        If given a started PodInformer, pods are looked up in its
+        in-memory index, instead of being listed from the API.
+        The raw API objects are only kept on the pods if keep_meta is set
+        (and never with an informer, which doesn't keep them).
     """
 
-    def __init__(self, k8s_client, logger=None):
+    def __init__(self, k8s_client, logger=None, informer=None, keep_meta=False):
         self.k8s_client = k8s_client
+        self.informer = informer
+        self.keep_meta = keep_meta
         self._cache_namespaces = []
         self._cache_last = None
         self.logger = logger or logging.getLogger(__name__)
@@ -67,29 +95,63 @@ class K8sInventory():
 
     def find_pods(self, namespace, selector=None, deployment_name=None):
         """ Find pods in a namespace, for a deployment or selector.
+            Uses the informer's cache if there is one.
         """
         namespace = namespace or "default"
-        pods = self.k8s_client.list_pods(
-            namespace=namespace,
-            selector=selector,
-            deployment_name=deployment_name,
-        )
-        pod_objects = [
-            Pod(
-                num=i,
-                name=item.metadata.name,
-                namespace=item.metadata.namespace,
-                uid=item.metadata.uid,
-                host_ip=item.status.host_ip,
-                ip=item.status.pod_ip,
-                container_ids=[
-                    status.container_id
-                    for status in item.status.container_statuses
-                ] if item.status.container_statuses else [],
-                state=item.status.phase,
-                labels=item.metadata.labels,
-                meta=item,
-            ) for i, item in enumerate(pods)
-        ] if pods else []
+        if self.informer is not None:
+            labels = None
+            if deployment_name:
+                labels = self.k8s_client.get_deployment_labels(namespace, deployment_name)
+                selector = None
+            pod_objects = [
+                pod.numbered(i)
+                for i, pod in enumerate(self.informer.find(
+                    namespace=namespace,
+                    selector=selector,
+                    labels=labels,
+                ))
+            ]
+        else:
+            # consume the pages as they come
+            pods = self.k8s_client.iter_pods(
+                namespace=namespace,
+                selector=selector,
+                deployment_name=deployment_name,
+            )
+            pod_objects = [
+                create_pod_from_item(item, num=i, keep_meta=self.keep_meta)
+                for i, item in enumerate(pods or [])
+            ]
         self.last_pods = pod_objects
         return pod_objects
+
+    def find_pods_in_namespaces(self, namespaces, field_selector=None):
+        """ Find pods in many namespaces at once, with a single
+            cluster-wide list, partitioned client-side.
+            Returns a dict of namespace -> list of pods.
+        """
+        namespaces = set(namespaces)
+        pods = dict((namespace, []) for namespace in namespaces)
+        pod_objects = []
+        if self.informer is not None:
+            for namespace in sorted(namespaces):
+                for pod in self.informer.find(namespace=namespace):
+                    pod = pod.numbered(len(pod_objects))
+                    pods[namespace].append(pod)
+                    pod_objects.append(pod)
+            self.last_pods = pod_objects
+            return pods
+        items = self.k8s_client.iter_all_pods(
+            field_selector=field_selector,
+        )
+        for item in items or []:
+            namespace_pods = pods.get(item.metadata.namespace)
+            if namespace_pods is None:
+                continue
+            pod = create_pod_from_item(
+                item, num=len(pod_objects), keep_meta=self.keep_meta,
+            )
+            namespace_pods.append(pod)
+            pod_objects.append(pod)
+        self.last_pods = pod_objects
+        return pods
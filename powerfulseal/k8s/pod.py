@@ -14,26 +14,76 @@
 # limitations under the License.
 
 
+import copy
+import sys
+from types import MappingProxyType
+
+
+def intern(value):
+    """ Interns strings, so that the values repeated across
+        many pods (namespaces, labels, states) are stored once.
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+# label sets shared by the pods with the same labels (replicas)
+SHARED_LABELS = dict()
+SHARED_LABELS_MAX_SIZE = 100000
+
+
+def shared_labels(labels):
+    """ Returns a read-only labels mapping, shared with all the other
+        pods having exactly the same labels.
+    """
+    key = tuple(sorted(
+        (intern(key), intern(value))
+        for key, value in (labels or {}).items()
+    ))
+    shared = SHARED_LABELS.get(key)
+    if shared is None:
+        if len(SHARED_LABELS) >= SHARED_LABELS_MAX_SIZE:
+            SHARED_LABELS.clear()
+        shared = SHARED_LABELS.setdefault(key, MappingProxyType(dict(key)))
+    return shared
 
 
 class Pod():
     """ Internal representation of a pod. Use to easily manipulate them
         internally.
+
+        Only keeps the fields the scenarios and the cli use, so that
+        many pods can be held in memory. The full API object is only
+        kept in `meta` if explicitly passed.
     """
 
+    __slots__ = (
+        "name", "namespace", "num", "uid", "host_ip", "ip",
+        "container_ids", "state", "labels", "meta",
+    )
+
     def __init__(self, name, namespace, num=None, uid=None, host_ip=None, ip=None,
                 container_ids=None, state=None, labels=None, meta=None):
         self.name = name
-        self.namespace = namespace
+        self.namespace = intern(namespace)
         self.num = num
         self.uid = uid
-        self.host_ip = host_ip
+        self.host_ip = intern(host_ip)
         self.ip = ip
-        self.container_ids = container_ids or []
-        self.state = state
-        self.labels = labels or dict()
+        self.container_ids = tuple(container_ids or ())
+        self.state = intern(state)
+        self.labels = shared_labels(labels)
         self.meta = meta
 
+    def numbered(self, num):
+        """ Returns a copy of the pod with another number, leaving
+            the (maybe shared) pod untouched.
+        """
+        pod = copy.copy(self)
+        pod.num = num
+        return pod
+
     def __str__(self):
         return (
             "[pod #{num} name={name} namespace={namespace} containers={containers} ip={ip} host_ip={host_ip} "
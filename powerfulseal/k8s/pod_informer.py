@@ -0,0 +1,243 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import re
+import threading
+from kubernetes.client.rest import ApiException
+from .k8s_inventory import create_pod_from_item
+
+
+SELECTOR_REQUIREMENT = re.compile(r"""
+    \s*(?:
+        (?P<set_key>[^\s,!=()]+)\s+(?P<set_op>in|notin)\s*\((?P<values>[^)]*)\)
+        |
+        (?P<key>[^\s,!=()]+)\s*(?P<op>==|=|!=)\s*(?P<value>[^\s,!=()]*)
+        |
+        (?P<not_exists>!)?\s*(?P<exists_key>[^\s,!=()]+)
+    )\s*(?:,|$)
+""", re.VERBOSE)
+
+
+def parse_selector(selector):
+    """ Parses a kubernetes label selector into a list of
+        (key, operator, values) requirements. Operators are
+        "in", "notin", "exists" and "!exists", where "=" is a
+        one-element "in", and "!=" a one-element "notin".
+        https://kubernetes.io/docs/concepts/overview/working-with-objects/labels/
+    """
+    requirements = []
+    selector = (selector or "").strip()
+    position = 0
+    while position < len(selector):
+        match = SELECTOR_REQUIREMENT.match(selector, position)
+        if match is None or match.end() == position:
+            raise ValueError("Can't parse label selector: %s" % selector)
+        position = match.end()
+        if match.group("set_key"):
+            values = set(
+                value.strip() for value in match.group("values").split(",")
+            )
+            requirements.append(
+                (match.group("set_key"), match.group("set_op"), values)
+            )
+        elif match.group("key"):
+            op = "notin" if match.group("op") == "!=" else "in"
+            requirements.append(
+                (match.group("key"), op, set([match.group("value")]))
+            )
+        else:
+            op = "!exists" if match.group("not_exists") else "exists"
+            requirements.append((match.group("exists_key"), op, None))
+    return requirements
+
+
+def labels_match(labels, requirements):
+    """ Checks that a dict of labels satisfies all the requirements.
+    """
+    labels = labels or {}
+    for key, op, values in requirements:
+        if op == "in" and labels.get(key) not in values:
+            return False
+        if op == "notin" and labels.get(key) in values:
+            return False
+        if op == "exists" and key not in labels:
+            return False
+        if op == "!exists" and key in labels:
+            return False
+    return True
+
+
+class PodInformer():
+    """ Keeps an in-memory copy of all the pods in the cluster.
+
+        Does one initial list, and then follows the watch stream from
+        the resource version of the list, resuming after the last seen
+        resource version when a stream ends, and relisting everything
+        when the resource version is too old (410 Gone).
+
+        The API objects are converted to Pods as they arrive, and only
+        the Pods are kept. They're indexed by namespace and by label,
+        so that find() doesn't need to scan all the pods.
+    """
+
+    WATCH_TIMEOUT_SECONDS = 300
+
+    def __init__(self, k8s_client, logger=None):
+        self.k8s_client = k8s_client
+        self.logger = logger or logging.getLogger(__name__)
+        self.resource_version = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._watch = None
+        self._reset()
+
+    def _reset(self):
+        self.pods_by_uid = {}
+        self.uids_by_namespace = {}
+        self.uids_by_label = {}
+
+    def start(self):
+        """ Lists the pods, and starts following the changes in the background.
+        """
+        self.relist()
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self.run,
+            name="pod-informer",
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops following the changes.
+        """
+        self._stopped.set()
+        if self._watch is not None:
+            self._watch.stop()
+
+    def relist(self):
+        """ Rebuilds the indexes from a full list of the pods.
+        """
+        self.logger.info("Listing all pods")
+        resp = self.k8s_client.list_all_pods()
+        with self._lock:
+            self._reset()
+            for item in resp.items:
+                self._add(item)
+            self.resource_version = resp.metadata.resource_version
+        self.logger.info("Listed %d pods at version %s",
+            len(self.pods_by_uid), self.resource_version)
+
+    def run(self):
+        """ Follows the watch stream until stopped.
+        """
+        while not self._stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    self.relist()
+                self.watch_once()
+            except ApiException as e:
+                if e.status == 410:
+                    self.logger.info("Version %s is gone, relisting",
+                        self.resource_version)
+                    self.resource_version = None
+                else:
+                    self.logger.exception("Error watching pods")
+                    self._stopped.wait(1)
+            except Exception:
+                self.logger.exception("Error watching pods")
+                self._stopped.wait(1)
+
+    def watch_once(self):
+        """ Consumes a single watch stream, until it times out.
+        """
+        self._watch, stream = self.k8s_client.watch_all_pods(
+            resource_version=self.resource_version,
+            timeout_seconds=self.WATCH_TIMEOUT_SECONDS,
+        )
+        for event in stream:
+            if self._stopped.is_set():
+                return
+            self.handle_event(event)
+
+    def handle_event(self, event):
+        """ Applies a single watch event to the indexes.
+        """
+        event_type = event.get("type")
+        if event_type == "ERROR":
+            raw = event.get("raw_object") or {}
+            raise ApiException(status=raw.get("code"), reason=raw.get("message"))
+        item = event.get("object")
+        with self._lock:
+            if event_type == "DELETED":
+                self._remove(item.metadata.uid)
+            else:
+                self._remove(item.metadata.uid)
+                self._add(item)
+            self.resource_version = item.metadata.resource_version
+
+    def _add(self, item):
+        pod = create_pod_from_item(item)
+        self.pods_by_uid[pod.uid] = pod
+        self.uids_by_namespace.setdefault(pod.namespace, set()).add(pod.uid)
+        for label in pod.labels.items():
+            self.uids_by_label.setdefault(label, set()).add(pod.uid)
+
+    def _remove(self, uid):
+        pod = self.pods_by_uid.pop(uid, None)
+        if pod is None:
+            return
+        self._discard(self.uids_by_namespace, pod.namespace, uid)
+        for label in pod.labels.items():
+            self._discard(self.uids_by_label, label, uid)
+
+    def _discard(self, index, key, uid):
+        uids = index.get(key)
+        if uids is not None:
+            uids.discard(uid)
+            if not uids:
+                del index[key]
+
+    def find(self, namespace=None, selector=None, labels=None):
+        """ Returns the pods in a namespace (all namespaces if None)
+            matching a label selector, or a dict of labels.
+            The Pods are sorted by namespace and name, like the API does.
+            They're shared with the index, and shouldn't be modified.
+        """
+        requirements = parse_selector(selector)
+        requirements += [
+            (key, "in", set([value])) for key, value in (labels or {}).items()
+        ]
+        with self._lock:
+            # start from the smallest of the indexed sets
+            candidates = []
+            if namespace is not None:
+                candidates.append(self.uids_by_namespace.get(namespace, set()))
+            for key, op, values in requirements:
+                if op == "in" and len(values) == 1:
+                    value = next(iter(values))
+                    candidates.append(self.uids_by_label.get((key, value), set()))
+            if candidates:
+                candidates.sort(key=len)
+                uids = set(candidates[0]).intersection(*candidates[1:])
+            else:
+                uids = self.pods_by_uid.keys()
+            pods = [
+                self.pods_by_uid[uid] for uid in uids
+                if labels_match(self.pods_by_uid[uid].labels, requirements)
+            ]
+        return sorted(pods, key=lambda pod: (pod.namespace, pod.name))
@@ -0,0 +1,242 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import math
+import threading
+import time
+from collections import deque, namedtuple
+from kubernetes.client.rest import ApiException
+from ..metrics import POD_RECOVERY_SECONDS, POD_RECOVERY_TIMEOUTS
+
+
+# a killed pod, waiting to be Ready again
+Kill = namedtuple("Kill", ["pod", "killed_at", "deadline"])
+
+
+def percentile(values, p):
+    """ Returns the p-th percentile of the values (nearest rank),
+        or None if there are no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = int(math.ceil(p / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+def ready_since(item):
+    """ Returns the timestamp from which the pod is Ready,
+        or None if it's not Ready.
+    """
+    conditions = (item.status and item.status.conditions) or []
+    for condition in conditions:
+        if condition.type == "Ready":
+            if condition.status != "True":
+                return None
+            if condition.last_transition_time is None:
+                return 0
+            return condition.last_transition_time.timestamp()
+    return None
+
+
+def deployment_ready(deployment):
+    """ Returns whether all the desired replicas of a deployment are Ready.
+    """
+    desired = deployment.spec.replicas
+    if desired is None:
+        desired = 1
+    return (deployment.status.ready_replicas or 0) >= desired
+
+
+class RecoveryWatcher():
+    """ Measures how long killed pods take to be Ready again.
+
+        The killed pods are polled in a background thread, so that
+        tracking them doesn't hold back the next actions.
+
+        If a deployment owns the pod (its selector matches the pod's
+        labels), the kill has recovered once all the deployment's
+        replicas are Ready, and either the killed pod was replaced
+        (it's gone, or its name has a new uid) or it's Ready again
+        since the kill. Otherwise, the pod itself has to be Ready again,
+        with a last transition after the kill.
+
+        The API only keeps whole seconds there, and the latency is taken
+        when the recovery is first seen, so it's accurate to about a poll
+        interval.
+
+        The latencies and timeouts are exported in the metrics, labelled
+        with the name of the scenario, and summary() aggregates them.
+    """
+
+    # how many latencies to keep to compute the percentiles
+    MAX_SAMPLES = 10000
+
+    def __init__(self, k8s_client, logger=None, poll_interval=1, clock=time.time,
+                 name=None):
+        self.k8s_client = k8s_client
+        self.name = name or ""
+        self.logger = logger or logging.getLogger(__name__)
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.pending = dict()
+        # (namespace, pod name) -> name of the owning deployment, or None
+        self.deployments = dict()
+        self.latencies = deque(maxlen=self.MAX_SAMPLES)
+        self.kills = 0
+        self.recovered = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def track(self, pod, killed_at=None, timeout=300):
+        """ Starts tracking a pod killed at killed_at (defaults to now).
+        """
+        killed_at = self.clock() if killed_at is None else killed_at
+        with self._lock:
+            self.kills += 1
+            self.pending[(pod.namespace, pod.name)] = Kill(
+                pod, killed_at, killed_at + timeout,
+            )
+        self.start()
+
+    def start(self):
+        """ Starts the background thread, if it's not running.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name="recovery-watcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the background thread.
+        """
+        self._stopped.set()
+
+    def run(self):
+        """ Polls the pending pods until stopped.
+        """
+        while not self._stopped.is_set():
+            try:
+                self.check_once()
+            except Exception:
+                self.logger.exception("Error checking the killed pods")
+            self._stopped.wait(self.poll_interval)
+
+    def check_once(self):
+        """ Checks all the pending pods once.
+        """
+        with self._lock:
+            pending = list(self.pending.items())
+        if not pending:
+            return
+        self.resolve_deployments([kill.pod for _, kill in pending])
+        deployments = dict()
+        for key, kill in pending:
+            now = self.clock()
+            if self.is_recovered(key, kill, deployments):
+                self.done(key, kill, now - kill.killed_at)
+            elif now >= kill.deadline:
+                self.done(key, kill, None)
+
+    def resolve_deployments(self, pods):
+        """ Finds the deployments owning the pods not looked up yet,
+            listing the deployments once per namespace.
+        """
+        by_namespace = dict()
+        for pod in pods:
+            if (pod.namespace, pod.name) not in self.deployments:
+                by_namespace.setdefault(pod.namespace, []).append(pod)
+        for namespace, namespace_pods in by_namespace.items():
+            selectors = [
+                (deployment.metadata.name,
+                 deployment.spec.selector.match_labels or {})
+                for deployment in self.k8s_client.list_deployments(namespace)
+            ]
+            for pod in namespace_pods:
+                owner = None
+                for name, labels in selectors:
+                    if labels and all(
+                        pod.labels.get(k) == v for k, v in labels.items()
+                    ):
+                        owner = name
+                        break
+                self.deployments[(pod.namespace, pod.name)] = owner
+
+    def is_recovered(self, key, kill, deployments):
+        """ Returns whether the killed pod recovered (see the class).
+            deployments caches the deployments read during a check.
+        """
+        try:
+            item = self.k8s_client.get_pod(*key)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            item = None
+        since = ready_since(item) if item is not None else None
+        back = since is not None and since >= math.floor(kill.killed_at)
+        name = self.deployments.get(key)
+        if name is None:
+            return back
+        replaced = item is None or (
+            kill.pod.uid is not None and item.metadata.uid != kill.pod.uid
+        )
+        if not (back or replaced):
+            return False
+        if (key[0], name) not in deployments:
+            deployments[(key[0], name)] = self.k8s_client.get_deployment(
+                key[0], name)
+        return deployment_ready(deployments[(key[0], name)])
+
+    def done(self, key, kill, latency):
+        with self._lock:
+            # the pod might have been killed again in the meantime
+            if self.pending.get(key) is kill:
+                del self.pending[key]
+                self.deployments.pop(key, None)
+            if latency is None:
+                self.timeouts += 1
+            else:
+                self.recovered += 1
+                self.latencies.append(latency)
+        if latency is None:
+            POD_RECOVERY_TIMEOUTS.inc(scenario=self.name)
+        else:
+            POD_RECOVERY_SECONDS.observe(latency, scenario=self.name)
+        if latency is None:
+            self.logger.warning("%r didn't recover in time", kill.pod)
+        else:
+            self.logger.info("%r recovered after %.1fs", kill.pod, latency)
+
+    def summary(self):
+        """ Returns the counts of kills, recoveries and timeouts,
+            and the percentiles of the recovery latencies.
+        """
+        with self._lock:
+            latencies = list(self.latencies)
+            return dict(
+                kills=self.kills,
+                pending=len(self.pending),
+                recovered=self.recovered,
+                timeouts=self.timeouts,
+                p50=percentile(latencies, 50),
+                p95=percentile(latencies, 95),
+                p99=percentile(latencies, 99),
+            )
@@ -0,0 +1,97 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+class SelectorCache():
+    """ LRU cache of (namespace, deployment name) -> label selector,
+        with entries expiring after ttl seconds.
+
+        Entries can also be dropped early with invalidate(), for example
+        when a watch reports the deployment changed.
+    """
+
+    def __init__(self, max_size=256, ttl=30, logger=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.logger = logger or logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, namespace, name, loader):
+        """ Returns the cached selector, or calls loader() to get a fresh one.
+        """
+        key = (namespace, name)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        selector = loader()
+        self.put(namespace, name, selector, now)
+        return selector
+
+    def put(self, namespace, name, selector, now=None):
+        key = (namespace, name)
+        with self._lock:
+            self._entries[key] = (selector, now or time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace=None, name=None):
+        """ Drops one entry, or all of them if no deployment is given.
+        """
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop((namespace, name), None)
+
+    def follow(self, k8s_client):
+        """ Invalidates the entries of deployments modified or deleted,
+            watching them in the background.
+        """
+        thread = threading.Thread(
+            target=self._follow,
+            args=(k8s_client,),
+            name="selector-cache",
+        )
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _follow(self, k8s_client):
+        while True:
+            # changes might have been missed between two watches (they end
+            # when the server times them out), so start afresh each time
+            self.invalidate()
+            try:
+                for event in k8s_client.watch_all_deployments():
+                    if event.get("type") in ("MODIFIED", "DELETED"):
+                        metadata = event.get("object").metadata
+                        self.invalidate(metadata.namespace, metadata.name)
+            except Exception:
+                self.logger.exception("Error watching deployments")
+                time.sleep(1)
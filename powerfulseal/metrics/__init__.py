@@ -0,0 +1,94 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from .collector import (
+    Registry,
+    Counter,
+    Histogram,
+)
+from .profiling import (
+    ThreadProfiler,
+    profiled,
+)
+
+
+# the registry rendered on /metrics, see .server
+REGISTRY = Registry()
+
+SIZE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+SCENARIO_EXECUTIONS = Counter(
+    "seal_scenario_executions_total",
+    "Number of scenario executions",
+    ["scenario"],
+    registry=REGISTRY,
+)
+SCENARIO_MATCHED_ITEMS = Histogram(
+    "seal_scenario_matched_items",
+    "Number of items matched by a scenario execution",
+    ["scenario"],
+    registry=REGISTRY,
+    buckets=SIZE_BUCKETS,
+)
+SCENARIO_FILTERED_ITEMS = Histogram(
+    "seal_scenario_filtered_items",
+    "Number of items left after the filters of a scenario execution",
+    ["scenario"],
+    registry=REGISTRY,
+    buckets=SIZE_BUCKETS,
+)
+SCENARIO_SKIPPED_RUNS = Counter(
+    "seal_scenario_skipped_runs_total",
+    "Number of scheduled runs skipped because the previous one was running",
+    ["scenario"],
+    registry=REGISTRY,
+)
+ACTIONS = Counter(
+    "seal_actions_total",
+    "Number of action steps executed, by type and outcome",
+    ["scenario", "action", "outcome"],
+    registry=REGISTRY,
+)
+SSH_SECONDS = Histogram(
+    "seal_ssh_command_seconds",
+    "Duration of the commands executed over SSH",
+    ["outcome"],
+    registry=REGISTRY,
+)
+CLOUD_API_SECONDS = Histogram(
+    "seal_cloud_api_seconds",
+    "Duration of the calls to the cloud driver",
+    ["operation"],
+    registry=REGISTRY,
+)
+INVENTORY_SYNC_SECONDS = Histogram(
+    "seal_inventory_sync_seconds",
+    "Duration of the node inventory syncs",
+    registry=REGISTRY,
+)
+POD_RECOVERY_SECONDS = Histogram(
+    "seal_pod_recovery_seconds",
+    "Time the killed pods took to recover",
+    ["scenario"],
+    registry=REGISTRY,
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+POD_RECOVERY_TIMEOUTS = Counter(
+    "seal_pod_recovery_timeouts_total",
+    "Number of killed pods that didn't recover in time",
+    ["scenario"],
+    registry=REGISTRY,
+)
@@ -0,0 +1,191 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+INF = float("inf")
+
+
+def format_value(value):
+    if value == INF:
+        return "+Inf"
+    return repr(float(value))
+
+
+def escape_label(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace("\"", "\\\"")
+    )
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, escape_label(value))
+        for name, value in zip(names, values)
+    )
+
+
+class Registry():
+    """ Holds the metrics, and renders them in the Prometheus text format.
+        https://prometheus.io/docs/instrumenting/exposition_formats/
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """ Returns the text exposition of all the metrics.
+        """
+        with self._lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP %s %s" % (metric.name, metric.documentation))
+            lines.append("# TYPE %s %s" % (metric.name, metric.TYPE))
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class Metric():
+    """ Base class for the metrics. The values of the labels are
+        passed as keyword arguments, and missing labels are empty.
+    """
+
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = dict()
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def key(self, labels):
+        unknown = set(labels) - set(self.labelnames)
+        if unknown:
+            raise ValueError("Unknown labels for %s: %s" % (self.name, unknown))
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        raise NotImplementedError()  # pragma: no cover
+
+
+class Counter(Metric):
+    """ A value that only goes up.
+    """
+
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self.values.get(self.key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self.values.items())
+        return [
+            "%s%s %s" % (self.name, format_labels(self.labelnames, key), format_value(value))
+            for key, value in values
+        ]
+
+
+class Histogram(Metric):
+    """ Counts the observed values in cumulative buckets,
+        and keeps their count and sum.
+    """
+
+    TYPE = "histogram"
+
+    # in seconds
+    DEFAULT_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300,
+    )
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS)) + (INF,)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """ Observes the duration of the block, even if it raises.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, **labels)
+
+    def get_count(self, **labels):
+        with self._lock:
+            state = self.values.get(self.key(labels))
+            return state[2] if state else 0
+
+    def render(self):
+        with self._lock:
+            values = sorted(
+                (key, (list(state[0]), state[1], state[2]))
+                for key, state in self.values.items()
+            )
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append("%s_bucket%s %s" % (
+                    self.name,
+                    format_labels(names, key + (format_value(bound),)),
+                    format_value(cumulative),
+                ))
+            labels = format_labels(self.labelnames, key)
+            lines.append("%s_sum%s %s" % (self.name, labels, format_value(total)))
+            lines.append("%s_count%s %s" % (self.name, labels, format_value(count)))
+        return lines
@@ -0,0 +1,73 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import cProfile
+import pstats
+import threading
+
+
+class ThreadProfiler():
+    """ Profiles the thread it's started in, and the tasks that thread
+        hands to worker threads while it runs.
+
+        cProfile only sees the thread it's enabled in, so each task
+        wrapped with profiled() gets a profiler of its own, and all of
+        the stats are merged when they're dumped.
+    """
+
+    # the profiler currently running, if any
+    active = None
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.workers = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        ThreadProfiler.active = self
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        ThreadProfiler.active = None
+
+    def wrap(self, method):
+        def profiled_method(*args, **kwargs):
+            profiler = cProfile.Profile()
+            with self._lock:
+                self.workers.append(profiler)
+            return profiler.runcall(method, *args, **kwargs)
+        return profiled_method
+
+    def dump_stats(self, path):
+        """ Writes the merged stats of all the threads to path.
+        """
+        stats = pstats.Stats(self.profiler)
+        with self._lock:
+            for profiler in self.workers:
+                stats.add(profiler)
+        stats.dump_stats(path)
+
+
+def profiled(method):
+    """ Returns the method to run on a worker thread, profiled if
+        a ThreadProfiler is running.
+    """
+    profiler = ThreadProfiler.active
+    if profiler is None:
+        return method
+    return profiler.wrap(method)
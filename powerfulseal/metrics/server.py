@@ -0,0 +1,50 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import threading
+from flask import Flask, Response
+from werkzeug.serving import make_server
+from . import REGISTRY
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def create_app(registry=None):
+    """ Creates the Flask app serving the metrics on /metrics.
+    """
+    registry = registry or REGISTRY
+    app = Flask(__name__)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), mimetype=CONTENT_TYPE)
+
+    return app
+
+
+def start_server(host, port, registry=None, logger=None):
+    """ Serves the metrics from a daemon thread, so that it never
+        blocks the policy runner. Returns the server.
+    """
+    logger = logger or logging.getLogger(__name__)
+    server = make_server(host, port, create_app(registry), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server")
+    thread.daemon = True
+    thread.start()
+    logger.info("Serving metrics on http://%s:%s/metrics", host, server.server_port)
+    return server
@@ -20,4 +20,11 @@ from .node import (
 )
 from .node_inventory import (
     NodeInventory,
+    SyncDiff,
+)
+from .inventory_snapshot import (
+    InventorySnapshot,
+)
+from .node_waiter import (
+    NodeStateWaiter,
 )
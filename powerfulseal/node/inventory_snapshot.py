@@ -0,0 +1,140 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import logging
+import os
+import threading
+import time
+from .node import Node, NodeState
+
+
+SNAPSHOT_VERSION = 1
+
+
+class InventorySnapshot():
+    """ Persists a resolved NodeInventory (groups, nodes, AZs and states)
+        to a local file, so that a restart can boot from it instead of
+        waiting for the cloud API and the apiserver.
+
+        The file is compact JSON, with the nodes as arrays:
+            {
+                "version": 1,
+                "created": <timestamp>,
+                "groups": {group: [ip, ...]},
+                "nodes": [[id, name, ip, az, no, state], ...],
+                "members": {group: [[ip, node id], ...]}
+            }
+    """
+
+    def __init__(self, path, max_age=3600, logger=None, clock=time.time):
+        self.path = path
+        self.max_age = max_age
+        self.logger = logger or logging.getLogger(__name__)
+        self.clock = clock
+
+    def dump(self, inventory):
+        """ Returns the snapshot of the inventory, as a dict.
+        """
+        groups, nodes, members = inventory.export()
+        members_by_group = {}
+        for group, ip, node_id in members:
+            members_by_group.setdefault(group, []).append([ip, node_id])
+        return dict(
+            version=SNAPSHOT_VERSION,
+            created=self.clock(),
+            groups=groups,
+            nodes=[
+                [node.id, node.name, node.ip, node.az, node.no, node.state.name]
+                for node in nodes
+            ],
+            members=members_by_group,
+        )
+
+    def save(self, inventory):
+        """ Writes the snapshot of the inventory. The file is replaced
+            atomically, so that a crash never leaves a partial snapshot.
+        """
+        data = self.dump(inventory)
+        tmp_path = "%s.tmp" % self.path
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self.logger.info("Saved %d nodes to the inventory snapshot %s",
+            len(data["nodes"]), self.path)
+
+    def load(self):
+        """ Reads the snapshot. Returns None if it's missing, unreadable,
+            of another version, or older than max_age seconds.
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            self.logger.info("No inventory snapshot at %s", self.path)
+            return None
+        except (OSError, ValueError):
+            self.logger.exception("Couldn't read the inventory snapshot %s",
+                self.path)
+            return None
+        if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+            self.logger.warning("Ignoring the inventory snapshot %s: "
+                "unsupported version", self.path)
+            return None
+        age = self.clock() - data.get("created", 0)
+        if self.max_age is not None and age > self.max_age:
+            self.logger.info("Ignoring the inventory snapshot %s: "
+                "%ds old, max age is %ss", self.path, age, self.max_age)
+            return None
+        return data
+
+    def restore(self, inventory, data):
+        """ Loads the snapshot data into the inventory.
+        """
+        nodes = [
+            Node(id=id, name=name, ip=ip, az=az, no=no, state=NodeState[state])
+            for id, name, ip, az, no, state in data["nodes"]
+        ]
+        members = [
+            (group, ip, node_id)
+            for group, pairs in data["members"].items()
+            for ip, node_id in pairs
+        ]
+        inventory.set_groups(data["groups"])
+        inventory.restore(nodes, members)
+        self.logger.info("Restored %d nodes from the inventory snapshot %s",
+            len(nodes), self.path)
+
+    def reconcile(self, inventory, get_groups=None):
+        """ Refreshes the groups (with get_groups, if provided) and syncs
+            the inventory from a daemon thread, then saves the snapshot.
+            Returns the thread.
+        """
+        def run():
+            try:
+                if get_groups is not None:
+                    inventory.set_groups(get_groups())
+                diff = inventory.sync()
+                self.logger.info("Reconciled the inventory: "
+                    "%d added, %d removed, %d changed",
+                    len(diff.added), len(diff.removed), len(diff.changed))
+                self.save(inventory)
+            except Exception:
+                self.logger.exception("Error reconciling the inventory")
+        thread = threading.Thread(target=run, name="inventory-reconcile")
+        thread.daemon = True
+        thread.start()
+        return thread
@@ -16,11 +16,26 @@
 
 import logging
 import ipaddress
+import threading
+from collections import namedtuple
+from operator import attrgetter
 from .node import Node, NodeState
+from ..metrics import CLOUD_API_SECONDS, INVENTORY_SYNC_SECONDS
+
+
+# the nodes added, removed and changed by a sync
+SyncDiff = namedtuple("SyncDiff", ["added", "removed", "changed"])
+
+# the nodes sorted by number, and indexed by AZ, state, and by the
+# attributes identifying a single node (id, IP, number and name)
+NodeViews = namedtuple("NodeViews", ["nodes", "by_az", "by_state", "by_single"])
 
 
 class NodeInventory():
 
+    # the attributes of the known nodes updated on each sync
+    SYNCED_ATTRIBUTES = ("state", "ip", "az", "name")
+
     def __init__(self, driver, restrict_to_groups=None, filters=None, logger=None):
         self.logger = logger or logging.getLogger(__name__)
         self.driver = driver
@@ -30,88 +45,195 @@ class NodeInventory():
         self.nodes_by_id = {}
         self.nodes_by_ip = {}
         self.azs = set()
+        # (group, ip) -> node
+        self.members = {}
+        self.next_no = 0
+        self.last_diff = None
+        self._views = None
+        # syncs can happen from a background thread (see InventorySnapshot):
+        # _lock guards the indexes, and is only held while a sync applies
+        # its changes, _sync_lock makes the syncs run one at a time
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+
+    def __get_all_nodes(self):
+        return self.get_views().nodes
 
-    def __get_all_nodes(self, sort_key="no"):
-        nodes = self.nodes_by_id.values()
-        return sorted(nodes, key=lambda x: getattr(x, sort_key))
+    def invalidate(self):
+        """ Drops the cached views, so that they're rebuilt on the next query.
+            Needs to be called if the nodes are modified outside of sync.
+        """
+        self._views = None
+
+    def get_views(self):
+        """ Returns the nodes sorted by number, and indexed by the
+            attributes find_nodes looks for, building them if needed.
+        """
+        views = self._views
+        if views is None:
+            # built under the lock, as syncs can run from other threads
+            with self._lock:
+                nodes = sorted(self.nodes_by_id.values(), key=attrgetter("no"))
+                by_az, by_state, by_single = {}, {}, {}
+                for node in nodes:
+                    by_az.setdefault(node.az, []).append(node)
+                    by_state.setdefault(node.state, []).append(node)
+                    # the lowest numbered node wins, like in a sorted scan
+                    for value in (node.id, node.ip, str(node.no), node.name):
+                        if value is not None:
+                            by_single.setdefault(str(value), node)
+                views = self._views = NodeViews(nodes, by_az, by_state, by_single)
+        return views
 
     def get_node_by_ip(self, ip):
-        return self.nodes_by_ip.get(ip, None)
+        with self._lock:
+            return self.nodes_by_ip.get(ip, None)
 
     def find_nodes(self, query=None):
         """
             Universal node finder.
         """
+        # resolved under the lock, as a sync can run from another thread
+        with self._lock:
+            nodes = self.search_nodes(query)
+        for node in nodes:
+            yield node
+
+    def search_nodes(self, query=None):
+        """ Returns the list of nodes matching the query (see find_nodes).
+            Needs to be called with the lock held.
+        """
 
         # all the queries and 'all' keyword
         if not query or query == 'all':
-            for node in self.__get_all_nodes():
-                yield node
-            return
+            return list(self.__get_all_nodes())
 
         # support comma-separated queries
         if query and "," in query:
+            nodes = []
             for element in query.split(","):
-                for node in self.find_nodes(element):
-                    yield node
-            return
+                nodes.extend(self.search_nodes(element))
+            return nodes
 
         # match groups
-        if query in self.groups.keys():
-            for node in self.groups[query]:
-                yield node
-            return
+        if query in self.groups:
+            return list(self.groups[query])
+
+        views = self.get_views()
 
         # match AZ
         if query in self.azs:
-            for node in self.__get_all_nodes():
-                if node.az == query:
-                    yield node
-            return
+            return list(views.by_az.get(query, []))
 
         # match IP or ID or no or name
-        for node in self.__get_all_nodes():
-            if (
-                node.id == query
-                or node.ip == query
-                or str(node.no) == str(query)
-                or node.name == query
-            ):
-                yield node
-                return
+        node = views.by_single.get(query)
+        if node is not None:
+            return [node]
 
         # match by state
         try:
             state = NodeState[query.upper()]
         except KeyError:
-            pass
-        else:
-            for node in self.__get_all_nodes():
-                if node.state == state:
-                    yield node
+            return []
+        return list(views.by_state.get(state, []))
 
     def sync(self, driver=None):
         """
             Update the nodes based on the values returned from the driver
         """
-        driver = driver or self.driver
-        driver.sync()
-        counter = 0
-        self.groups = {}
-        self.nodes_by_id = {}
-        self.nodes_by_ip = {}
-        self.azs = set()
+        with self._sync_lock, INVENTORY_SYNC_SECONDS.time():
+            return self.sync_nodes(driver or self.driver)
 
-        for group, ips in sorted(self.local_ips.items()):
-            self.groups[group] = []
+    def set_groups(self, restrict_to_groups):
+        """ Replaces the groups of IPs to restrict to, for the next sync.
+        """
+        with self._lock:
+            self.local_ips = restrict_to_groups or {}
 
-            # different groups can have the same IPs,
-            # so we need to match to the same nodes
-            for ip in ips:
-                node = self.nodes_by_ip.get(ip)
+    def export(self):
+        """ Returns the groups of IPs, the nodes sorted by number and the
+            memberships as a sorted list of (group, ip, node id),
+            consistent with each other even if a sync is running.
+        """
+        with self._lock:
+            groups = dict(
+                (group, sorted(ips)) for group, ips in self.local_ips.items()
+            )
+            members = sorted(
+                (group, ip, node.id)
+                for (group, ip), node in self.members.items()
+            )
+            return groups, list(self.get_views().nodes), members
+
+    def restore(self, nodes, members):
+        """ Loads known nodes without calling the driver (e.g. from
+            a snapshot), members being a list of (group, ip, node id).
+            Nodes keep their numbers, and the next sync applies the diff.
+        """
+        with self._lock:
+            self.groups = dict((group, []) for group in self.local_ips)
+            self.nodes_by_id = dict((node.id, node) for node in nodes)
+            self.nodes_by_ip = {}
+            self.members = {}
+            for node in nodes:
+                node.groups = []
+            for group, ip, node_id in members:
+                node = self.nodes_by_id.get(node_id)
                 if node is None:
-                    node = driver.get_by_ip(ip)
-                if node is None: #pragma: no cover
+                    continue
+                self.groups.setdefault(group, [])
+                self.nodes_by_ip[ip] = node
+                self.set_member(group, ip, node)
+            self.next_no = max([node.no + 1 for node in nodes] or [0])
+            self.azs = set(node.az for node in nodes)
+            self.invalidate()
+
+    def sync_nodes(self, driver):
+        """ Applies the changes from the driver to the existing indexes.
+            The nodes already known keep their identity and their number,
+            only their state and attributes are updated.
+            The driver is called without holding the lock, so that the
+            nodes can still be read during a slow sync.
+            Returns (and keeps in last_diff) the SyncDiff.
+        """
+        with self._lock:
+            local_ips = dict(self.local_ips)
+        all_ips = set()
+        for ips in local_ips.values():
+            all_ips.update(ips)
+        all_ips = sorted(all_ips)
+        with CLOUD_API_SECONDS.time(operation="sync"):
+            driver.sync(ips=all_ips)
+
+        # look up all the IPs in one go
+        remote_nodes = driver.get_by_ips(all_ips)
+
+        with self._lock:
+            return self.apply_sync(local_ips, all_ips, remote_nodes)
+
+    def apply_sync(self, local_ips, all_ips, remote_nodes):
+        """ Applies the nodes returned by the driver for the groups of IPs.
+            Needs to be called with the lock held.
+        """
+        # forget the memberships of the groups not configured anymore
+        for group, ip in list(self.members.keys()):
+            if ip not in local_ips.get(group, ()):
+                self.set_member(group, ip, None)
+        for group in list(self.groups.keys()):
+            if group not in local_ips:
+                del self.groups[group]
+        wanted_ips = set(all_ips)
+        for ip in list(self.nodes_by_ip.keys()):
+            if ip not in wanted_ips:
+                del self.nodes_by_ip[ip]
+
+        added, changed = [], []
+        seen = set()
+        for group, ips in sorted(local_ips.items()):
+            self.groups.setdefault(group, [])
+            for ip in ips:
+                remote = remote_nodes.get(ip)
+                if remote is None: #pragma: no cover
                     # apart from IPs, we will also get hostnames here
                     # for those, debug, otherwise info
                     try:
@@ -119,20 +241,83 @@ class NodeInventory():
                         self.logger.info("Couldn't match IP to cloud node: %s" %(ip))
                     except:
                         self.logger.debug("Couldn't match to cloud node: %s" %(ip))
+                    self.set_member(group, ip, None)
+                    self.nodes_by_ip.pop(ip, None)
                     continue
 
-                self.nodes_by_id[node.id] = node
+                # different groups can have the same IPs,
+                # so we need to match to the same nodes
+                node = self.nodes_by_id.get(remote.id)
+                if node is None:
+                    node = remote
+                    node.groups = []
+                    # just for easier identification, give them numbers
+                    node.no = self.next_no
+                    self.next_no += 1
+                    self.nodes_by_id[node.id] = node
+                    added.append(node)
+                elif node.id not in seen and self.update_node(node, remote):
+                    changed.append(node)
+                seen.add(node.id)
                 self.nodes_by_ip[ip] = node
-                self.groups[group].append(node)
-                node.groups.append(group)
-                self.azs.add(node.az)
+                self.set_member(group, ip, node)
+
+        removed = [
+            node for node_id, node in self.nodes_by_id.items()
+            if node_id not in seen
+        ]
+        for node in removed:
+            del self.nodes_by_id[node.id]
+        if removed:
+            removed_ids = set(node.id for node in removed)
+            for ip, node in list(self.nodes_by_ip.items()):
+                if node.id in removed_ids:
+                    del self.nodes_by_ip[ip]
+        self.azs = set(node.az for node in self.nodes_by_id.values())
+        self.invalidate()
+
+        self.last_diff = SyncDiff(added, removed, changed)
+        if added or removed or changed:
+            self.logger.info("Nodes added: %d, removed: %d, changed: %d",
+                len(added), len(removed), len(changed))
+        return self.last_diff
 
-                # just for easier identification, give them numbers
-                node.no = counter
-                counter += 1
+    def set_member(self, group, ip, node):
+        """ Makes the node the member of the group for that IP.
+        """
+        old = self.members.get((group, ip))
+        if old is node:
+            return
+        # the lists are replaced rather than modified, so that
+        # readers outside the lock never see them half updated
+        if old is not None:
+            self.groups[group] = list(self.groups[group])
+            self.groups[group].remove(old)
+            old.groups = list(old.groups)
+            old.groups.remove(group)
+        if node is None:
+            self.members.pop((group, ip), None)
+            return
+        self.members[(group, ip)] = node
+        self.groups[group] = self.groups[group] + [node]
+        node.groups = node.groups + [group]
+
+    def update_node(self, node, remote):
+        """ Copies the attributes of a fresh node from the driver
+            onto a known node. Returns True if anything changed.
+        """
+        changed = False
+        for attr in self.SYNCED_ATTRIBUTES:
+            value = getattr(remote, attr)
+            if getattr(node, attr) != value:
+                setattr(node, attr, value)
+                changed = True
+        return changed
 
     def get_azs(self):
-        return sorted(list(self.azs))
+        with self._lock:
+            return sorted(list(self.azs))
 
     def get_groups(self):
-        return sorted(list(self.groups.keys()))
+        with self._lock:
+            return sorted(list(self.groups.keys()))
@@ -0,0 +1,89 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import time
+from ..metrics import CLOUD_API_SECONDS
+
+
+class NodeStateWaiter():
+    """ Polls the cloud driver until nodes reach a state.
+
+        All the pending nodes are checked together in each round,
+        so drivers able to fetch many states in one call only do
+        one call per round. The delay between rounds grows
+        exponentially, from poll_interval up to max_poll_interval.
+    """
+
+    def __init__(self, driver, logger=None, sleep=time.sleep, clock=time.time):
+        self.driver = driver
+        self.logger = logger or logging.getLogger(__name__)
+        self.sleep = sleep
+        self.clock = clock
+
+    def wait_for(self, nodes, state, timeout=300, poll_interval=1,
+                 max_poll_interval=30, backoff=2, started=None):
+        """ Waits until all the nodes are in the given state, or the timeout.
+            Returns a dict of node -> seconds it took to reach the state
+            since started (defaults to now), or None if it didn't in time.
+        """
+        steps = self.wait_steps(nodes, state, timeout=timeout,
+            poll_interval=poll_interval, max_poll_interval=max_poll_interval,
+            backoff=backoff, started=started)
+        while True:
+            try:
+                delay = next(steps)
+            except StopIteration as e:
+                return e.value
+            self.sleep(delay)
+
+    def wait_steps(self, nodes, state, timeout=300, poll_interval=1,
+                   max_poll_interval=30, backoff=2, started=None):
+        """ Same as wait_for, but as a generator yielding the number of
+            seconds to wait before each poll, instead of sleeping,
+            and returning the latencies.
+        """
+        started = self.clock() if started is None else started
+        deadline = started + timeout
+        pending = dict((node.id, node) for node in nodes)
+        latencies = dict((node, None) for node in nodes)
+        delay = poll_interval
+        while pending:
+            try:
+                with CLOUD_API_SECONDS.time(operation="get_states"):
+                    states = self.driver.get_states(list(pending.values()))
+            except Exception:
+                self.logger.exception("Error fetching the node states")
+                states = dict()
+            now = self.clock()
+            for node_id, node_state in states.items():
+                node = pending.get(node_id)
+                if node is not None and node_state == state:
+                    latencies[node] = now - started
+                    node.state = state
+                    del pending[node_id]
+                    self.logger.info("%r reached %s after %.1fs",
+                        node, state, latencies[node])
+            if not pending:
+                break
+            if now >= deadline:
+                for node in pending.values():
+                    self.logger.warning("%r didn't reach %s within %ss",
+                        node, state, timeout)
+                break
+            yield min(delay, max(deadline - now, 0))
+            delay = min(delay * backoff, max_poll_interval)
+        return latencies
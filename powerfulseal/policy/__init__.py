@@ -15,3 +15,5 @@
 
 
 from .policy_runner import PolicyRunner
+from .scheduler import Scheduler, IntervalSchedule, CronSchedule
+from .timing import RunRecord, ScenarioHook, LoggingHook
@@ -14,7 +14,10 @@
 # limitations under the License.
 
 
+import time
 from .scenario import Scenario
+from ..node import NodeState, NodeStateWaiter
+from ..metrics import CLOUD_API_SECONDS
 
 
 class NodeScenario(Scenario):
@@ -29,59 +32,191 @@ class NodeScenario(Scenario):
         self.inventory = inventory
         self.driver = driver
         self.executor = executor
+        self.waiter = NodeStateWaiter(driver, logger=self.logger)
+        # (node, state, seconds or None) of the last waited for transitions
+        self.transitions = []
 
     def match(self):
         """ Makes a union of all the nodes matching any of the policy criteria.
         """
         selected_nodes = set()
         criteria = self.schema.get("match", [])
+        matchers = [
+            self.compile_property(criterion.get("property"))
+            for criterion in criteria
+            if criterion.get("property")
+        ]
         for node in self.inventory.find_nodes():
-            for criterion in criteria:
-                match = criterion.get("property")
-                if self.match_property(node, match):
+            for matcher in matchers:
+                if matcher(node):
                     self.logger.info("Matching %r", node)
                     selected_nodes.add(node)
         return list(selected_nodes)
 
     def action_start(self, item, params):
-        """ Action to start a node.
+        """ Action to start a node. Returns the node if it failed.
         """
         self.logger.info("Action start on %r", item)
         try:
             self.driver.start(item)
         except:
             self.logger.exception("Error starting the machine")
+            return [item]
 
     def action_stop(self, item, params):
-        """ Action to stop a node.
+        """ Action to stop a node. Returns the node if it failed.
         """
         self.logger.info("Action stop on %r", item)
         try:
             self.driver.stop(item)
         except:
             self.logger.exception("Error stopping the machine")
+            return [item]
+
+    def action_start_many(self, items, params):
+        """ Action to start many nodes, in as few API calls as the driver can.
+            A generator, like act_in_slices.
+        """
+        return self.act_in_slices(
+            "start_many", "starting", NodeState.UP, items, params,
+        )
+
+    def action_stop_many(self, items, params):
+        """ Action to stop many nodes, in as few API calls as the driver can.
+            A generator, like act_in_slices.
+        """
+        return self.act_in_slices(
+            "stop_many", "stopping", NodeState.DOWN, items, params,
+        )
+
+    def act_in_slices(self, operation, verb, state, items, params):
+        """ Calls a driver's batch method on the nodes, and waits for them
+            to reach the state if the action asks for it.
+            Like for the other actions, maxParallel caps how many nodes
+            are acted on at once: the nodes are split in slices of at most
+            that many, acted on (and waited for) one after the other.
+            A generator yielding the seconds to wait between the polls of
+            the states, so that the scenario doesn't hold a worker while
+            waiting, and returning the nodes that failed.
+        """
+        params = params or dict()
+        max_parallel = params.get("maxParallel")
+        if max_parallel and max_parallel < len(items):
+            chunks = [
+                items[i:i + max_parallel]
+                for i in range(0, len(items), max_parallel)
+            ]
+        else:
+            chunks = [items]
+        self.logger.info("Action %s on %d nodes, in %d batches",
+            verb, len(items), len(chunks))
+        self.transitions = []
+        failed = []
+        for chunk in chunks:
+            started = time.time()
+            failures = self.call_many(operation, chunk)
+            self.log_failures(verb, failures)
+            yield from self.wait_for_state(chunk, failures, state, started, params)
+            failed.extend(node for node, _ in failures)
+        return failed
+
+    def wait_for_state(self, items, failures, state, started, params):
+        """ If the action asks for it, waits until the nodes that didn't
+            fail reach the state, and records how long each one took.
+            Drivers that can't report the states aren't waited for.
+            A generator yielding the seconds to wait between the polls.
+        """
+        options = params.get("waitForState")
+        if options is None:
+            return
+        if not self.driver.reports_states:
+            self.logger.info("%s can't report node states, not waiting for %s",
+                type(self.driver).__name__, state)
+            return
+        failed = set(id(node) for node, _ in failures)
+        nodes = [node for node in items if id(node) not in failed]
+        latencies = yield from self.waiter.wait_steps(
+            nodes,
+            state,
+            timeout=options.get("timeout", 300),
+            poll_interval=options.get("pollInterval", 1),
+            max_poll_interval=options.get("maxPollInterval", 30),
+            started=started,
+        )
+        # the waiter updated the states of the nodes
+        self.inventory.invalidate()
+        self.transitions.extend(
+            (node, state, latencies[node]) for node in nodes
+        )
+        reached = [latency for latency in latencies.values() if latency is not None]
+        self.logger.info("%d/%d nodes reached %s, slowest after %.1fs",
+            len(reached), len(nodes), state, max(reached or [0]))
+
+    def call_many(self, operation, items):
+        """ Calls a driver's batch method, and returns the failed nodes.
+        """
+        method = getattr(self.driver, operation)
+        try:
+            with CLOUD_API_SECONDS.time(operation=operation):
+                return method(items)
+        except Exception as e:
+            # none of the nodes can be assumed to be done
+            self.logger.exception("Error calling %s", operation)
+            return [(node, e) for node in items]
+
+    def log_failures(self, verb, failures):
+        for node, error in failures:
+            self.logger.error("Error %s the machine %r: %s", verb, node, error)
 
     def action_execute(self, item, params):
         """ Executes arbitrary code on the node.
+            Like the other per-node actions, it's fanned out to maxParallel
+            nodes at a time by run_step.
+            Returns the node if the command failed.
         """
         cmd = params.get("cmd", "hostname")
         self.logger.info("Action execute '%s' on %r", cmd, item)
-        for value in self.executor.execute(
-            cmd, nodes=[item]
-        ).values():
+        results = self.executor.execute(
+            cmd,
+            nodes=[item],
+            timeout=params.get("timeout"),
+        )
+        return self.failed_commands([item], results)
+
+    def failed_commands(self, items, results):
+        """ Logs the commands that returned an error, and returns their nodes.
+            The executor returns the results in the order of the nodes.
+        """
+        failed = []
+        for item, value in zip(items, results.values()):
             if value["ret_code"] > 0:
                 self.logger.info("Error return code: %s", value)
+                failed.append(item)
+        return failed
 
-    def act(self, items):
-        """ Executes all the supported actions on the list of nodes.
+    def action_methods(self):
+        """ Returns the mapping of policy keywords to node actions.
         """
-        self.logger.info("Acting on these: %r", items)
-        actions = self.schema.get("actions", [])
-        mapping = {
+        return {
             "stop": self.action_stop,
             "start": self.action_start,
             "wait": self.action_wait,
             "execute": self.action_execute,
         }
-        return self.act_mapping(items, actions, mapping)
 
+    def batch_action_methods(self):
+        """ Returns the actions executed on all the nodes at once.
+        """
+        return {
+            "stop": self.action_stop_many,
+            "start": self.action_start_many,
+        }
+
+    def act(self, items):
+        """ Executes all the supported actions on the list of nodes.
+        """
+        self.logger.info("Acting on these: %r", items)
+        actions = self.schema.get("actions", [])
+        return self.act_mapping(
+            items, actions, self.action_methods(), self.batch_action_methods()
+        )
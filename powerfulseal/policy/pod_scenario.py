@@ -15,7 +15,12 @@
 
 
 import random
+import threading
+import time
+from collections import OrderedDict
 from .scenario import Scenario
+from ..k8s.pod_informer import parse_selector, labels_match
+from ..k8s.recovery_watcher import RecoveryWatcher
 
 
 class PodScenario(Scenario):
@@ -24,23 +29,55 @@ class PodScenario(Scenario):
         Adds metching for k8s-specific things and pod-specific actions
     """
 
+    MATCH_KEYS = ("namespace", "deployment", "labels")
+
+    # from how many namespaces on it's cheaper to list all pods at once
+    CLUSTER_WIDE_MIN_NAMESPACES = 3
+
     def __init__(self, name, schema, inventory, k8s_inventory, executor, logger=None):
         super().__init__(name, schema, logger=logger)
         self.inventory = inventory
         self.k8s_inventory = k8s_inventory
         self.executor = executor
         self.cmd_template = "sudo docker kill -s {signal} {container_id}"
+        self.recovery_watcher = None
+        self._recovery_watcher_lock = threading.Lock()
 
     def match(self):
         """ Makes a union of all the pods matching any of the policy criteria.
+
+            If the criteria span few namespaces, each criterion is sent
+            to the API separately. Otherwise, all the pods are fetched
+            with a single cluster-wide list, and matched client-side.
         """
-        mapping = {
-            "namespace": self.match_namespace,
-            "deployment": self.match_deployment,
-            "labels": self.match_labels,
-        }
-        selected = set()
         criteria = self.schema.get("match", [])
+        namespaces = set()
+        for criterion in criteria:
+            for key in self.MATCH_KEYS:
+                if key in criterion:
+                    params = criterion.get(key)
+                    if key == "namespace":
+                        namespaces.add(params.get("name"))
+                    else:
+                        namespaces.add(params.get("namespace"))
+        if len(namespaces) >= self.CLUSTER_WIDE_MIN_NAMESPACES:
+            self.logger.info("Listing pods for %d namespaces at once", len(namespaces))
+            pods_by_namespace = self.k8s_inventory.find_pods_in_namespaces(namespaces)
+            mapping = {
+                "namespace": lambda params: self.match_namespace_in(
+                    pods_by_namespace, params),
+                "deployment": lambda params: self.match_deployment_in(
+                    pods_by_namespace, params),
+                "labels": lambda params: self.match_labels_in(
+                    pods_by_namespace, params),
+            }
+        else:
+            mapping = {
+                "namespace": self.match_namespace,
+                "deployment": self.match_deployment,
+                "labels": self.match_labels,
+            }
+        selected = set()
         for criterion in criteria:
             for key, method in mapping.items():
                 if key in criterion:
@@ -50,6 +87,32 @@ class PodScenario(Scenario):
                         selected.add(pod)
         return list(selected)
 
+    def match_namespace_in(self, pods_by_namespace, params):
+        """ Matches pods for a namespace, from already listed pods
+        """
+        return pods_by_namespace.get(params.get("name"), [])
+
+    def match_deployment_in(self, pods_by_namespace, params):
+        """ Matches pods for a deployment, from already listed pods
+        """
+        namespace = params.get("namespace")
+        labels = self.k8s_inventory.k8s_client.get_deployment_labels(
+            namespace, params.get("name"),
+        ) or {}
+        return [
+            pod for pod in pods_by_namespace.get(namespace, [])
+            if all(pod.labels.get(k) == v for k, v in labels.items())
+        ]
+
+    def match_labels_in(self, pods_by_namespace, params):
+        """ Matches pods for a selector, from already listed pods
+        """
+        requirements = parse_selector(params.get("selector"))
+        return [
+            pod for pod in pods_by_namespace.get(params.get("namespace"), [])
+            if labels_match(pod.labels, requirements)
+        ]
+
     def match_namespace(self, params):
         """ Matches pods for a namespace
         """
@@ -91,34 +154,127 @@ class PodScenario(Scenario):
     def action_kill(self, item, params):
         """ Kills a pod by executing a docker kill on one of the containers
         """
-        node = self.inventory.get_node_by_ip(item.host_ip)
-        if node is None:
-            self.logger.info("Node not found for pod: %s", item)
-            return
+        return self.action_kill_many([item], params)
+
+    def action_kill_many(self, items, params):
+        """ Kills pods by executing a docker kill on one of the containers
+            of each pod. The containers are grouped by node, so that
+            there is a single docker kill issued per node.
+            If recovery is set, the killed pods are then tracked until
+            they're Ready again.
+            Returns a list of (pod, container_id, success) tuples.
+        """
         force = params.get("force", True)
         signal = "SIGKILL" if force else "SIGTERM"
-        container_id = random.choice(item.container_ids)
+        probability = params.get("probability", 1)
+
+        # pick the containers to kill, grouped by node
+        targets_by_node = OrderedDict()
+        for item in items:
+            node = self.inventory.get_node_by_ip(item.host_ip)
+            if node is None:
+                self.logger.info("Node not found for pod: %s", item)
+                continue
+            container_id = random.choice(item.container_ids)
+            if probability >= random.random():
+                targets_by_node.setdefault(node, []).append(
+                    (item, container_id.replace("docker://",""))
+                )
+
+        # one round-trip per node, maxParallel nodes at a time
+        results = []
+        for node_results in self.map_parallel(
+            lambda node: self.kill_on_node(
+                node, targets_by_node[node], signal, params.get("recovery"),
+            ),
+            list(targets_by_node.keys()),
+            params.get("maxParallel"),
+        ):
+            results.extend(node_results)
+        return results
+
+    def kill_on_node(self, node, targets, signal, recovery=None):
+        """ Kills the (pod, container_id) targets running on a node
+            with a single docker kill.
+            Returns a list of (pod, container_id, success) tuples.
+        """
         cmd = self.cmd_template.format(
             signal=signal,
-            container_id=container_id.replace("docker://",""),
+            container_id=" ".join(container_id for _, container_id in targets),
         )
-        
-        probability = params.get("probability", 1)
-        if probability >= random.random():
-            self.logger.info("Action execute '%s' on %r", cmd, item)
-            for value in self.executor.execute(
-                cmd, nodes=[node]
-            ).values():
-                if value["ret_code"] > 0:
-                    self.logger.info("Error return code: %s", value)
+        self.logger.info("Action execute '%s' on %r", cmd, node)
+        killed_at = time.time()
+        results = []
+        for value in self.executor.execute(
+            cmd, nodes=[node]
+        ).values():
+            if value["ret_code"] > 0:
+                self.logger.info("Error return code: %s", value)
+            # docker kill prints out each container it managed to kill
+            killed = set(value.get("stdout", "").split())
+            for item, container_id in targets:
+                success = value["ret_code"] == 0 or container_id in killed
+                self.logger.info("Kill container %s of %r: %s",
+                    container_id, item, "done" if success else "failed")
+                results.append((item, container_id, success))
+                if success and recovery is not None:
+                    self.get_recovery_watcher(recovery).track(
+                        item,
+                        killed_at=killed_at,
+                        timeout=recovery.get("timeout", 300),
+                    )
+        return results
 
-    def act(self, items):
-        """ Executes all the supported actions on the list of pods.
+    def execute_steps(self):
+        """ Same as Scenario.execute_steps, and logs the recovery summary
+            of the pods killed so far at the end of each run.
         """
-        actions = self.schema.get("actions", [])
-        mapping = {
+        try:
+            for seconds in super().execute_steps():
+                yield seconds
+        finally:
+            if self.recovery_watcher is not None:
+                self.logger.info("Recovery: %s", self.recovery_watcher.summary())
+
+    def get_recovery_watcher(self, recovery):
+        """ Returns the scenario's recovery watcher, creating it on first use.
+            Called from the worker threads killing the pods, so that only
+            one watcher is ever created.
+        """
+        with self._recovery_watcher_lock:
+            if self.recovery_watcher is None:
+                self.recovery_watcher = RecoveryWatcher(
+                    self.k8s_inventory.k8s_client,
+                    logger=self.logger,
+                    poll_interval=recovery.get("pollInterval", 1),
+                    name=self.name,
+                )
+            return self.recovery_watcher
+
+    def failed_items(self, result):
+        """ The kill actions return (pod, container_id, success) tuples.
+        """
+        return [item for item, _, success in result or [] if not success]
+
+    def action_methods(self):
+        """ Returns the mapping of policy keywords to pod actions.
+        """
+        return {
             "wait": self.action_wait,
             "kill": self.action_kill,
         }
-        return self.act_mapping(items, actions, mapping)
 
+    def batch_action_methods(self):
+        """ Returns the actions executed on all the pods at once.
+        """
+        return {
+            "kill": self.action_kill_many,
+        }
+
+    def act(self, items):
+        """ Executes all the supported actions on the list of pods.
+        """
+        actions = self.schema.get("actions", [])
+        return self.act_mapping(
+            items, actions, self.action_methods(), self.batch_action_methods()
+        )
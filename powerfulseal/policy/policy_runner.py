@@ -14,18 +14,19 @@
 # limitations under the License.
 
 
-import random
 import time
-from jsonschema import validate
+from jsonschema import validate, ValidationError
 import yaml
 import pkgutil
 import logging
-from .pod_scenario import PodScenario
-from .node_scenario import NodeScenario
+from ..metrics import ThreadProfiler
+from .scheduler import Scheduler, IntervalSchedule, CronSchedule
 
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_CONCURRENT_SCENARIOS = 4
+
 
 class PolicyRunner():
     """ Reads, validates and executes a JSON schema-compliant policy
@@ -46,15 +47,67 @@ class PolicyRunner():
         with open(filename, "r") as f:
             policy = yaml.load(f.read())
         validate(policy, schema)
+        cls.validate_schedules(policy)
         return policy
 
     @classmethod
-    def run(cls, policy, inventory, k8s_inventory, driver, executor, loops=None):
-        """ Runs a policy forever
+    def validate_schedules(cls, policy):
+        """ Builds the schedule of every scenario, so that a schedule
+            the schema can't check (like a cron expression) fails
+            the validation, instead of the run.
+        """
+        config = policy.get("config", {})
+        for key in ("nodeScenarios", "podScenarios"):
+            for i, item in enumerate(policy.get(key, [])):
+                try:
+                    cls.get_schedule(item, config).first_run(time.time())
+                except ValueError as e:
+                    raise ValidationError(
+                        "Invalid schedule for %r: %s" % (item.get("name"), e),
+                        path=[key, i, "schedule"],
+                    )
+
+    @classmethod
+    def get_schedule(cls, item, config):
+        """ Returns the schedule of a scenario. By default, it waits between
+            minSecondsBetweenRuns and maxSecondsBetweenRuns after each run.
+        """
+        schedule = item.get("schedule")
+        if schedule is None:
+            wait_min = config.get("minSecondsBetweenRuns", 0)
+            wait_max = config.get("maxSecondsBetweenRuns", 300)
+            return IntervalSchedule(wait_min, max(wait_max - wait_min, 0))
+        if "cron" in schedule:
+            return CronSchedule(schedule["cron"])
+        return IntervalSchedule(
+            schedule["intervalSeconds"],
+            schedule.get("jitterSeconds", 0),
+        )
+
+    @classmethod
+    def run(cls, policy, inventory, k8s_inventory, driver, executor, loops=None,
+            hooks=None, profile=None, scheduler=None):
+        """ Runs a policy forever (or each scenario loops times)
+
+            Each scenario runs on its own schedule, independently of the
+            others, with at most maxConcurrentScenarios running at a time.
+            The wait actions suspend the scenario, without holding a worker.
+            The inventory is synced on the default schedule.
+
+            loops counts the runs of each scenario (and of the inventory
+            sync) separately, as there are no global rounds anymore.
+            The first error raised by a scenario stops the other ones,
+            and is raised.
+
+            The hooks are added to all the scenarios. If profile is set,
+            the first round of the scenarios runs one after the other
+            under cProfile, and its stats (including the work done on
+            the worker threads) are written to that path.
         """
+        # imported here, so that validating doesn't load the clients
+        from .pod_scenario import PodScenario
+        from .node_scenario import NodeScenario
         config = policy.get("config", {})
-        wait_min = config.get("minSecondsBetweenRuns", 0)
-        wait_max = config.get("maxSecondsBetweenRuns", 300)
         node_scenarios = [
             NodeScenario(
                 name=item.get("name"),
@@ -75,15 +128,42 @@ class PolicyRunner():
             )
             for item in policy.get("podScenarios", [])
         ]
-        while loops is None or loops > 0:
-            for scenario in node_scenarios:
-                scenario.execute()
-            for scenario in pod_scenarios:
-                scenario.execute()
-            sleep_time = int(random.uniform(wait_min, wait_max))
-            logger.info("Sleeping for %s seconds", sleep_time)
-            time.sleep(sleep_time)
-            inventory.sync()
-            if loops is not None:
-                loops -= 1
+        scenarios = node_scenarios + pod_scenarios
+        items = policy.get("nodeScenarios", []) + policy.get("podScenarios", [])
+        schedules = [cls.get_schedule(item, config) for item in items]
+        for scenario in scenarios:
+            scenario.compile()
+            for hook in hooks or []:
+                scenario.add_hook(hook)
+        scheduler = scheduler or Scheduler(
+            max_concurrent=config.get("maxConcurrentScenarios",
+                DEFAULT_MAX_CONCURRENT_SCENARIOS),
+        )
+
+        runs = loops
+        first_runs = [None] * len(scenarios)
+        if profile:
+            with ThreadProfiler() as profiler:
+                for i, scenario in enumerate(scenarios):
+                    start = scheduler.clock()
+                    scenario.execute()
+                    first_runs[i] = schedules[i].next_run(start, scheduler.clock())
+            profiler.dump_stats(profile)
+            logger.info("Wrote the profile of the first round to %s", profile)
+            if runs is not None:
+                runs -= 1
+
+        for scenario, schedule, first_run in zip(scenarios, schedules, first_runs):
+            logger.info("Scheduling %s %r", scenario.name, schedule)
+            scheduler.add(scenario.name, scenario.execute_steps, schedule,
+                max_runs=runs,
+                first_run=first_run,
+            )
+        sync_schedule = cls.get_schedule(dict(), config)
+        now = scheduler.clock()
+        scheduler.add("inventory-sync", inventory.sync, sync_schedule,
+            max_runs=loops,
+            first_run=sync_schedule.next_run(now, now),
+        )
+        scheduler.run()
         return node_scenarios, pod_scenarios
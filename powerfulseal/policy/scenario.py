@@ -21,6 +21,27 @@ import calendar
 import random
 import logging
 import abc
+import inspect
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from operator import attrgetter
+from ..metrics import (
+    SCENARIO_EXECUTIONS,
+    SCENARIO_MATCHED_ITEMS,
+    SCENARIO_FILTERED_ITEMS,
+    ACTIONS,
+    profiled,
+)
+from .timing import RunRecord, timed
+
+
+# a filter or an action resolved to the method executing it
+Step = namedtuple("Step", ["key", "method", "params", "batch"])
+
+# a scenario's filters and actions, resolved once
+Plan = namedtuple("Plan", ["filters", "actions"])
+
 
 class Scenario():
     """ Basic class to represent a single testing scenario.
@@ -35,8 +56,31 @@ class Scenario():
 
         This is a base class, containing some shared filters, shouldn't be
         used by itself. It's extended for both node and pod scenarios.
+
+        Actions with a maxParallel parameter are run concurrently on a worker
+        pool shared by all the scenarios, but each action step still finishes
+        on all the items before the next one starts. Wait actions are
+        suspension points when the scenario runs through execute_steps.
     """
 
+    # size of the worker pool shared by all the scenarios
+    MAX_WORKERS = 32
+
+    _worker_pool = None
+    _worker_pool_lock = threading.Lock()
+
+    @classmethod
+    def get_worker_pool(cls):
+        """ Returns the worker pool shared by all the scenarios,
+            creating it on first use.
+        """
+        with Scenario._worker_pool_lock:
+            if Scenario._worker_pool is None:
+                Scenario._worker_pool = ThreadPoolExecutor(
+                    max_workers=cls.MAX_WORKERS,
+                )
+            return Scenario._worker_pool
+
     def __init__(self, name, schema, logger=None):
         self.name = name
         self.schema = schema
@@ -44,6 +88,51 @@ class Scenario():
         self.property_rewrite = {
             "group": "groups",
         }
+        self.plan = None
+        self._property_matchers = dict()
+        self.hooks = []
+        self.current_run = None
+        self.last_run = None
+
+    def add_hook(self, hook):
+        """ Adds a hook, called with the timings of each execution.
+            See powerfulseal/policy/timing.py
+        """
+        self.hooks.append(hook)
+
+    def compile(self):
+        """ Resolves the filters and actions of the schema to the methods
+            executing them, so that each execution only runs the plan.
+            Needs to be called again if the schema changes.
+        """
+        self.plan = Plan(
+            filters=self.compile_mapping(
+                self.schema.get("filters", []),
+                self.filter_methods(),
+            ),
+            actions=self.compile_mapping(
+                self.schema.get("actions", []),
+                self.action_methods(),
+                self.batch_action_methods(),
+            ),
+        )
+        return self.plan
+
+    def compile_mapping(self, criteria, mapping, batch_mapping=None):
+        """ Resolves each of the criteria to a step, based on policy keywords.
+        """
+        batch_mapping = batch_mapping or dict()
+        steps = []
+        for criterion in criteria:
+            for key, method in mapping.items():
+                if key in criterion:
+                    params = criterion.get(key)
+                    if key in batch_mapping:
+                        steps.append(Step(key, batch_mapping[key], params, True))
+                    else:
+                        steps.append(Step(key, method, params, False))
+                    break
+        return steps
 
     def execute(self):
         """ Main entry point to starting a scenario.
@@ -51,15 +140,53 @@ class Scenario():
             It calls .match() to compute the intial set of items,
             then goes through all the filters in sequence,
             and finally executes all the actions on all remaining items.
+
+            Each phase is timed, and the timings of the execution are kept
+            in last_run, and passed to the hooks.
+        """
+        self.wait_through(self.execute_steps())
+
+    def execute_steps(self):
+        """ Same as execute, but as a generator yielding the number of
+            seconds to wait at each wait action, instead of sleeping.
+            This lets the scheduler use the worker for other scenarios
+            in the meantime, and resume the execution afterwards.
+        """
+        plan = self.plan or self.compile()
+        SCENARIO_EXECUTIONS.inc(scenario=self.name)
+        record = self.current_run = RunRecord(self.name)
+        try:
+            with timed(self.hooks, self, record, "match", "match") as result:
+                initial_set = self.match()
+                result["size_out"] = len(initial_set)
+            self.logger.debug("Initial set: %r", initial_set)
+            self.logger.info("Initial set length: %d", len(initial_set))
+            SCENARIO_MATCHED_ITEMS.observe(len(initial_set), scenario=self.name)
+            filtered_set = self.run_filters(initial_set, plan.filters)
+            self.logger.debug("Filtered set: %r", filtered_set)
+            self.logger.info("Filtered set length: %d", len(filtered_set))
+            SCENARIO_FILTERED_ITEMS.observe(len(filtered_set), scenario=self.name)
+            for seconds in self.run_action_steps(filtered_set, plan.actions):
+                yield seconds
+            self.logger.info("Done")
+        finally:
+            record.finish()
+            self.current_run = None
+            self.last_run = record
+            for hook in self.hooks:
+                hook.on_run(self, record)
+
+    def wait_through(self, steps):
+        """ Runs a generator from execute_steps, run_action_steps or
+            a batch action to completion, sleeping whenever it says
+            to wait. Returns what the generator returns.
         """
-        initial_set = self.match()
-        self.logger.debug("Initial set: %r", initial_set)
-        self.logger.info("Initial set length: %d", len(initial_set))
-        filtered_set = self.filter(initial_set)
-        self.logger.debug("Filtered set: %r", filtered_set)
-        self.logger.info("Filtered set length: %d", len(filtered_set))
-        self.act(filtered_set)
-        self.logger.info("Done")
+        while True:
+            try:
+                seconds = next(steps)
+            except StopIteration as e:
+                return e.value
+            time.sleep(seconds)
 
     @abc.abstractmethod
     def match(self):
@@ -73,37 +200,56 @@ class Scenario():
         """
         if not criterion:
             return False
+        return self.compile_property(criterion)(candidate)
+
+    def compile_property(self, criterion):
+        """ Returns a function matching candidates against a property criterion.
+            The regular expression and the attribute getter are only built
+            once for each property and value.
+        """
         attr = criterion.get("name")
         attr = self.property_rewrite.get(attr, attr)
-        value = getattr(candidate, attr)
-        expr = re.compile(criterion.get("value"))
-        if type(value) is list:
-            return any([
-                expr.match(str(v))
-                for v in value
-            ])
-        else:
-            value = str(value)
-        return expr.match(value)
+        key = (attr, criterion.get("value"))
+        matcher = self._property_matchers.get(key)
+        if matcher is None:
+            getter = attrgetter(attr)
+            expr = re.compile(criterion.get("value")).match
+            def matcher(candidate):
+                value = getter(candidate)
+                if type(value) is list:
+                    return any([
+                        expr(str(v))
+                        for v in value
+                    ])
+                return expr(str(value))
+            self._property_matchers[key] = matcher
+        return matcher
 
-    def filter(self, items):
-        """ Applies various filters based on the given policy.
+    def filter_methods(self):
+        """ Returns the mapping of policy keywords to filters.
         """
-        filters = self.schema.get("filters", [])
-        mapping = {
+        return {
             "property": self.filter_property,
             "dayTime": self.filter_day_time,
             "randomSample": self.filter_random_sample,
             "probability": self.filter_probability,
         }
-        return self.filter_mapping(items, filters, mapping)
+
+    def filter(self, items):
+        """ Applies various filters based on the given policy.
+        """
+        filters = self.schema.get("filters", [])
+        return self.filter_mapping(items, filters, self.filter_methods())
 
     def filter_property(self, candidates, criterion):
         """ Filters out things which don't match their property filters.
         """
+        if not criterion:
+            return []
+        matcher = self.compile_property(criterion)
         return [
             candidate for candidate in candidates
-            if self.match_property(candidate, criterion)
+            if matcher(candidate)
         ]
 
     def filter_day_time(self, candidates, criterion, now=None):
@@ -171,20 +317,21 @@ class Scenario():
     def filter_mapping(self, items, filters, mapping):
         """ Executes filters mapped to methods, based on policy keywords.
         """
-        for criterion in filters:
-            filter_method = None
-            filter_params = None
-            for filter_type in mapping.keys():
-                if filter_type in criterion:
-                    filter_method = mapping.get(filter_type)
-                    filter_params = criterion.get(filter_type)
-                    len_before = len(items)
-                    items = filter_method(items, filter_params)
-                    len_after = len(items)
-                    self.logger.info("Filter %s: %d -> %d items", filter_type, len_before, len_after)
-                    break
+        return self.run_filters(items, self.compile_mapping(filters, mapping))
+
+    def run_filters(self, items, steps):
+        """ Executes the filter steps in sequence, stops on empty set.
+        """
+        for step in steps:
+            len_before = len(items)
+            with timed(self.hooks, self, self.current_run,
+                    "filter", step.key, len_before) as result:
+                items = step.method(items, step.params)
+                result["size_out"] = len(items)
+            len_after = len(items)
+            self.logger.info("Filter %s: %d -> %d items", step.key, len_before, len_after)
             if not items:
-                self.logger.info("Empty set after %r", criterion)
+                self.logger.info("Empty set after %r", {step.key: step.params})
                 break
         return items
 
@@ -197,21 +344,125 @@ class Scenario():
     def action_wait(self, item, params):
         """ Waits x seconds, according to the policy.
         """
+        time.sleep(self.wait_time(params))
+
+    def wait_time(self, params):
+        """ Returns how many seconds a wait action waits for.
+        """
         sleep_time = params.get("seconds", 0)
         self.logger.info("Action sleep for %s seconds", sleep_time)
-        time.sleep(sleep_time)
+        return sleep_time
+
+    def action_methods(self):
+        """ Returns the mapping of policy keywords to per-item actions.
+        """
+        return {
+            "wait": self.action_wait,
+        }
 
-    def act_mapping(self, items, actions, mapping):
+    def batch_action_methods(self):
+        """ Returns the mapping of policy keywords to actions,
+            which are given all the items at once.
+        """
+        return dict()
+
+    def act_mapping(self, items, actions, mapping, batch_mapping=None):
         """ Executes all the actions on the list of pods.
+            Actions present in batch_mapping are given all the items at once.
         """
-        for action in actions:
-            for key, method in mapping.items():
-                if key in action:
-                    params = action.get(key)
-                    for item in items:
-                        method(item, params)
-                        # special case - if we're waiting, only do that on first item
-                        if key == "wait":
-                            break
+        steps = self.compile_mapping(actions, mapping, batch_mapping)
+        return self.run_actions(items, steps)
+
+    def run_actions(self, items, steps):
+        """ Executes the action steps in sequence on all the items.
+            Each step is done on all the items before the next one starts.
+        """
+        self.wait_through(self.run_action_steps(items, steps, suspend=False))
+
+    def run_action_steps(self, items, steps, suspend=True):
+        """ Same as run_actions, but as a generator yielding the number
+            of seconds to wait. If suspend is set, the wait steps are
+            yielded (once, if there are any items), instead of calling
+            their method. Batch actions can wait the same way: if they
+            return a generator, what it yields is yielded, and it returns
+            the failed items.
+        """
+        for step in steps:
+            outcome = "failure"
+            try:
+                failed = []
+                with timed(self.hooks, self, self.current_run,
+                        "action", step.key, len(items)):
+                    if suspend and step.key == "wait":
+                        if items:
+                            yield self.wait_time(step.params)
+                    elif step.batch:
+                        result = step.method(items, step.params)
+                        if inspect.isgenerator(result):
+                            result = yield from result
+                        failed = self.failed_items(result)
+                    else:
+                        failed = self.run_step(items, step)
+                if failed:
+                    self.logger.warning("Action %s failed on %d/%d items",
+                        step.key, len(failed), len(items))
+                else:
+                    outcome = "success"
+            finally:
+                ACTIONS.inc(scenario=self.name, action=step.key, outcome=outcome)
 
+    def run_step(self, items, step):
+        """ Executes a single per-item action step on all the items.
+            Returns the items the action failed on.
+        """
+        # special case - if we're waiting, only do that on first item
+        if step.key == "wait":
+            for item in items[:1]:
+                step.method(item, step.params)
+            return []
+        params = step.params or dict()
+        failed = []
+        for result in self.map_parallel(
+            lambda item: self.run_item(step, item),
+            items,
+            params.get("maxParallel"),
+        ):
+            failed.extend(self.failed_items(result))
+        return failed
+
+    def failed_items(self, result):
+        """ Returns the items an action failed on, from what it returned.
+            Actions report the items they failed on by returning them
+            in a list, returning nothing means they all succeeded.
+        """
+        return list(result or [])
 
+    def run_item(self, step, item):
+        """ Executes a single action step on a single item.
+        """
+        if self.current_run is None:
+            return step.method(item, step.params)
+        with timed(self.hooks, self, self.current_run,
+                "item", "%s %s" % (step.key, item)):
+            return step.method(item, step.params)
+
+    def map_parallel(self, method, items, max_parallel=None):
+        """ Calls the method on each of the items, with at most max_parallel
+            calls running at the same time on the shared worker pool.
+            Returns the results in the order of the items, once all the
+            calls are done. If any call raised, the first error is raised.
+        """
+        items = list(items)
+        if not max_parallel or max_parallel <= 1 or len(items) <= 1:
+            return [method(item) for item in items]
+        pool = self.get_worker_pool()
+        futures = []
+        running = set()
+        for item in items:
+            if len(running) >= max_parallel:
+                _, running = wait(running, return_when=FIRST_COMPLETED)
+            future = pool.submit(profiled(method), item)
+            futures.append(future)
+            running.add(future)
+        wait(running)
+        return [future.result() for future in futures]
@@ -0,0 +1,331 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import inspect
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from ..metrics import SCENARIO_SKIPPED_RUNS
+
+
+class IntervalSchedule():
+    """ Runs every interval seconds, plus a random jitter of up to
+        jitter seconds, counted from the end of the previous run.
+    """
+
+    def __init__(self, interval, jitter=0, random=random.uniform):
+        self.interval = interval
+        self.jitter = jitter
+        self.random = random
+
+    def first_run(self, now):
+        return now
+
+    def next_run(self, start, end=None):
+        """ Returns when to run next, or None until the run is over.
+        """
+        if end is None:
+            return None
+        return end + self.interval + self.random(0, self.jitter)
+
+    def __repr__(self):
+        return "every %ss (+%ss)" % (self.interval, self.jitter)
+
+
+class CronSchedule():
+    """ Runs at the times matching a crontab expression, in local time:
+        "minute hour day-of-month month day-of-week", where each field is
+        *, a number, a range a-b, a list separated by commas, optionally
+        with a /step. @hourly, @daily, @weekly and @monthly are supported.
+    """
+
+    MACROS = {
+        "@hourly": "0 * * * *",
+        "@daily": "0 0 * * *",
+        "@weekly": "0 0 * * 0",
+        "@monthly": "0 0 1 * *",
+    }
+
+    # how far to look for a matching time (e.g. "0 0 31 2 *" never matches)
+    MAX_DAYS = 366 * 5
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = self.MACROS.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError("Cron expression needs 5 fields: %r" % expression)
+        self.minutes = self.parse_field(fields[0], 0, 59)
+        self.hours = self.parse_field(fields[1], 0, 23)
+        self.days = self.parse_field(fields[2], 1, 31)
+        self.months = self.parse_field(fields[3], 1, 12)
+        # both 0 and 7 are sunday
+        self.weekdays = set(
+            day % 7 for day in self.parse_field(fields[4], 0, 7)
+        )
+        # like cron, if both days are restricted, either can match
+        self.any_day = fields[2] != "*" and fields[4] != "*"
+
+    @staticmethod
+    def parse_field(field, minimum, maximum):
+        """ Returns the set of values a crontab field matches.
+        """
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/", 1)
+                step = int(step)
+            if part == "*":
+                start, end = minimum, maximum
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-", 1))
+            else:
+                start = int(part)
+                end = maximum if step > 1 else start
+            if step < 1 or start < minimum or end > maximum or start > end:
+                raise ValueError("Invalid cron field %r" % field)
+            values.update(range(start, end + 1, step))
+        return values
+
+    def matches_day(self, moment):
+        weekday = (moment.weekday() + 1) % 7
+        day = moment.day in self.days
+        week = weekday in self.weekdays
+        return (day or week) if self.any_day else (day and week)
+
+    def first_run(self, now):
+        return self.next_run(now)
+
+    def next_run(self, start, end=None):
+        """ Returns the first matching minute after start.
+        """
+        moment = datetime.fromtimestamp(start).replace(second=0, microsecond=0)
+        moment += timedelta(minutes=1)
+        limit = moment + timedelta(days=self.MAX_DAYS)
+        while moment < limit:
+            if moment.month not in self.months:
+                month = moment.month % 12 + 1
+                year = moment.year + (1 if month == 1 else 0)
+                moment = moment.replace(year=year, month=month, day=1,
+                    hour=0, minute=0)
+            elif not self.matches_day(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+        raise ValueError("Cron expression never matches: %r" % self.expression)
+
+    def __repr__(self):
+        return "cron %r" % self.expression
+
+
+class Job():
+    """ A function run by the scheduler, and its state.
+
+        If the function returns a generator, it's a run with suspension
+        points: each value it yields is a number of seconds after which
+        to resume it. Until it's exhausted, the run is still going.
+    """
+
+    def __init__(self, name, function, schedule, max_runs=None):
+        self.name = name
+        self.function = function
+        self.schedule = schedule
+        self.max_runs = max_runs
+        self.next_run = None
+        self.running = False
+        # the start, generator and resume time of a suspended run
+        self.started = None
+        self.coroutine = None
+        self.resume_at = None
+        self.runs = 0
+        self.errors = 0
+        self.skipped = 0
+
+    @property
+    def finished(self):
+        return self.max_runs is not None and self.runs >= self.max_runs
+
+    def __repr__(self):
+        return "[job %s, %r]" % (self.name, self.schedule)
+
+
+class Scheduler():
+    """ Runs each job on its own schedule, on a pool of workers.
+
+        A job never overlaps with itself: with an interval, the next run
+        is only scheduled once the previous one is over, and a cron run
+        due while the previous one is still going is skipped. At most
+        max_concurrent jobs run at the same time, the others wait for a
+        free worker in the order they were due. A suspended run doesn't
+        hold a worker, and it's resumed like a due job.
+
+        Jobs with max_runs stop being scheduled once they ran that many
+        times, and run() returns when all the jobs are finished.
+
+        Like the single loop used to, the scheduler stops at the first
+        error raised by a job: run() returns, and raises that error.
+    """
+
+    def __init__(self, max_concurrent=4, executor=None, clock=time.time,
+                 sleep=None, logger=None):
+        self.max_concurrent = max_concurrent
+        self.executor = executor
+        self.clock = clock
+        # waits on a condition by default, see run()
+        self.sleep = sleep
+        self.logger = logger or logging.getLogger(__name__)
+        self.jobs = []
+        self.active = 0
+        self.error = None
+        self._stopped = False
+        self._cond = threading.Condition(threading.RLock())
+
+    def add(self, name, function, schedule, max_runs=None, first_run=None):
+        """ Adds a job, running first at first_run (by default, as
+            soon as the schedule allows). Returns the job.
+        """
+        job = Job(name, function, schedule, max_runs=max_runs)
+        if not job.finished:
+            job.next_run = first_run
+            if first_run is None:
+                job.next_run = schedule.first_run(self.clock())
+        with self._cond:
+            self.jobs.append(job)
+            self._cond.notify_all()
+        return job
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent)
+        return self.executor
+
+    def run_pending(self):
+        """ Starts the jobs that are due and resumes the suspended runs
+            that are due, as long as there are free workers.
+            Returns when the next one is due, or None if none is scheduled
+            (jobs waiting for a free worker are started when one finishes).
+        """
+        with self._cond:
+            now = self.clock()
+            due = [
+                (job.resume_at, "resume", job) for job in self.jobs
+                if job.resume_at is not None and job.resume_at <= now
+            ] + [
+                (job.next_run, "start", job) for job in self.jobs
+                if job.next_run is not None and job.next_run <= now
+            ]
+            due.sort(key=lambda entry: entry[0])
+            waiting = set()
+            for _, kind, job in due:
+                if kind == "start" and job.running:
+                    job.skipped += 1
+                    SCENARIO_SKIPPED_RUNS.inc(scenario=job.name)
+                    self.logger.warning("%r is still running, skipping a run",
+                        job)
+                    job.next_run = job.schedule.next_run(now)
+                    continue
+                if self.active >= self.max_concurrent:
+                    waiting.add(job)
+                    continue
+                self.active += 1
+                if kind == "resume":
+                    job.resume_at = None
+                    self.get_executor().submit(self.run_job, job)
+                    continue
+                job.running = True
+                job.started = now
+                job.next_run = None
+                if job.max_runs is None or job.runs + 1 < job.max_runs:
+                    job.next_run = job.schedule.next_run(now)
+                self.get_executor().submit(self.run_job, job)
+            scheduled = [
+                time for job in self.jobs if job not in waiting
+                for time in (job.next_run, job.resume_at) if time is not None
+            ]
+            return min(scheduled) if scheduled else None
+
+    def run_job(self, job):
+        """ Runs (or resumes) the job, until it's over or suspended.
+        """
+        delay = None
+        try:
+            if job.coroutine is None:
+                result = job.function()
+                if inspect.isgenerator(result):
+                    job.coroutine = result
+            if job.coroutine is not None:
+                delay = next(job.coroutine) or 0
+        except StopIteration:
+            pass
+        except Exception as e:
+            job.errors += 1
+            self.logger.exception("Error running %r", job)
+            with self._cond:
+                if self.error is None:
+                    self.error = e
+                self._stopped = True
+        finally:
+            with self._cond:
+                self.active -= 1
+                if delay is not None:
+                    job.resume_at = self.clock() + delay
+                else:
+                    job.coroutine = None
+                    job.running = False
+                    job.runs += 1
+                    if job.finished:
+                        job.next_run = None
+                    elif job.next_run is None:
+                        job.next_run = job.schedule.next_run(
+                            job.started, self.clock())
+                self._cond.notify_all()
+
+    def run(self):
+        """ Runs the jobs until they're all finished, or stop() is called.
+            Raises the error of the first job that failed, if any.
+        """
+        self.run_until_stopped()
+        if self.error is not None:
+            raise self.error
+
+    def run_until_stopped(self):
+        with self._cond:
+            while not self._stopped:
+                next_run = self.run_pending()
+                if next_run is None and not self.active:
+                    return
+                timeout = None
+                if next_run is not None:
+                    timeout = max(next_run - self.clock(), 0)
+                if self.sleep is None or timeout is None:
+                    self._cond.wait(timeout)
+                else:
+                    # only meant for an executor running the jobs inline
+                    self.sleep(timeout)
+
+    def stop(self):
+        """ Makes run() return. The jobs already running aren't interrupted.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
@@ -0,0 +1,124 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+
+# how long a phase of a run took:
+#   - phase is one of "match", "filter", "action" and "item"
+#   - name is the filter or action keyword (or the item, for "item")
+#   - size_in and size_out are the number of items before and after
+Timing = namedtuple("Timing", ["phase", "name", "seconds", "size_in", "size_out"])
+
+
+class RunRecord():
+    """ The timings of all the phases of a single scenario execution.
+    """
+
+    def __init__(self, scenario, clock=time.time):
+        self.scenario = scenario
+        self.clock = clock
+        self.started = clock()
+        self.seconds = None
+        self.timings = []
+        self._lock = threading.Lock()
+
+    def add(self, timing):
+        with self._lock:
+            self.timings.append(timing)
+
+    def finish(self):
+        self.seconds = self.clock() - self.started
+
+    def slowest(self, phase=None):
+        """ Returns the slowest timing, optionally only for a phase.
+        """
+        timings = [
+            timing for timing in self.timings
+            if phase is None or timing.phase == phase
+        ]
+        if not timings:
+            return None
+        return max(timings, key=lambda timing: timing.seconds)
+
+    def to_dict(self):
+        return dict(
+            scenario=self.scenario,
+            started=self.started,
+            seconds=self.seconds,
+            timings=[timing._asdict() for timing in self.timings],
+        )
+
+
+class ScenarioHook():
+    """ Base class for the hooks called by the scenarios with their timings.
+        Subclasses override the methods they're interested in.
+    """
+
+    def on_timing(self, scenario, record, timing):
+        """ Called after each phase, as soon as it's timed.
+        """
+        pass
+
+    def on_run(self, scenario, record):
+        """ Called at the end of each execution, with the full record.
+        """
+        pass
+
+
+class LoggingHook(ScenarioHook):
+    """ Logs a summary of each execution, and the slowest phases.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+
+    def on_run(self, scenario, record):
+        self.logger.info("Scenario %s took %.3fs", record.scenario, record.seconds)
+        for timing in record.timings:
+            if timing.phase != "item":
+                self.logger.info("  %s %s: %.3fs (%s -> %s items)",
+                    timing.phase, timing.name, timing.seconds,
+                    timing.size_in, timing.size_out)
+        slowest = record.slowest("item")
+        if slowest is not None:
+            self.logger.info("  slowest item: %s in %.3fs",
+                slowest.name, slowest.seconds)
+
+
+@contextmanager
+def timed(hooks, scenario, record, phase, name, size_in=None):
+    """ Times the block, and reports it to the record and the hooks.
+        The block can set the size of its output with result["size_out"].
+    """
+    result = dict(size_out=None)
+    if record is None:
+        yield result
+        return
+    start = record.clock()
+    try:
+        yield result
+    finally:
+        timing = Timing(
+            phase, name, record.clock() - start, size_in, result["size_out"],
+        )
+        record.add(timing)
+        for hook in hooks:
+            hook.on_timing(scenario, record, timing)
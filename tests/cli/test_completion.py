@@ -0,0 +1,95 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from unittest.mock import MagicMock
+
+from powerfulseal.cli.completion import PrefixIndex, CompletionIndex
+from powerfulseal.cli.pscmd import PSCmd
+from powerfulseal.node import Node
+
+
+def test_prefix_index_is_case_insensitive():
+    index = PrefixIndex(["Zone-B", "zone-a", "node1", "node10", "node2", None, "node1"])
+    assert index.complete("ZONE") == ["zone-a", "Zone-B"]
+    assert index.complete("node1") == ["node1", "node10"]
+    assert index.complete("nope") == []
+    assert len(index.complete()) == 5
+
+
+def test_completion_indexes_the_inventory():
+    inventory = MagicMock()
+    inventory.get_azs.return_value = ["AZ1"]
+    inventory.get_groups.return_value = ["masters"]
+    inventory.find_nodes.return_value = [
+        Node(id="id1", ip="10.0.0.1", name="master1", no=0),
+    ]
+    index = CompletionIndex()
+    index.update_nodes(inventory)
+    assert index.nodes.complete("ma") == ["master1", "masters"]
+    assert index.nodes.complete("a") == ["all", "AZ1"]
+    assert index.nodes.complete("10.") == ["10.0.0.1"]
+    assert index.nodes.complete("unk") == ["UNKNOWN"]
+
+
+def test_completers_dont_call_the_apis():
+    inventory = MagicMock()
+    inventory.get_azs.return_value = []
+    inventory.get_groups.return_value = []
+    inventory.find_nodes.return_value = []
+    k8s_inventory = MagicMock()
+    k8s_inventory.find_namespaces.return_value = ["default", "kube-system"]
+    k8s_inventory.find_deployments.return_value = ["api", "web"]
+    cmd = PSCmd(inventory, MagicMock(), MagicMock(), k8s_inventory)
+    cmd.do_deployments("default")
+    k8s_inventory.reset_mock()
+    inventory.reset_mock()
+    assert cmd.complete_pods("k", "pods k", 5, 6) == ["kube-system"]
+    assert cmd.complete_pods_for_deployment("w", "pods_for_deployment default w", 0, 0) == ["web"]
+    assert cmd.complete_pods_for_deployment("", "pods_for_deployment other ", 0, 0) == []
+    assert cmd.completedefault("a", "nodes a", 6, 7) == ["all"]
+    assert not k8s_inventory.method_calls
+    assert not inventory.find_nodes.called
+
+
+def test_deployments_of_every_namespace_are_indexed_on_refresh():
+    inventory = MagicMock()
+    inventory.get_azs.return_value = []
+    inventory.get_groups.return_value = []
+    inventory.find_nodes.return_value = []
+    k8s_inventory = MagicMock()
+    k8s_inventory.find_namespaces.return_value = ["default", "kube-system"]
+    k8s_inventory.find_deployments.side_effect = lambda namespace: {
+        "default": ["api", "web"],
+        "kube-system": ["dns"],
+    }[namespace]
+    cmd = PSCmd(inventory, MagicMock(), MagicMock(), k8s_inventory)
+    k8s_inventory.reset_mock()
+    assert cmd.complete_pods_for_deployment("w", "pods_for_deployment default w", 0, 0) == ["web"]
+    assert cmd.complete_pods_for_deployment("", "pods_for_deployment kube-system ", 0, 0) == ["dns"]
+    assert not k8s_inventory.method_calls
+
+
+def test_completers_dont_call_the_apis_when_the_listing_failed():
+    inventory = MagicMock()
+    inventory.get_azs.return_value = []
+    inventory.get_groups.return_value = []
+    inventory.find_nodes.return_value = []
+    k8s_inventory = MagicMock()
+    k8s_inventory.find_namespaces.side_effect = Exception("nope")
+    cmd = PSCmd(inventory, MagicMock(), MagicMock(), k8s_inventory)
+    k8s_inventory.reset_mock()
+    for _ in range(2):
+        assert cmd.complete_pods("d", "pods d", 5, 6) == []
+    assert not k8s_inventory.method_calls
@@ -0,0 +1,70 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import subprocess
+import sys
+import argparse
+import pytest
+
+from powerfulseal.cli.__main__ import main, parse_tag
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+POLICY = os.path.join(ROOT, "tests", "policy", "example_config.yml")
+
+
+def run_python(code, *args):
+    output = subprocess.check_output(
+        [sys.executable, "-W", "ignore", "-c", code] + list(args),
+        cwd=ROOT,
+    )
+    return output.decode().strip().splitlines()
+
+
+def test_validate_policy_doesnt_import_clients():
+    lines = run_python("\n".join([
+        "import sys",
+        "from powerfulseal.cli.__main__ import main",
+        "main(['--validate-policy-file', sys.argv[1]])",
+        "heavy = ('boto3', 'openstack', 'kubernetes', 'spur', 'paramiko')",
+        "print('imported:' + ','.join(m for m in heavy if m in sys.modules))",
+    ]), POLICY)
+    assert lines[-1] == "imported:"
+
+
+def test_drivers_still_importable_from_package():
+    lines = run_python("\n".join([
+        "from powerfulseal.clouddrivers import AWSDriver, OpenStackDriver",
+        "print(AWSDriver.__name__, OpenStackDriver.__name__)",
+    ]))
+    assert lines[-1] == "AWSDriver OpenStackDriver"
+
+
+def test_parse_tag():
+    assert parse_tag("env=prod") == ("env", "prod")
+    assert parse_tag("owner=a=b") == ("owner", "a=b")
+    assert parse_tag("empty=") == ("empty", "")
+    for value in ("env", "=prod", ""):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_tag(value)
+
+
+def test_invalid_aws_tag_is_a_usage_error(capsys):
+    with pytest.raises(SystemExit) as e:
+        main(["--aws-cloud", "--aws-tag", "env"])
+    assert e.value.code == 2
+    assert "expected KEY=VALUE" in capsys.readouterr().err
@@ -1,7 +1,7 @@
 import pytest
 from mock import patch, MagicMock
 from powerfulseal.clouddrivers import aws_driver
-from powerfulseal.node import Node
+from powerfulseal.node import Node, NodeState
 
 IPS = ['198.168.1.1', '198.168.2.1']
 
@@ -28,4 +28,101 @@ def test_aws_driver(create_connection_from_config, ec2_instances):
     nodes = some.get_by_ip(IPS[0])
     assert ec2_instances[0].id is nodes.id
     assert ec2_instances[0].placement['AvailabilityZone'] is nodes.az
-    assert ec2_instances[0].private_ip_address == nodes.ip
\ No newline at end of file
+    assert ec2_instances[0].private_ip_address == nodes.ip
+
+def describe_page(instances):
+    return {
+        "Reservations": [{
+            "Instances": [
+                {
+                    "InstanceId": instance.id,
+                    "PrivateIpAddress": instance.private_ip_address,
+                    "PublicIpAddress": instance.public_ip_address,
+                    "Placement": instance.placement,
+                    "State": instance.state,
+                }
+                for instance in instances
+            ]
+        }]
+    }
+
+@patch('powerfulseal.clouddrivers.aws_driver.create_connection_from_config')
+def test_aws_driver_get_by_ips(create_connection_from_config, ec2_instances):
+    some = aws_driver.AWSDriver()
+    paginator = some.conn.meta.client.get_paginator.return_value
+    paginator.paginate.return_value = [describe_page(ec2_instances)]
+    some.sync(ips=IPS)
+    assert some.conn.meta.client.get_paginator.call_args[0] == ("describe_instances",)
+    # private and public IPs, deduplicated by instance
+    assert paginator.paginate.call_count == 2
+    assert len(some.remote_servers) == 2
+    nodes = some.get_by_ips(IPS + ["41.41.41.41", "1.1.1.1"])
+    assert nodes[IPS[0]].id == ec2_instances[0].id
+    assert nodes[IPS[0]].az == "us-east-1a"
+    assert nodes[IPS[1]].id == ec2_instances[1].id
+    assert nodes["41.41.41.41"].id == ec2_instances[1].id
+    assert nodes["41.41.41.41"].ip == "41.41.41.41"
+    assert nodes["1.1.1.1"] is None
+
+@patch('powerfulseal.clouddrivers.aws_driver.create_connection_from_config')
+def test_aws_driver_builds_filters(create_connection_from_config):
+    some = aws_driver.AWSDriver(tags={"cluster": "prod"}, vpc_id="vpc-1")
+    some.MAX_FILTER_VALUES = 2
+    queries = some.build_queries(["10.0.0.1", "10.0.0.2", "10.0.0.3", "some-hostname"])
+    common = [
+        {"Name": "tag:cluster", "Values": ["prod"]},
+        {"Name": "vpc-id", "Values": ["vpc-1"]},
+    ]
+    assert queries == [
+        common + [{"Name": "private-ip-address", "Values": ["10.0.0.1", "10.0.0.2"]}],
+        common + [{"Name": "ip-address", "Values": ["10.0.0.1", "10.0.0.2"]}],
+        common + [{"Name": "private-ip-address", "Values": ["10.0.0.3"]}],
+        common + [{"Name": "ip-address", "Values": ["10.0.0.3"]}],
+    ]
+    assert some.build_queries() == [common]
+
+@pytest.mark.parametrize("method, operation", [
+    ("stop_many", "stop_instances"),
+    ("start_many", "start_instances"),
+    ("delete_many", "terminate_instances"),
+])
+@patch('powerfulseal.clouddrivers.aws_driver.create_connection_from_config')
+def test_aws_driver_batches_instance_ids(create_connection_from_config, ec2_instances, method, operation):
+    some = aws_driver.AWSDriver()
+    some.MAX_INSTANCE_IDS = 2
+    nodes = ec2_instances + [EC2instance(id="i-3", private_ip_address="198.168.3.1",
+        zone="us-east-1a", public_ip_address=None, state="Running")]
+    failures = getattr(some, method)(nodes)
+    assert failures == []
+    api_call = getattr(some.conn.meta.client, operation)
+    assert [call[1] for call in api_call.call_args_list] == [
+        {"InstanceIds": ["i-123456789", "i-987654321"]},
+        {"InstanceIds": ["i-3"]},
+    ]
+
+@patch('powerfulseal.clouddrivers.aws_driver.create_connection_from_config')
+def test_aws_driver_retries_failed_batch_one_by_one(create_connection_from_config, ec2_instances):
+    some = aws_driver.AWSDriver()
+    error = Exception("InvalidInstanceID")
+    some.conn.meta.client.stop_instances.side_effect = error
+    some.stop = MagicMock(side_effect=[None, error])
+    failures = some.stop_many(ec2_instances)
+    assert some.conn.meta.client.stop_instances.call_count == 1
+    assert some.stop.call_count == 2
+    assert failures == [(ec2_instances[1], error)]
+
+@patch('powerfulseal.clouddrivers.aws_driver.create_connection_from_config')
+def test_aws_driver_get_states(create_connection_from_config, ec2_instances):
+    some = aws_driver.AWSDriver()
+    ec2_instances[1].state = {"Name": "stopping"}
+    paginator = some.conn.meta.client.get_paginator.return_value
+    paginator.paginate.return_value = [describe_page(ec2_instances)]
+    states = some.get_states(ec2_instances)
+    assert paginator.paginate.call_count == 1
+    assert paginator.paginate.call_args[1]["Filters"] == [
+        {"Name": "instance-id", "Values": ["i-123456789", "i-987654321"]},
+    ]
+    assert states == {
+        "i-123456789": NodeState.UP,
+        "i-987654321": NodeState.UNKNOWN,
+    }
@@ -22,3 +22,10 @@ def test_driver_is_abstract():
         pass
     with pytest.raises(TypeError):
         TestDriver(driver=None)
+
+def test_only_drivers_fetching_states_report_them():
+    from powerfulseal.clouddrivers import AWSDriver, OpenStackDriver, NoCloudDriver
+    assert not AbstractDriver.reports_states
+    assert not NoCloudDriver.reports_states
+    assert AWSDriver.reports_states
+    assert OpenStackDriver.reports_states
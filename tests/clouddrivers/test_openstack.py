@@ -79,8 +79,8 @@ def test_get_by_ip_empty(driver):
     node = driver.get_by_ip("1.2.3.4")
     assert node is None
 
-@patch('powerfulseal.clouddrivers.open_stack_driver.connection')
-@patch('powerfulseal.clouddrivers.open_stack_driver.config')
+@patch('openstack.connection')
+@patch('openstack.config')
 def test_create_connection_from_config(config, connection):
     cloud_mock = MagicMock()
     occ_mock = MagicMock()
@@ -96,3 +96,18 @@ def test_create_connection_from_config(config, connection):
     assert occ_mock.get_one_cloud.call_args[0] == (name,)
     assert connection.from_config.called
 
+
+def test_get_by_ip_uses_an_index(driver, example_servers):
+    driver.conn.compute.servers.return_value = example_servers
+    driver.sync()
+    assert sorted(driver.get_index().keys()) == ["1.2.3.4", "11.22.33.44"]
+    nodes = driver.get_by_ips(["1.2.3.4", "11.22.33.44", "5.6.7.8"])
+    assert nodes["1.2.3.4"].id == "some_id"
+    assert nodes["11.22.33.44"].id == "some_id"
+    assert nodes["5.6.7.8"] is None
+
+def test_setting_servers_invalidates_the_index(driver, example_servers):
+    driver.remote_servers = []
+    assert driver.get_by_ip("1.2.3.4") is None
+    driver.remote_servers = example_servers
+    assert driver.get_by_ip("1.2.3.4").id == "some_id"
@@ -0,0 +1,91 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+from powerfulseal.execute import RemoteExecutor
+from powerfulseal.node import Node
+
+
+@pytest.fixture
+def nodes():
+    return [
+        Node(id="id%d" % i, ip="198.168.1.%d" % i, name="node%d" % i)
+        for i in range(10)
+    ]
+
+def make_output(return_code=0, stdout=b"out", stderr=b""):
+    output = MagicMock()
+    output.return_code = return_code
+    output.output = stdout
+    output.stderr_output = stderr
+    return output
+
+
+@patch("powerfulseal.execute.remote_executor.spur")
+def test_execute_returns_results_per_ip(spur, nodes):
+    spur.SshShell.return_value.run.return_value = make_output()
+    executor = RemoteExecutor()
+    res = executor.execute("hostname", nodes=nodes)
+    assert list(res.keys()) == [node.ip for node in nodes]
+    for value in res.values():
+        assert value == {"ret_code": 0, "stdout": "out", "stderr": ""}
+    assert spur.SshShell.call_count == len(nodes)
+
+
+@patch("powerfulseal.execute.remote_executor.spur")
+def test_execute_reports_errors(spur, nodes):
+    spur.SshShell.return_value.run.side_effect = Exception("nope")
+    executor = RemoteExecutor()
+    res = executor.execute("hostname", nodes=nodes[:1])
+    assert res == {nodes[0].ip: {"ret_code": 1, "error": "nope"}}
+
+
+@pytest.mark.parametrize("max_parallel", [2, 5])
+@patch("powerfulseal.execute.remote_executor.spur")
+def test_execute_in_parallel_is_bounded(spur, nodes, max_parallel):
+    lock = threading.Lock()
+    state = dict(running=0, peak=0)
+    def run(cmd):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return make_output()
+    spur.SshShell.return_value.run.side_effect = run
+    executor = RemoteExecutor(max_parallel=max_parallel)
+    res = executor.execute("hostname", nodes=nodes)
+    assert list(res.keys()) == [node.ip for node in nodes]
+    assert state["peak"] == max_parallel
+
+
+@patch("powerfulseal.execute.remote_executor.spur")
+def test_execute_times_out_per_node(spur, nodes):
+    process = MagicMock()
+    process.is_running.return_value = True
+    spur.SshShell.return_value.spawn.return_value = process
+    executor = RemoteExecutor(max_parallel=2)
+    executor.POLL_INTERVAL = 0.01
+    res = executor.execute("sleep 1000", nodes=nodes[:2], timeout=0.05)
+    for value in res.values():
+        assert value["ret_code"] == 1
+        assert "Timed out" in value["error"]
+    assert spur.SshShell.call_args[1]["connect_timeout"] == 0.05
@@ -0,0 +1,130 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from powerfulseal.execute import SSHConnectionPool, RemoteExecutor
+from powerfulseal.node import Node
+
+
+@pytest.fixture
+def spur():
+    with patch("powerfulseal.execute.ssh_pool.spur") as spur:
+        spur.SshShell.side_effect = lambda **kwargs: MagicMock(_client=None)
+        yield spur
+
+
+def test_reuses_released_shells(spur):
+    pool = SSHConnectionPool()
+    shell = pool.acquire("1.2.3.4", "user")
+    pool.release(shell)
+    assert pool.acquire("1.2.3.4", "user") is shell
+    assert pool.stats()["hits"] == 1
+    assert pool.stats()["misses"] == 1
+    assert spur.SshShell.call_count == 1
+
+
+def test_keys_on_host_user_and_key(spur):
+    pool = SSHConnectionPool()
+    shell = pool.acquire("1.2.3.4", "user", "key1")
+    pool.release(shell)
+    assert pool.acquire("1.2.3.4", "user", "key2") is not shell
+    assert pool.acquire("1.2.3.4", "other", "key1") is not shell
+    assert pool.acquire("5.6.7.8", "user", "key1") is not shell
+    assert pool.stats()["misses"] == 4
+
+
+def test_keys_on_host_key_policy_and_timeout(spur):
+    pool = SSHConnectionPool()
+    shell = pool.acquire("1.2.3.4", "user", missing_host_key="accept",
+        connect_timeout=5)
+    pool.release(shell)
+    assert pool.acquire("1.2.3.4", "user", missing_host_key="raise_error",
+        connect_timeout=5) is not shell
+    assert pool.acquire("1.2.3.4", "user", missing_host_key="accept",
+        connect_timeout=10) is not shell
+    assert pool.acquire("1.2.3.4", "user", missing_host_key="accept",
+        connect_timeout=5) is shell
+
+
+def test_doesnt_reuse_unhealthy_shells(spur):
+    pool = SSHConnectionPool()
+    shell = pool.acquire("1.2.3.4", "user")
+    pool.release(shell, healthy=False)
+    assert shell.close.called
+    assert pool.acquire("1.2.3.4", "user") is not shell
+
+
+def test_drops_dead_connections(spur):
+    pool = SSHConnectionPool()
+    shell = pool.acquire("1.2.3.4", "user")
+    shell._client = MagicMock()
+    shell._client.get_transport.return_value.is_active.return_value = False
+    pool.release(shell)
+    assert pool.acquire("1.2.3.4", "user") is not shell
+    assert shell.close.called
+
+
+def test_evicts_above_max_size(spur):
+    pool = SSHConnectionPool(max_size=2)
+    shells = [pool.acquire("10.0.0.%d" % i) for i in range(3)]
+    for shell in shells:
+        pool.release(shell)
+    assert shells[0].close.called
+    assert pool.stats()["idle"] == 2
+    assert pool.stats()["evictions"] == 1
+
+
+def test_expires_idle_shells(spur, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("time.time", lambda: now[0])
+    pool = SSHConnectionPool(idle_timeout=10)
+    shell = pool.acquire("1.2.3.4")
+    pool.release(shell)
+    now[0] += 11
+    assert pool.acquire("1.2.3.4") is not shell
+    assert shell.close.called
+
+
+def test_expires_idle_shells_on_release(spur, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("time.time", lambda: now[0])
+    pool = SSHConnectionPool(idle_timeout=10)
+    idle = pool.acquire("1.2.3.4")
+    busy = pool.acquire("5.6.7.8")
+    pool.release(idle)
+    now[0] += 11
+    pool.release(busy)
+    assert idle.close.called
+    assert not busy.close.called
+    assert pool.stats()["idle"] == 1
+
+
+def test_executor_uses_the_pool(spur):
+    output = MagicMock(return_code=0, output=b"", stderr_output=b"")
+    shell = MagicMock(_client=None)
+    shell.run.return_value = output
+    spur.SshShell.side_effect = None
+    spur.SshShell.return_value = shell
+    pool = SSHConnectionPool()
+    executor = RemoteExecutor(pool=pool)
+    node = Node(id="id1", ip="1.2.3.4")
+    for _ in range(5):
+        executor.execute("hostname", nodes=[node])
+    assert spur.SshShell.call_count == 1
+    assert shell.run.call_count == 5
+    assert not shell.close.called
+    assert pool.stats()["hits"] == 4
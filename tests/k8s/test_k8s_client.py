@@ -0,0 +1,108 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from powerfulseal.k8s import K8sClient, K8sInventory
+
+
+def make_page(items, _continue=None):
+    page = MagicMock()
+    page.items = items
+    page.metadata._continue = _continue
+    return page
+
+@pytest.fixture
+def k8s_client():
+    with patch("powerfulseal.k8s.k8s_client.kubernetes"):
+        yield K8sClient(page_size=2)
+
+
+def test_paginate_follows_continue_tokens(k8s_client):
+    method = MagicMock(side_effect=[
+        make_page([1, 2], "token1"),
+        make_page([3, 4], "token2"),
+        make_page([5], None),
+    ])
+    assert list(k8s_client.paginate(method, namespace="ns")) == [1, 2, 3, 4, 5]
+    calls = [kwargs for args, kwargs in method.call_args_list]
+    assert calls == [
+        dict(namespace="ns", limit=2),
+        dict(namespace="ns", limit=2, _continue="token1"),
+        dict(namespace="ns", limit=2, _continue="token2"),
+    ]
+
+def test_paginate_is_lazy(k8s_client):
+    method = MagicMock(side_effect=[
+        make_page([1, 2], "token1"),
+        make_page([3], None),
+    ])
+    items = k8s_client.paginate(method)
+    assert next(items) == 1
+    assert next(items) == 2
+    assert method.call_count == 1
+
+def test_paginate_without_page_size(k8s_client):
+    k8s_client.page_size = None
+    method = MagicMock(return_value=make_page([1, 2, 3], "token"))
+    assert list(k8s_client.paginate(method)) == [1, 2, 3]
+    assert method.call_args[1] == dict()
+
+def test_list_pods_pages(k8s_client):
+    k8s_client.client_corev1api.list_namespaced_pod.side_effect = [
+        make_page(["a", "b"], "token"),
+        make_page(["c"]),
+    ]
+    assert k8s_client.list_pods(namespace="ns", selector="app=web") == ["a", "b", "c"]
+
+def make_k8s_node(name, ips, labels):
+    node = MagicMock()
+    node.metadata.name = name
+    node.metadata.labels = labels
+    node.status.addresses = [MagicMock(address=ip) for ip in ips]
+    return node
+
+def test_get_nodes_groups(k8s_client):
+    k8s_client.client_corev1api.list_node.side_effect = [
+        make_page([
+            make_k8s_node("n1", ["10.0.0.1", "n1"], {"role": "master", "zone": "a"}),
+            make_k8s_node("n2", ["10.0.0.2"], {"role": "worker", "zone": "a"}),
+        ], "token"),
+        make_page([
+            make_k8s_node("n3", ["10.0.0.3"], {"role": "worker", "zone": "b"}),
+            make_k8s_node("n4", [], {"role": "worker"}),
+            make_k8s_node("n5", ["10.0.0.5"], None),
+        ]),
+    ]
+    assert k8s_client.get_nodes_groups() == {
+        "master": ["10.0.0.1", "n1"],
+        "worker": ["10.0.0.2", "10.0.0.3"],
+        "a": ["10.0.0.1", "10.0.0.2", "n1"],
+        "b": ["10.0.0.3"],
+    }
+    assert k8s_client.client_corev1api.list_node.call_count == 2
+
+def test_get_nodes_groups_restricted_to_label_keys(k8s_client):
+    k8s_client.client_corev1api.list_node.return_value = make_page([
+        make_k8s_node("n1", ["10.0.0.1"], {"role": "master", "hostname": "n1"}),
+        make_k8s_node("n2", ["10.0.0.2"], {"role": "worker", "hostname": "n2"}),
+        make_k8s_node("n3", ["10.0.0.2"], {"role": "worker", "hostname": "n3"}),
+    ])
+    assert k8s_client.get_nodes_groups(label_keys=["role"]) == {
+        "master": ["10.0.0.1"],
+        "worker": ["10.0.0.2"],
+    }
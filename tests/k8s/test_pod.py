@@ -1,4 +1,6 @@
+from unittest.mock import MagicMock
 from powerfulseal.k8s import Pod
+from powerfulseal.k8s.k8s_inventory import create_pod_from_item
 
 EXAMPLE_POD_ARGS1 = dict(
     uid="someid",
@@ -22,3 +24,32 @@ def test_pods_are_deduplicated_without_uids():
     collection.add(Pod(**EXAMPLE_POD_ARGS2))
     collection.add(Pod(**EXAMPLE_POD_ARGS2))
     assert len(collection) == 1
+
+def test_pods_are_slim():
+    pod = Pod(**EXAMPLE_POD_ARGS1)
+    assert not hasattr(pod, "__dict__")
+    assert pod.meta is None
+
+def test_pods_intern_repeated_strings():
+    labels = {"".join(["ap", "p"]): "".join(["we", "b"])}
+    pod1 = Pod(name="a", namespace="".join(["def", "ault"]), labels=labels)
+    pod2 = Pod(name="b", namespace="default", labels={"app": "web"})
+    assert pod1.namespace is pod2.namespace
+    assert pod1.labels is pod2.labels
+    for (k1, v1), (k2, v2) in zip(pod1.labels.items(), pod2.labels.items()):
+        assert k1 is k2
+        assert v1 is v2
+
+def test_create_pod_only_keeps_meta_on_demand():
+    item = MagicMock()
+    item.metadata.name = "name"
+    item.metadata.namespace = "default"
+    item.metadata.labels = {"app": "web"}
+    item.status.phase = "Running"
+    item.status.host_ip = "10.0.0.1"
+    item.status.container_statuses = [MagicMock(container_id="docker://123")]
+    pod = create_pod_from_item(item, num=1)
+    assert pod.meta is None
+    assert pod.container_ids == ("docker://123",)
+    assert pod.labels == {"app": "web"}
+    assert create_pod_from_item(item, keep_meta=True).meta is item
@@ -0,0 +1,156 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+from unittest.mock import MagicMock
+
+from powerfulseal.k8s import PodInformer, K8sInventory
+from powerfulseal.k8s.pod_informer import parse_selector, labels_match
+
+
+def make_item(name, namespace="default", labels=None, version="1"):
+    item = MagicMock()
+    item.metadata.name = name
+    item.metadata.namespace = namespace
+    item.metadata.uid = namespace + "/" + name
+    item.metadata.labels = labels
+    item.metadata.resource_version = version
+    item.status.container_statuses = []
+    return item
+
+@pytest.fixture
+def items():
+    return [
+        make_item("a", labels={"app": "web", "tier": "front"}),
+        make_item("b", labels={"app": "db"}),
+        make_item("c", namespace="other", labels={"app": "web"}),
+        make_item("d", namespace="other"),
+    ]
+
+@pytest.fixture
+def informer(items):
+    k8s_client = MagicMock()
+    k8s_client.list_all_pods.return_value.items = items
+    k8s_client.list_all_pods.return_value.metadata.resource_version = "10"
+    informer = PodInformer(k8s_client=k8s_client)
+    informer.relist()
+    return informer
+
+
+@pytest.mark.parametrize("selector, expected", [
+    ("", []),
+    ("app=web", [("app", "in", {"web"})]),
+    ("app==web, tier!=front", [("app", "in", {"web"}), ("tier", "notin", {"front"})]),
+    ("app in (web, db),tier notin (x)", [("app", "in", {"web", "db"}), ("tier", "notin", {"x"})]),
+    ("app,!tier", [("app", "exists", None), ("tier", "!exists", None)]),
+])
+def test_parse_selector(selector, expected):
+    assert parse_selector(selector) == expected
+
+def test_parse_selector_raises_on_garbage():
+    with pytest.raises(ValueError):
+        parse_selector("app=(")
+
+@pytest.mark.parametrize("selector, should_match", [
+    ("app=web", True),
+    ("app!=web", False),
+    ("app in (db, web)", True),
+    ("tier notin (front)", True),
+    ("tier", False),
+    ("!tier", True),
+])
+def test_labels_match(selector, should_match):
+    assert labels_match({"app": "web"}, parse_selector(selector)) == should_match
+
+
+@pytest.mark.parametrize("namespace, selector, expected", [
+    (None, None, ["a", "b", "c", "d"]),
+    ("default", None, ["a", "b"]),
+    ("other", "app=web", ["c"]),
+    (None, "app=web", ["a", "c"]),
+    (None, "app!=web", ["b", "d"]),
+    ("default", "app=web,tier=front", ["a"]),
+    ("nope", None, []),
+])
+def test_find(informer, namespace, selector, expected):
+    found = informer.find(namespace=namespace, selector=selector)
+    assert [pod.name for pod in found] == expected
+
+def test_find_with_labels(informer):
+    found = informer.find(namespace="default", labels={"app": "db"})
+    assert [pod.name for pod in found] == ["b"]
+
+def test_handles_events(informer):
+    informer.handle_event(dict(
+        type="MODIFIED",
+        object=make_item("b", labels={"app": "web"}, version="11"),
+    ))
+    informer.handle_event(dict(type="DELETED", object=make_item("a", version="12")))
+    informer.handle_event(dict(type="ADDED", object=make_item("e", version="13")))
+    assert [pod.name for pod in informer.find("default")] == ["b", "e"]
+    assert [pod.name for pod in informer.find(selector="app=web")] == ["b", "c"]
+    assert ("tier", "front") not in informer.uids_by_label
+    assert informer.resource_version == "13"
+
+def test_resumes_watch_and_relists_on_gone(informer):
+    informer.WATCH_TIMEOUT_SECONDS = 1
+    streams = [
+        [dict(type="ADDED", object=make_item("e", version="11"))],
+        [dict(type="ERROR", raw_object=dict(code=410, message="Gone"))],
+        [],
+    ]
+    versions = []
+    def watch_all_pods(resource_version, timeout_seconds):
+        versions.append(resource_version)
+        if len(versions) == len(streams):
+            informer.stop()
+        return MagicMock(), iter(streams[len(versions) - 1])
+    informer.k8s_client.watch_all_pods = watch_all_pods
+    informer.run()
+    assert versions == ["10", "11", "10"]
+    assert informer.k8s_client.list_all_pods.call_count == 2
+
+def test_inventory_uses_informer(informer):
+    k8s_inventory = K8sInventory(k8s_client=informer.k8s_client, informer=informer)
+    informer.k8s_client.get_deployment_labels.return_value = {"app": "web"}
+    pods = k8s_inventory.find_pods("other", deployment_name="something")
+    assert [pod.name for pod in pods] == ["c"]
+    pods = k8s_inventory.find_pods("default", selector="app")
+    assert [pod.name for pod in pods] == ["a", "b"]
+    assert not informer.k8s_client.iter_pods.called
+
+def test_keeps_only_pods(informer):
+    from powerfulseal.k8s import Pod
+    for pod in informer.pods_by_uid.values():
+        assert isinstance(pod, Pod)
+        assert pod.meta is None
+    k8s_inventory = K8sInventory(k8s_client=informer.k8s_client, informer=informer)
+    pods = k8s_inventory.find_pods("other")
+    assert [pod.num for pod in pods] == [0, 1]
+    # the numbers are set on copies, not on the shared pods
+    assert [pod.num for pod in informer.find("other")] == [None, None]
+
+
+def test_find_pods_in_namespaces_lists_once(items):
+    k8s_client = MagicMock()
+    k8s_client.iter_all_pods.return_value = iter(items)
+    k8s_inventory = K8sInventory(k8s_client=k8s_client)
+    pods = k8s_inventory.find_pods_in_namespaces(["default", "other", "empty"])
+    assert k8s_client.iter_all_pods.call_count == 1
+    assert [pod.name for pod in pods["default"]] == ["a", "b"]
+    assert [pod.name for pod in pods["other"]] == ["c", "d"]
+    assert pods["empty"] == []
+    assert [pod.num for pod in k8s_inventory.last_pods] == [0, 1, 2, 3]
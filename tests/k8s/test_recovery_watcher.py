@@ -0,0 +1,145 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from datetime import datetime, timezone
+import pytest
+from mock import MagicMock
+from kubernetes.client.rest import ApiException
+from powerfulseal.k8s import Pod, RecoveryWatcher
+from powerfulseal.k8s.recovery_watcher import percentile
+
+
+def make_item(ready, since):
+    condition = MagicMock()
+    condition.type = "Ready"
+    condition.status = "True" if ready else "False"
+    condition.last_transition_time = datetime.fromtimestamp(since, timezone.utc)
+    item = MagicMock()
+    item.status.conditions = [condition]
+    return item
+
+
+@pytest.fixture
+def watcher():
+    clock = MagicMock(return_value=100)
+    watcher = RecoveryWatcher(MagicMock(), clock=clock)
+    # don't start the background thread
+    watcher.start = MagicMock()
+    return watcher
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([3], 99) == 3
+    assert percentile([], 50) is None
+
+
+def test_recovers_when_ready_after_the_kill(watcher):
+    pod = Pod(name="a", namespace="ns")
+    watcher.track(pod, killed_at=100)
+    # still Ready from before the kill
+    watcher.k8s_client.get_pod.return_value = make_item(True, 90)
+    watcher.check_once()
+    assert watcher.pending
+    watcher.k8s_client.get_pod.return_value = make_item(False, 101)
+    watcher.clock.return_value = 103
+    watcher.check_once()
+    assert watcher.pending
+    watcher.k8s_client.get_pod.return_value = make_item(True, 104)
+    watcher.clock.return_value = 104.5
+    watcher.check_once()
+    assert not watcher.pending
+    assert watcher.k8s_client.get_pod.call_args[0] == ("ns", "a")
+    summary = watcher.summary()
+    assert summary["kills"] == 1
+    assert summary["recovered"] == 1
+    assert summary["p50"] == 4.5
+
+
+def test_times_out_when_pod_is_gone(watcher):
+    watcher.track(Pod(name="a", namespace="ns"), killed_at=100, timeout=10)
+    watcher.k8s_client.get_pod.side_effect = ApiException(status=404)
+    watcher.check_once()
+    assert watcher.pending
+    watcher.clock.return_value = 111
+    watcher.check_once()
+    assert not watcher.pending
+    summary = watcher.summary()
+    assert summary["timeouts"] == 1
+    assert summary["p99"] is None
+
+
+def make_deployment(name, match_labels, replicas, ready):
+    deployment = MagicMock()
+    deployment.metadata.name = name
+    deployment.spec.selector.match_labels = match_labels
+    deployment.spec.replicas = replicas
+    deployment.status.ready_replicas = ready
+    return deployment
+
+
+def test_recovers_when_the_deployment_replaced_the_pod(watcher):
+    client = watcher.k8s_client
+    client.list_deployments.return_value = [
+        make_deployment("db", {"app": "db"}, 3, 3),
+        make_deployment("web", {"app": "web"}, 3, 3),
+    ]
+    pod = Pod(name="web-1", namespace="ns", uid="uid1", labels={"app": "web"})
+    watcher.track(pod, killed_at=100)
+    # the kill isn't visible yet: same pod, still Ready from before
+    item = make_item(True, 90)
+    item.metadata.uid = "uid1"
+    client.get_pod.return_value = item
+    watcher.check_once()
+    assert watcher.pending
+    assert watcher.deployments[("ns", "web-1")] == "web"
+    # the pod got replaced, but not all the replicas are Ready yet
+    client.get_pod.side_effect = ApiException(status=404)
+    client.get_deployment.return_value = make_deployment("web", {"app": "web"}, 3, 2)
+    watcher.clock.return_value = 103
+    watcher.check_once()
+    assert watcher.pending
+    assert client.get_deployment.call_args[0] == ("ns", "web")
+    client.get_deployment.return_value = make_deployment("web", {"app": "web"}, 3, 3)
+    watcher.clock.return_value = 106
+    watcher.check_once()
+    assert not watcher.pending
+    summary = watcher.summary()
+    assert summary["recovered"] == 1
+    assert summary["p50"] == 6
+    # the deployments are listed once per namespace
+    assert client.list_deployments.call_count == 1
+
+
+def test_exports_the_latencies_and_timeouts():
+    from powerfulseal.metrics import POD_RECOVERY_SECONDS, POD_RECOVERY_TIMEOUTS
+    watcher = RecoveryWatcher(MagicMock(), clock=MagicMock(return_value=100),
+        name="exported")
+    watcher.start = MagicMock()
+    watcher.k8s_client.list_deployments.return_value = []
+    watcher.track(Pod(name="a", namespace="ns"), killed_at=100, timeout=10)
+    watcher.track(Pod(name="b", namespace="ns"), killed_at=100, timeout=10)
+    watcher.k8s_client.get_pod.side_effect = lambda namespace, name: (
+        make_item(True, 103) if name == "a" else make_item(False, 101)
+    )
+    watcher.clock.return_value = 104
+    watcher.check_once()
+    assert POD_RECOVERY_SECONDS.get_count(scenario="exported") == 1
+    watcher.clock.return_value = 111
+    watcher.check_once()
+    assert POD_RECOVERY_TIMEOUTS.get(scenario="exported") == 1
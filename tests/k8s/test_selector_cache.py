@@ -0,0 +1,102 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from unittest.mock import MagicMock, patch
+
+from powerfulseal.k8s import K8sClient, SelectorCache
+
+
+def test_caches_selectors():
+    cache = SelectorCache()
+    loader = MagicMock(return_value={"app": "web"})
+    for _ in range(3):
+        assert cache.get("default", "web", loader) == {"app": "web"}
+    assert loader.call_count == 1
+    assert cache.hits == 2
+    assert cache.misses == 1
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("time.time", lambda: now[0])
+    cache = SelectorCache(ttl=10)
+    loader = MagicMock(return_value={"app": "web"})
+    cache.get("default", "web", loader)
+    now[0] += 11
+    cache.get("default", "web", loader)
+    assert loader.call_count == 2
+
+def test_evicts_least_recently_used():
+    cache = SelectorCache(max_size=2)
+    loader = MagicMock(return_value={})
+    cache.get("default", "a", loader)
+    cache.get("default", "b", loader)
+    cache.get("default", "a", loader)
+    cache.get("default", "c", loader)
+    assert loader.call_count == 3
+    cache.get("default", "a", loader)
+    assert loader.call_count == 3
+    cache.get("default", "b", loader)
+    assert loader.call_count == 4
+
+def test_invalidate():
+    cache = SelectorCache()
+    loader = MagicMock(return_value={})
+    cache.get("default", "a", loader)
+    cache.get("default", "b", loader)
+    cache.invalidate("default", "a")
+    cache.get("default", "a", loader)
+    cache.get("default", "b", loader)
+    assert loader.call_count == 3
+    cache.invalidate()
+    cache.get("default", "b", loader)
+    assert loader.call_count == 4
+
+def test_follow_invalidates_when_the_watch_restarts():
+    class Stop(BaseException):
+        pass
+    cache = SelectorCache()
+    loader = MagicMock(return_value={})
+    cached = []
+    def watch():
+        if cached:
+            cached.append(cache.get("default", "a", loader))
+            raise Stop()
+        # the watch ends without an error, like on a server timeout
+        cached.append(cache.get("default", "a", loader))
+        return iter([])
+    k8s_client = MagicMock()
+    k8s_client.watch_all_deployments.side_effect = watch
+    try:
+        cache._follow(k8s_client)
+    except Stop:
+        pass
+    assert k8s_client.watch_all_deployments.call_count == 2
+    assert loader.call_count == 2
+
+
+@patch("powerfulseal.k8s.k8s_client.kubernetes")
+def test_list_pods_reads_the_deployment_once(kubernetes):
+    k8s_client = K8sClient()
+    deployment = MagicMock()
+    deployment.spec.selector.match_labels = {"app": "web"}
+    api = k8s_client.client_extensionsv1beta1api
+    api.read_namespaced_deployment.return_value = deployment
+    for _ in range(5):
+        k8s_client.list_pods(namespace="default", deployment_name="web")
+    assert api.read_namespaced_deployment.call_count == 1
+    list_pods = k8s_client.client_corev1api.list_namespaced_pod
+    assert list_pods.call_count == 5
+    assert list_pods.call_args[1] == dict(namespace="default", label_selector="app=web")
@@ -0,0 +1,63 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+from powerfulseal.metrics import Registry, Counter, Histogram
+
+
+def test_counter_renders_per_label():
+    registry = Registry()
+    counter = Counter("seal_test_total", "Test counter", ["action", "outcome"], registry=registry)
+    counter.inc(action="kill", outcome="success")
+    counter.inc(2, action="kill", outcome="success")
+    counter.inc(action="stop", outcome="fail\"ure")
+    assert counter.get(action="kill", outcome="success") == 3
+    assert registry.render() == (
+        "# HELP seal_test_total Test counter\n"
+        "# TYPE seal_test_total counter\n"
+        'seal_test_total{action="kill",outcome="success"} 3.0\n'
+        'seal_test_total{action="stop",outcome="fail\\"ure"} 1.0\n'
+    )
+
+
+def test_counter_refuses_unknown_labels():
+    counter = Counter("seal_test_total", "Test counter", ["action"])
+    with pytest.raises(ValueError):
+        counter.inc(scenario="nope")
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = Histogram("seal_test_seconds", "Test histogram", registry=registry, buckets=[1, 5])
+    for value in (0.5, 2, 3, 10):
+        histogram.observe(value)
+    assert histogram.get_count() == 4
+    assert registry.render() == (
+        "# HELP seal_test_seconds Test histogram\n"
+        "# TYPE seal_test_seconds histogram\n"
+        'seal_test_seconds_bucket{le="1.0"} 1.0\n'
+        'seal_test_seconds_bucket{le="5.0"} 3.0\n'
+        'seal_test_seconds_bucket{le="+Inf"} 4.0\n'
+        "seal_test_seconds_sum 15.5\n"
+        "seal_test_seconds_count 4.0\n"
+    )
+
+
+def test_histogram_times_blocks_that_raise():
+    histogram = Histogram("seal_test_seconds", "Test histogram", ["operation"])
+    with pytest.raises(ValueError):
+        with histogram.time(operation="sync"):
+            raise ValueError()
+    assert histogram.get_count(operation="sync") == 1
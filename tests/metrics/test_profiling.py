@@ -0,0 +1,42 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+from powerfulseal.metrics import ThreadProfiler, profiled
+
+
+def only_on_workers(value):
+    return value * 2
+
+
+def test_profiles_the_tasks_run_on_worker_threads(tmpdir):
+    path = str(tmpdir.join("run.prof"))
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        with ThreadProfiler() as profiler:
+            results = list(pool.map(profiled(only_on_workers), range(4)))
+    profiler.dump_stats(path)
+    assert results == [0, 2, 4, 6]
+    calls = [
+        stat[1] for (_, _, function), stat in pstats.Stats(path).stats.items()
+        if function == "only_on_workers"
+    ]
+    assert calls == [4]
+
+
+def test_profiled_is_a_noop_when_not_profiling():
+    assert ThreadProfiler.active is None
+    assert profiled(only_on_workers) is only_on_workers
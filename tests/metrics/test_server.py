@@ -0,0 +1,42 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from urllib.request import urlopen
+from powerfulseal.metrics import Registry, Counter
+from powerfulseal.metrics.server import create_app, start_server
+
+
+def make_registry():
+    registry = Registry()
+    counter = Counter("seal_test_total", "Test counter", registry=registry)
+    counter.inc()
+    return registry
+
+
+def test_serves_metrics():
+    client = create_app(make_registry()).test_client()
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert b"seal_test_total 1.0" in response.data
+
+
+def test_server_runs_in_the_background():
+    server = start_server("127.0.0.1", 0, registry=make_registry())
+    try:
+        url = "http://127.0.0.1:%d/metrics" % server.server_port
+        assert b"seal_test_total 1.0" in urlopen(url, timeout=5).read()
+    finally:
+        server.shutdown()
@@ -0,0 +1,116 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+from unittest.mock import MagicMock
+
+from powerfulseal.node import (
+    Node,
+    NodeState,
+    NodeInventory,
+    InventorySnapshot,
+)
+
+
+GROUPS = {
+    "TEST1": ["198.168.1.1"],
+    "TEST2": ["198.168.1.1", "198.168.2.1"],
+}
+
+
+def make_driver(nodes):
+    driver = MagicMock()
+    by_ip = dict((node.ip, node) for node in nodes)
+    driver.get_by_ips = lambda ips: dict((ip, by_ip.get(ip)) for ip in ips)
+    return driver
+
+
+@pytest.fixture
+def nodes():
+    return [
+        Node(id="id1", ip="198.168.1.1", az="AZ1", name="node1", state=NodeState.UP),
+        Node(id="id2", ip="198.168.2.1", az="AZ2", name="node2", state=NodeState.DOWN),
+    ]
+
+
+@pytest.fixture
+def inventory(nodes):
+    inventory = NodeInventory(driver=make_driver(nodes), restrict_to_groups=GROUPS)
+    inventory.sync()
+    return inventory
+
+
+def test_save_and_restore(tmpdir, inventory):
+    snapshot = InventorySnapshot(str(tmpdir.join("inventory.json")))
+    snapshot.save(inventory)
+
+    driver = MagicMock()
+    restored = NodeInventory(driver=driver)
+    snapshot.restore(restored, snapshot.load())
+
+    assert not driver.sync.called
+    assert restored.get_groups() == ["TEST1", "TEST2"]
+    assert restored.get_azs() == ["AZ1", "AZ2"]
+    for node in inventory.find_nodes():
+        copy = restored.get_node_by_ip(node.ip)
+        assert (copy.id, copy.no, copy.name, copy.az, copy.state) == \
+            (node.id, node.no, node.name, node.az, node.state)
+        assert sorted(copy.groups) == sorted(node.groups)
+    assert [node.id for node in restored.find_nodes("TEST2")] == ["id1", "id2"]
+    assert list(restored.find_nodes("down")) == [restored.nodes_by_id["id2"]]
+
+
+def test_load_ignores_old_snapshot(tmpdir, inventory):
+    now = [1000]
+    snapshot = InventorySnapshot(str(tmpdir.join("inventory.json")),
+        max_age=60, clock=lambda: now[0])
+    snapshot.save(inventory)
+    now[0] += 60
+    assert snapshot.load() is not None
+    now[0] += 1
+    assert snapshot.load() is None
+
+
+@pytest.mark.parametrize("content", [None, "{not json", '{"version": 0}'])
+def test_load_ignores_missing_or_invalid_snapshot(tmpdir, content):
+    path = tmpdir.join("inventory.json")
+    if content is not None:
+        path.write(content)
+    assert InventorySnapshot(str(path)).load() is None
+
+
+def test_reconcile_syncs_and_saves(tmpdir, inventory, nodes):
+    snapshot = InventorySnapshot(str(tmpdir.join("inventory.json")))
+    snapshot.save(inventory)
+
+    # the cloud changed since the snapshot was taken
+    nodes[1].state = NodeState.UP
+    nodes.append(Node(id="id3", ip="198.168.3.1", az="AZ3"))
+    restored = NodeInventory(driver=make_driver(nodes))
+    snapshot.restore(restored, snapshot.load())
+    groups = dict(GROUPS, TEST3=["198.168.3.1"])
+    del groups["TEST1"]
+
+    snapshot.reconcile(restored, lambda: groups).join()
+
+    assert restored.get_groups() == ["TEST2", "TEST3"]
+    assert restored.nodes_by_id["id1"].groups == ["TEST2"]
+    assert restored.nodes_by_id["id2"].state == NodeState.UP
+    assert restored.nodes_by_id["id3"].no == 2
+    assert [node.id for node in restored.last_diff.added] == ["id3"]
+    data = snapshot.load()
+    assert sorted(data["groups"]) == ["TEST2", "TEST3"]
+    assert len(data["nodes"]) == 3
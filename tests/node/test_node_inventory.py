@@ -17,7 +17,7 @@
 import pytest
 from unittest.mock import MagicMock
 
-from powerfulseal.node import Node, NodeInventory
+from powerfulseal.node import Node, NodeState, NodeInventory
 
 
 
@@ -38,6 +38,7 @@ def mock_driver(nodes):
             if node.ip == ip:
                 return node
     mock.get_by_ip = get_by_ip
+    mock.get_by_ips = lambda ips: dict((ip, get_by_ip(ip)) for ip in ips)
     return mock
 
 
@@ -64,7 +65,7 @@ def test_sync(nodes, mock_driver):
     ("id2", [1]),
     ("198.168.1.1", [0]),
     ("AZ2", [1]),
-    ("2", [1]),
+    ("1", [1]),
     ("node2", [1]),
     ("TEST2", [0, 1]),
     ("up", []),
@@ -112,3 +113,132 @@ def test_groups(mock_driver):
     inventory.sync()
     assert inventory.get_groups() == ["TEST1", "TEST2"]
 
+
+def test_sync_looks_up_ips_in_bulk(mock_driver):
+    mock_driver.get_by_ips = MagicMock(return_value={})
+    inventory = NodeInventory(
+        driver=mock_driver,
+        restrict_to_groups={
+            "TEST1": ["198.168.1.1"],
+            "TEST2": ["198.168.1.1", "198.168.2.1"],
+        }
+    )
+    inventory.sync()
+    assert mock_driver.get_by_ips.call_count == 1
+    assert mock_driver.get_by_ips.call_args[0] == (["198.168.1.1", "198.168.2.1"],)
+
+
+def test_sync_is_incremental(nodes, mock_driver):
+    inventory = NodeInventory(
+        driver=mock_driver,
+        restrict_to_groups={
+            "TEST1": ["198.168.1.1"],
+            "TEST2": ["198.168.1.1", "198.168.2.1", "198.168.3.1"],
+        }
+    )
+    diff = inventory.sync()
+    assert diff.added == nodes
+    assert [node.no for node in nodes] == [0, 1, 2]
+    assert nodes[0].groups == ["TEST1", "TEST2"]
+
+    # the driver returns fresh objects: node2 went down, node1 is gone
+    fresh = [
+        Node(id="id2", ip="198.168.2.1", az="AZ2", name="node2", state=NodeState.DOWN),
+        Node(id="id3", ip="198.168.3.1", az="AZ2", name="node3"),
+    ]
+    mock_driver.nodes = fresh
+    diff = inventory.sync()
+    assert diff.added == []
+    assert diff.removed == [nodes[0]]
+    assert diff.changed == [nodes[1]]
+    assert inventory.last_diff is diff
+    # the known nodes are kept, with their numbers
+    assert inventory.get_node_by_ip("198.168.2.1") is nodes[1]
+    assert nodes[1].state == NodeState.DOWN
+    assert nodes[1].no == 1
+    assert inventory.get_node_by_ip("198.168.1.1") is None
+    assert inventory.groups == {"TEST1": [], "TEST2": nodes[1:3]}
+    assert inventory.get_azs() == ["AZ2"]
+
+    # a new node takes a new number
+    mock_driver.nodes = fresh + [Node(id="id4", ip="198.168.1.1", az="AZ1")]
+    diff = inventory.sync()
+    assert [node.id for node in diff.added] == ["id4"]
+    assert diff.added[0].no == 3
+    assert diff.added[0].groups == ["TEST1", "TEST2"]
+    assert inventory.groups["TEST2"] == nodes[1:3] + diff.added
+
+
+def test_views_are_cached_until_sync(nodes, mock_driver):
+    inventory = NodeInventory(
+        driver=mock_driver,
+        restrict_to_groups={
+            "TEST1": ["198.168.1.1", "198.168.2.1", "198.168.3.1"],
+        }
+    )
+    inventory.sync()
+    views = inventory.get_views()
+    assert inventory.get_views() is views
+    assert views.nodes == nodes
+    assert views.by_az == {"AZ1": nodes[0:1], "AZ2": nodes[1:3]}
+    assert views.by_single["node3"] is nodes[2]
+    assert views.by_single["2"] is nodes[2]
+
+    # changes outside of a sync need an explicit invalidate
+    nodes[1].state = NodeState.DOWN
+    assert list(inventory.find_nodes("down")) == []
+    inventory.invalidate()
+    assert list(inventory.find_nodes("down")) == [nodes[1]]
+
+    inventory.sync()
+    assert inventory.get_views() is not views
+
+
+
+def test_sync_doesnt_modify_the_lists_readers_have(nodes, mock_driver):
+    inventory = NodeInventory(
+        driver=mock_driver,
+        restrict_to_groups={
+            "TEST1": ["198.168.1.1"],
+            "TEST2": ["198.168.1.1", "198.168.2.1"],
+        }
+    )
+    inventory.sync()
+    found = inventory.find_nodes("TEST2")
+    assert next(found) == nodes[0]
+    group = inventory.groups["TEST2"]
+    node_groups = nodes[0].groups
+    inventory.set_groups({"TEST1": ["198.168.1.1"], "TEST2": ["198.168.2.1"]})
+    inventory.sync()
+    # a query started before the sync sees the nodes from before it
+    assert list(found) == [nodes[1]]
+    assert group == [nodes[0], nodes[1]]
+    assert node_groups == ["TEST1", "TEST2"]
+    assert inventory.groups["TEST2"] == [nodes[1]]
+    assert nodes[0].groups == ["TEST1"]
+
+
+def test_reads_arent_blocked_by_a_slow_sync(nodes, mock_driver):
+    import threading
+    inventory = NodeInventory(
+        driver=mock_driver,
+        restrict_to_groups={"TEST1": ["198.168.1.1"]},
+    )
+    inventory.sync()
+    syncing, release = threading.Event(), threading.Event()
+    def slow_sync(ips):
+        syncing.set()
+        release.wait(5)
+    mock_driver.sync = slow_sync
+    thread = threading.Thread(target=inventory.sync)
+    thread.start()
+    try:
+        assert syncing.wait(5)
+        # the driver is still syncing, and the nodes can be read
+        assert list(inventory.find_nodes("TEST1")) == [nodes[0]]
+        assert inventory.get_node_by_ip("198.168.1.1") == nodes[0]
+        assert inventory.get_groups() == ["TEST1"]
+        assert thread.is_alive()
+    finally:
+        release.set()
+        thread.join()
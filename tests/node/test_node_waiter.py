@@ -0,0 +1,71 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from mock import MagicMock
+from powerfulseal.node import Node, NodeState, NodeStateWaiter
+
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_waiter(states_per_round):
+    clock = FakeClock()
+    driver = MagicMock()
+    driver.get_states.side_effect = states_per_round
+    waiter = NodeStateWaiter(driver, sleep=clock.sleep, clock=clock.time)
+    return waiter, driver, clock
+
+
+def test_waits_with_exponential_backoff():
+    a, b = Node(id="a"), Node(id="b")
+    waiter, driver, clock = make_waiter([
+        {"a": NodeState.UP, "b": NodeState.UP},
+        {"a": NodeState.DOWN, "b": NodeState.UP},
+        {"b": NodeState.UP},
+        {"b": NodeState.DOWN},
+    ])
+    latencies = waiter.wait_for([a, b], NodeState.DOWN, poll_interval=1, max_poll_interval=3)
+    assert clock.sleeps == [1, 2, 3]
+    assert latencies == {a: 1, b: 6}
+    assert a.state == NodeState.DOWN
+    # only the pending nodes are polled
+    assert driver.get_states.call_args_list[2][0][0] == [b]
+
+
+def test_gives_up_after_timeout():
+    a = Node(id="a")
+    waiter, driver, clock = make_waiter([{"a": NodeState.UP}] * 10)
+    latencies = waiter.wait_for([a], NodeState.DOWN, timeout=5, poll_interval=2)
+    assert latencies == {a: None}
+    assert clock.sleeps == [2, 3]
+    assert clock.now == 5
+
+
+def test_keeps_polling_through_errors():
+    a = Node(id="a")
+    waiter, driver, clock = make_waiter([Exception("throttled"), {"a": NodeState.UP}])
+    latencies = waiter.wait_for([a], NodeState.UP, started=-10)
+    assert latencies == {a: 11}
@@ -112,12 +112,12 @@ def test_calls_start_on_act(node_scenario, attr):
         ],
     }
     items = [dict(), dict()]
+    method = getattr(node_scenario.driver, attr + "_many")
+    method.return_value = []
     node_scenario.act(items)
-    method = getattr(node_scenario.driver, attr)
-    assert method.call_count == 2
-    for i, call in enumerate(method.call_args_list):
-        args, kwargs = call
-        assert args[0] is items[i]
+    assert method.call_count == 1
+    args, kwargs = method.call_args
+    assert args[0] is items
 
 
 @pytest.mark.parametrize("attr", [
@@ -134,15 +134,183 @@ def test_calls_start_on_act_raising_exception_dont_bubble(node_scenario, attr):
         ],
     }
     items = [dict(), dict()]
-    method = getattr(node_scenario.driver, attr)
+    method = getattr(node_scenario.driver, attr + "_many")
     method.side_effect = Exception("something bad")
     node_scenario.logger = MagicMock()
     node_scenario.act(items)
-    assert method.call_count == 2
-    for i, call in enumerate(method.call_args_list):
-        args, kwargs = call
-        assert args[0] is items[i]
-    assert node_scenario.logger.exception.call_count == 2
+    assert method.call_count == 1
+    assert node_scenario.logger.exception.call_count == 1
+    # all the nodes of the call are reported as failed
+    failed = node_scenario.wait_through(
+        getattr(node_scenario, "action_%s_many" % attr)(items, {})
+    )
+    assert failed == items
+
+
+@pytest.mark.parametrize("attr", [
+    "start",
+    "stop"
+])
+def test_logs_each_failed_node_on_act(node_scenario, attr):
+    node_scenario.schema = {
+        "actions": [
+            {
+                attr: {
+                }
+            },
+        ],
+    }
+    items = [dict(), dict(), dict()]
+    method = getattr(node_scenario.driver, attr + "_many")
+    method.return_value = [(items[0], Exception("nope")), (items[2], Exception("nope"))]
+    node_scenario.logger = MagicMock()
+    node_scenario.act(items)
+    assert node_scenario.logger.error.call_count == 2
+
+
+@pytest.mark.parametrize("attr", [
+    "start",
+    "stop"
+])
+def test_act_splits_nodes_with_max_parallel(node_scenario, attr):
+    node_scenario.schema = {
+        "actions": [
+            {
+                attr: {
+                    "maxParallel": 3,
+                }
+            },
+        ],
+    }
+    items = list(range(7))
+    method = getattr(node_scenario.driver, attr + "_many")
+    method.return_value = []
+    node_scenario.act(items)
+    # at most maxParallel nodes at a time, one slice after the other
+    chunks = [call[0][0] for call in method.call_args_list]
+    assert chunks == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_each_slice_is_waited_for_before_the_next(node_scenario):
+    from powerfulseal.node import Node, NodeState
+    node_scenario.schema = {
+        "actions": [
+            {
+                "stop": {
+                    "maxParallel": 2,
+                    "waitForState": {},
+                }
+            },
+        ],
+    }
+    items = [Node(id=str(i)) for i in range(3)]
+    calls = []
+    def stop_many(nodes):
+        calls.append(("stop", nodes))
+        return []
+    def wait_for(nodes, state, **kwargs):
+        calls.append(("wait", nodes))
+        return dict((node, 1.0) for node in nodes)
+    node_scenario.driver.stop_many = stop_many
+    node_scenario.waiter.wait_for = wait_for
+    node_scenario.act(items)
+    assert calls == [
+        ("stop", items[:2]), ("wait", items[:2]),
+        ("stop", items[2:]), ("wait", items[2:]),
+    ]
+    assert [node for node, _, _ in node_scenario.transitions] == items
+
+
+def test_stop_waits_for_nodes_to_go_down(node_scenario):
+    from powerfulseal.node import Node, NodeState
+    node_scenario.schema = {
+        "actions": [
+            {
+                "stop": {
+                    "waitForState": {
+                        "timeout": 10,
+                    },
+                }
+            },
+        ],
+    }
+    items = [Node(id="a"), Node(id="b"), Node(id="c")]
+    node_scenario.driver.stop_many.return_value = [(items[2], Exception("nope"))]
+    node_scenario.waiter.wait_for = MagicMock(return_value={items[0]: 1.5, items[1]: None})
+    node_scenario.act(items)
+    args, kwargs = node_scenario.waiter.wait_for.call_args
+    # the nodes that failed to stop aren't waited for
+    assert args == (items[:2], NodeState.DOWN)
+    assert kwargs["timeout"] == 10
+    assert node_scenario.transitions == [
+        (items[0], NodeState.DOWN, 1.5),
+        (items[1], NodeState.DOWN, None),
+    ]
+
+
+def test_stop_doesnt_wait_when_the_driver_cant_report_states(node_scenario):
+    from powerfulseal.node import Node
+    from powerfulseal.clouddrivers import NoCloudDriver
+    node_scenario.driver = NoCloudDriver()
+    node_scenario.schema = {
+        "actions": [
+            {
+                "stop": {
+                    "waitForState": {
+                        "timeout": 10,
+                    },
+                }
+            },
+        ],
+    }
+    node_scenario.waiter.wait_for = MagicMock()
+    node_scenario.act([Node(id="a")])
+    assert node_scenario.waiter.wait_for.call_count == 0
+    assert node_scenario.transitions == []
+
+
+def test_stop_counts_as_failed_when_a_node_fails(node_scenario):
+    from powerfulseal.node import Node
+    from powerfulseal.metrics import ACTIONS
+    node_scenario.name = "failing stop"
+    node_scenario.schema = {
+        "actions": [
+            {
+                "stop": {}
+            },
+        ],
+    }
+    items = [Node(id="a"), Node(id="b")]
+    node_scenario.driver.stop_many.return_value = [(items[1], Exception("nope"))]
+    node_scenario.act(items)
+    assert ACTIONS.get(scenario="failing stop", action="stop", outcome="failure") == 1
+    assert ACTIONS.get(scenario="failing stop", action="stop", outcome="success") == 0
+
+
+def test_execute_counts_as_failed_when_a_node_fails(node_scenario):
+    from powerfulseal.node import Node
+    from powerfulseal.metrics import ACTIONS
+    node_scenario.name = "failing execute"
+    node_scenario.schema = {
+        "actions": [
+            {
+                "execute": {
+                    "cmd": "false",
+                    "maxParallel": 2,
+                }
+            },
+        ]
+    }
+    items = [Node(id="a", ip="1.1.1.1"), Node(id="b", ip="2.2.2.2")]
+    node_scenario.executor.execute = MagicMock(return_value={
+        "1.1.1.1": {"ret_code": 0},
+        "2.2.2.2": {"ret_code": 1},
+    })
+    node_scenario.executor.execute = MagicMock(side_effect=lambda cmd, nodes, timeout: {
+        nodes[0].ip: {"ret_code": 1 if nodes[0] is items[1] else 0},
+    })
+    node_scenario.act(items)
+    assert ACTIONS.get(scenario="failing execute", action="execute", outcome="failure") == 1
 
 
 def test_action_execute_called_correctly(node_scenario):
@@ -169,3 +337,59 @@ def test_action_execute_called_correctly(node_scenario):
         assert args[0] == "echo lol"
         assert kwargs["nodes"] == [items[i]]
 
+
+def test_action_execute_fans_out_with_max_parallel(node_scenario):
+    node_scenario.schema = {
+        "actions": [
+            {
+                "execute": {
+                    "cmd": "echo lol",
+                    "maxParallel": 10,
+                    "timeout": 5,
+                }
+            },
+        ]
+    }
+    mock = MagicMock(return_value={
+        "some ip": {
+            "ret_code": 0
+        },
+    })
+    node_scenario.executor.execute = mock
+    items = [dict(), dict()]
+    node_scenario.act(items)
+    # each node goes through action_execute, on the shared worker pool
+    assert mock.call_count == 2
+    nodes = []
+    for call in mock.call_args_list:
+        args, kwargs = call
+        assert args[0] == "echo lol"
+        assert kwargs["timeout"] == 5
+        nodes.extend(kwargs["nodes"])
+    assert sorted(map(id, nodes)) == sorted(map(id, items))
+
+
+def test_action_execute_times_each_node(node_scenario):
+    from powerfulseal.node import Node
+    node_scenario.match = lambda: items
+    node_scenario.schema = {
+        "actions": [
+            {
+                "execute": {
+                    "cmd": "echo lol",
+                    "maxParallel": 2,
+                }
+            },
+        ]
+    }
+    node_scenario.compile()
+    node_scenario.executor.execute = MagicMock(return_value={
+        "some ip": {"ret_code": 0},
+    })
+    items = [Node(id="a"), Node(id="b")]
+    node_scenario.execute()
+    timings = [
+        timing.name for timing in node_scenario.last_run.timings
+        if timing.phase == "item"
+    ]
+    assert sorted(timings) == ["execute %s" % item for item in items]
@@ -129,6 +129,10 @@ def test_kills_correctly_with_force(pod_scenario, should_force):
         },
     })
     pod_scenario.executor.execute = mock
+    # put each pod on a different node
+    pod_scenario.inventory.get_node_by_ip = MagicMock(
+        side_effect=[MagicMock(), MagicMock()]
+    )
     mock_item1 = MagicMock()
     mock_item1.container_ids = ["docker://container1"]
     mock_item2 = MagicMock()
@@ -205,3 +209,149 @@ def test_doesnt_kill_when_cant_find_node(pod_scenario):
     pod_scenario.act(items)
     assert mock.call_count == 0
     assert pod_scenario.logger.info.call_args[0] == ("Node not found for pod: %s", items[1])
+
+
+def test_kills_batched_per_node(pod_scenario):
+    pod_scenario.schema = {
+        "actions": [
+            {
+                "kill": {
+                    "force": True
+                }
+            },
+        ]
+    }
+    node1, node2 = MagicMock(), MagicMock()
+    nodes = {"ip1": node1, "ip2": node2}
+    pod_scenario.inventory.get_node_by_ip = lambda ip: nodes.get(ip)
+    mock = MagicMock(return_value={
+        "some ip": {
+            "ret_code": 1,
+            "stdout": "container1\n",
+        },
+    })
+    pod_scenario.executor.execute = mock
+    items = []
+    for i, host_ip in enumerate(["ip1", "ip2", "ip1"]):
+        item = MagicMock()
+        item.host_ip = host_ip
+        item.container_ids = ["docker://container%d" % (i + 1)]
+        items.append(item)
+    results = pod_scenario.action_kill_many(items, {"force": True})
+    assert mock.call_count == 2
+    assert mock.call_args_list[0][0][0] == "sudo docker kill -s SIGKILL container1 container3"
+    assert mock.call_args_list[0][1]["nodes"] == [node1]
+    assert mock.call_args_list[1][0][0] == "sudo docker kill -s SIGKILL container2"
+    assert mock.call_args_list[1][1]["nodes"] == [node2]
+    assert results == [
+        (items[0], "container1", True),
+        (items[2], "container3", False),
+        (items[1], "container2", False),
+    ]
+
+
+def test_kills_nodes_in_parallel(pod_scenario):
+    nodes = dict(("ip%d" % i, MagicMock()) for i in range(6))
+    pod_scenario.inventory.get_node_by_ip = lambda ip: nodes.get(ip)
+    pod_scenario.executor.execute = MagicMock(return_value={
+        "some ip": {
+            "ret_code": 0,
+        },
+    })
+    items = []
+    for i in range(6):
+        item = MagicMock()
+        item.host_ip = "ip%d" % i
+        item.container_ids = ["docker://container%d" % i]
+        items.append(item)
+    results = pod_scenario.action_kill_many(items, {"maxParallel": 3})
+    assert pod_scenario.executor.execute.call_count == 6
+    # results keep the order of the nodes
+    assert results == [
+        (item, "container%d" % i, True) for i, item in enumerate(items)
+    ]
+
+
+def test_kill_tracks_recovery_of_killed_pods(pod_scenario):
+    node = MagicMock()
+    pod_scenario.inventory.get_node_by_ip = lambda ip: node
+    pod_scenario.executor.execute = MagicMock(return_value={
+        "some ip": {
+            "ret_code": 1,
+            "stdout": "container0\n",
+        },
+    })
+    items = []
+    for i in range(2):
+        item = MagicMock()
+        item.host_ip = "ip"
+        item.container_ids = ["docker://container%d" % i]
+        items.append(item)
+    watcher = MagicMock()
+    pod_scenario.recovery_watcher = watcher
+    pod_scenario.action_kill_many(items, {"recovery": {"timeout": 60}})
+    # only the pods that were actually killed are tracked
+    assert watcher.track.call_count == 1
+    args, kwargs = watcher.track.call_args
+    assert args == (items[0],)
+    assert kwargs["timeout"] == 60
+
+
+def test_matching_many_namespaces_lists_once(pod_scenario):
+    def make_pod(name, labels):
+        pod = MagicMock()
+        pod.name = name
+        pod.labels = labels
+        return pod
+    a = make_pod("a", {"app": "web"})
+    b = make_pod("b", {"app": "db"})
+    c = make_pod("c", {"app": "web", "tier": "front"})
+    d = make_pod("d", {"app": "db"})
+    pod_scenario.schema = {
+        "match": [
+            {"namespace": {"name": "ns1"}},
+            {"deployment": {"name": "db", "namespace": "ns2"}},
+            {"labels": {"selector": "tier=front", "namespace": "ns3"}},
+        ]
+    }
+    pod_scenario.k8s_inventory.find_pods_in_namespaces = MagicMock(return_value={
+        "ns1": [a],
+        "ns2": [b],
+        "ns3": [c, d],
+    })
+    pod_scenario.k8s_inventory.k8s_client.get_deployment_labels = MagicMock(
+        return_value={"app": "db"}
+    )
+    matched = pod_scenario.match()
+    assert set(matched) == set([a, b, c])
+    assert pod_scenario.k8s_inventory.find_pods_in_namespaces.call_count == 1
+    assert pod_scenario.k8s_inventory.find_pods_in_namespaces.call_args[0] == (
+        set(["ns1", "ns2", "ns3"]),
+    )
+    assert not pod_scenario.k8s_inventory.find_pods.called
+
+
+def test_a_single_recovery_watcher_is_created_concurrently(pod_scenario):
+    watchers = pod_scenario.map_parallel(
+        lambda _: pod_scenario.get_recovery_watcher({}),
+        range(50),
+        10,
+    )
+    assert all(watcher is watchers[0] for watcher in watchers)
+
+
+def test_logs_the_recovery_summary_after_each_run(pod_scenario):
+    pod_scenario.schema = {}
+    pod_scenario.match = MagicMock(return_value=[])
+    pod_scenario.logger = MagicMock()
+    pod_scenario.recovery_watcher = MagicMock()
+    # some pods are still being watched
+    pod_scenario.recovery_watcher.summary.return_value = dict(pending=3)
+    for _ in range(2):
+        pod_scenario.execute()
+    logged = [
+        call for call in pod_scenario.logger.info.call_args_list
+        if call[0][0] == "Recovery: %s"
+    ]
+    assert len(logged) == 2
+    assert logged[0][0][1] == dict(pending=3)
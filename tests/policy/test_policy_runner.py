@@ -16,9 +16,12 @@
 
 import pytest
 import pkg_resources
+from collections import defaultdict
+from concurrent.futures import Future
+from jsonschema import validate, ValidationError
 from unittest.mock import MagicMock
 
-from powerfulseal.policy import PolicyRunner
+from powerfulseal.policy import PolicyRunner, Scheduler
 
 
 def test_example_config_validates():
@@ -26,21 +29,147 @@ def test_example_config_validates():
     PolicyRunner.validate_file(filename)
 
 
-def test_parses_a_whole_config_correctly(monkeypatch):
-    sleep_mock = MagicMock()
-    monkeypatch.setattr("time.sleep", sleep_mock)
+class FakeTime():
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class InlineExecutor():
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+def make_scheduler(fake_time):
+    return Scheduler(
+        executor=InlineExecutor(),
+        clock=fake_time.time,
+        sleep=fake_time.sleep,
+    )
+
+
+def test_parses_a_whole_config_correctly():
+    fake_time = FakeTime()
     filename = pkg_resources.resource_filename("tests.policy", "example_config2.yml")
     policy = PolicyRunner.validate_file(filename)
     inventory = MagicMock()
     k8s_inventory = MagicMock()
     driver = MagicMock()
     executor = MagicMock()
+    hook = MagicMock()
+    starts = defaultdict(list)
+    hook.on_run.side_effect = lambda scenario, record: \
+        starts[scenario.name].append(fake_time.now)
     LOOPS = 1000
-    nodes, pods = PolicyRunner.run(policy, inventory, k8s_inventory, driver, executor, loops=LOOPS)
-    assert sleep_mock.call_count == LOOPS
-    for call in sleep_mock.call_args_list:
-        args, kwargs = call
-        assert 77 <= args[0] <= 100
+    nodes, pods = PolicyRunner.run(policy, inventory, k8s_inventory, driver, executor,
+        loops=LOOPS, hooks=[hook], scheduler=make_scheduler(fake_time))
     assert inventory.sync.call_count == LOOPS
     assert len(nodes) == 2
     assert len(pods) == 1
+    # each scenario runs on its own, between 77 and 100s after its last run
+    assert sorted(starts.keys()) == ["scenario1", "scenario2", "something1"]
+    for times in starts.values():
+        assert len(times) == LOOPS
+        assert times[0] == 1000.0
+        for before, after in zip(times, times[1:]):
+            assert 77 <= after - before <= 100
+
+
+def test_uses_the_schedules_of_the_scenarios():
+    fake_time = FakeTime()
+    policy = {
+        "config": {"minSecondsBetweenRuns": 60, "maxSecondsBetweenRuns": 60},
+        "podScenarios": [
+            {"name": "fast", "match": [], "filters": [], "actions": [],
+             "schedule": {"intervalSeconds": 10}},
+            {"name": "cron", "match": [], "filters": [], "actions": [],
+             "schedule": {"cron": "*/5 * * * *"}},
+        ],
+    }
+    validate(policy, PolicyRunner.get_schema())
+    hook = MagicMock()
+    starts = defaultdict(list)
+    hook.on_run.side_effect = lambda scenario, record: \
+        starts[scenario.name].append(fake_time.now)
+    PolicyRunner.run(policy, MagicMock(), MagicMock(), MagicMock(), MagicMock(),
+        loops=4, hooks=[hook], scheduler=make_scheduler(fake_time))
+    assert starts["fast"] == [1000, 1010, 1020, 1030]
+    assert len(starts["cron"]) == 4
+    for before, after in zip(starts["cron"], starts["cron"][1:]):
+        assert after - before == 300
+
+
+def test_profiles_the_first_loop_and_adds_hooks(tmpdir):
+    import pstats
+    filename = pkg_resources.resource_filename("tests.policy", "example_config2.yml")
+    policy = PolicyRunner.validate_file(filename)
+    hook = MagicMock()
+    profile = str(tmpdir.join("loop.prof"))
+    nodes, pods = PolicyRunner.run(
+        policy, MagicMock(), MagicMock(), MagicMock(), MagicMock(),
+        loops=2, hooks=[hook], profile=profile,
+        scheduler=make_scheduler(FakeTime()),
+    )
+    assert pstats.Stats(profile).total_calls > 0
+    # called at the end of each execution of each scenario
+    assert hook.on_run.call_count == 2 * len(nodes + pods)
+
+
+@pytest.mark.parametrize("cron", ["61 * * * *", "* * *", "0 0 31 2 *"])
+def test_validate_rejects_invalid_cron(tmpdir, cron):
+    filename = tmpdir.join("policy.yml")
+    filename.write("\n".join([
+        "config:",
+        "  minSecondsBetweenRuns: 1",
+        "podScenarios:",
+        "  - name: bad",
+        "    match: []",
+        "    filters: []",
+        "    actions: []",
+        "    schedule:",
+        "      cron: \"%s\"" % cron,
+    ]))
+    with pytest.raises(ValidationError) as excinfo:
+        PolicyRunner.validate_file(str(filename))
+    assert list(excinfo.value.path) == ["podScenarios", 0, "schedule"]
+
+
+def test_loops_count_the_runs_of_each_scenario_and_errors_stop_the_run():
+    fake_time = FakeTime()
+    policy = {
+        "config": {"minSecondsBetweenRuns": 10, "maxSecondsBetweenRuns": 10},
+        "podScenarios": [
+            {"name": "fast", "match": [], "filters": [], "actions": [],
+             "schedule": {"intervalSeconds": 1}},
+            {"name": "slow", "match": [], "filters": [], "actions": [],
+             "schedule": {"intervalSeconds": 100}},
+        ],
+    }
+    hook = MagicMock()
+    runs = defaultdict(int)
+    def on_run(scenario, record):
+        runs[scenario.name] += 1
+    hook.on_run.side_effect = on_run
+    inventory = MagicMock()
+    PolicyRunner.run(policy, inventory, MagicMock(), MagicMock(), MagicMock(),
+        loops=3, hooks=[hook], scheduler=make_scheduler(fake_time))
+    assert runs == {"fast": 3, "slow": 3}
+    assert inventory.sync.call_count == 3
+
+    # an error (here, in the inventory sync) stops everything, and is raised
+    inventory.sync.side_effect = ValueError("sync failed")
+    with pytest.raises(ValueError):
+        PolicyRunner.run(policy, inventory, MagicMock(), MagicMock(), MagicMock(),
+            loops=3, hooks=[hook], scheduler=make_scheduler(fake_time))
+    assert inventory.sync.call_count == 4
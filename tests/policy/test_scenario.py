@@ -241,3 +241,168 @@ def test_acts_mapping_only_waits_once(noop_scenario):
     noop_scenario.act_mapping(items, actions, mapping)
     assert mapping.get("wait").call_count == 1
 
+
+
+def test_compile_property_is_cached(noop_scenario):
+    criterion = {"name": "attr", "value": "a.*"}
+    matcher = noop_scenario.compile_property(criterion)
+    assert noop_scenario.compile_property(dict(criterion)) is matcher
+    dummy = Dummy()
+    dummy.attr = "abc"
+    assert matcher(dummy)
+    dummy.attr = "xyz"
+    assert not matcher(dummy)
+
+
+def test_compile_resolves_filters_and_actions(noop_scenario):
+    noop_scenario.schema = {
+        "filters": [
+            {"property": {"name": "attr", "value": "a.*"}},
+            {"probability": {"probabilityPassAll": 1}},
+        ],
+        "actions": [
+            {"wait": {"seconds": 1}},
+        ],
+    }
+    plan = noop_scenario.compile()
+    assert [step.key for step in plan.filters] == ["property", "probability"]
+    assert plan.filters[0].method == noop_scenario.filter_property
+    assert plan.filters[1].params == {"probabilityPassAll": 1}
+    assert [step.key for step in plan.actions] == ["wait"]
+    assert plan.actions[0].method == noop_scenario.action_wait
+    assert noop_scenario.plan is plan
+
+
+def test_execute_runs_the_plan(monkeypatch, noop_scenario):
+    sleep_mock = MagicMock()
+    monkeypatch.setattr("time.sleep", sleep_mock)
+    a, b = Dummy(), Dummy()
+    a.attr, b.attr = "abc", "xyz"
+    noop_scenario.match = MagicMock(return_value=[a, b])
+    noop_scenario.schema = {
+        "filters": [
+            {"property": {"name": "attr", "value": "a.*"}},
+        ],
+        "actions": [
+            {"wait": {"seconds": 3}},
+        ],
+    }
+    noop_scenario.compile()
+    noop_scenario.filter_property = MagicMock()
+    noop_scenario.execute()
+    # the plan was compiled before the mock, so it still uses the real filter
+    assert not noop_scenario.filter_property.called
+    assert sleep_mock.call_args[0] == (3,)
+
+
+def test_map_parallel_caps_concurrency_and_keeps_order(noop_scenario):
+    import threading
+    import time
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+    def method(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return item * 2
+    results = noop_scenario.map_parallel(method, range(20), 4)
+    assert results == [i * 2 for i in range(20)]
+    assert 1 < peak[0] <= 4
+
+
+def test_run_actions_finishes_a_step_before_the_next(noop_scenario):
+    import threading
+    calls = []
+    lock = threading.Lock()
+    def first(item, params):
+        with lock:
+            calls.append(("first", item))
+    def second(item, params):
+        with lock:
+            calls.append(("second", item))
+    noop_scenario.action_methods = lambda: {"first": first, "second": second}
+    noop_scenario.schema = {
+        "actions": [
+            {"first": {"maxParallel": 5}},
+            {"second": {"maxParallel": 5}},
+        ],
+    }
+    plan = noop_scenario.compile()
+    noop_scenario.run_actions(list(range(10)), plan.actions)
+    assert [step for step, _ in calls] == ["first"] * 10 + ["second"] * 10
+    assert sorted(item for _, item in calls[:10]) == list(range(10))
+
+
+def test_map_parallel_raises_the_first_error(noop_scenario):
+    def method(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+    with pytest.raises(ValueError):
+        noop_scenario.map_parallel(method, range(10), 3)
+
+
+def test_run_actions_counts_outcomes(noop_scenario):
+    from powerfulseal.metrics import ACTIONS
+    def fail(item, params):
+        raise ValueError()
+    noop_scenario.name = "counting scenario"
+    noop_scenario.action_methods = lambda: {"ok": lambda item, params: None, "fail": fail}
+    noop_scenario.schema = {
+        "actions": [
+            {"ok": {}},
+            {"fail": {}},
+        ],
+    }
+    plan = noop_scenario.compile()
+    with pytest.raises(ValueError):
+        noop_scenario.run_actions([1], plan.actions)
+    assert ACTIONS.get(scenario="counting scenario", action="ok", outcome="success") == 1
+    assert ACTIONS.get(scenario="counting scenario", action="fail", outcome="failure") == 1
+
+
+def test_execute_steps_suspends_on_wait(monkeypatch, noop_scenario):
+    sleep_mock = MagicMock()
+    monkeypatch.setattr("time.sleep", sleep_mock)
+    calls = []
+    noop_scenario.match = lambda: [1, 2]
+    noop_scenario.action_methods = lambda: {
+        "wait": noop_scenario.action_wait,
+        "record": lambda item, params: calls.append(item),
+    }
+    noop_scenario.schema = {
+        "actions": [
+            {"record": {}},
+            {"wait": {"seconds": 30}},
+            {"record": {}},
+        ],
+    }
+    noop_scenario.compile()
+    steps = noop_scenario.execute_steps()
+    assert next(steps) == 30
+    assert calls == [1, 2]
+    assert noop_scenario.current_run is not None
+    assert list(steps) == []
+    assert calls == [1, 2, 1, 2]
+    assert [
+        timing.name for timing in noop_scenario.last_run.timings
+        if timing.phase == "action"
+    ] == ["record", "wait", "record"]
+    assert not sleep_mock.called
+    # execute sleeps through the waits
+    noop_scenario.execute()
+    assert sleep_mock.call_args_list == [((30,),)]
+
+
+def test_execute_steps_suspends_on_wrapped_wait(noop_scenario):
+    wrapped = MagicMock(side_effect=noop_scenario.action_wait)
+    noop_scenario.match = lambda: [1]
+    noop_scenario.action_methods = lambda: {"wait": wrapped}
+    noop_scenario.schema = {"actions": [{"wait": {"seconds": 5}}]}
+    noop_scenario.compile()
+    assert list(noop_scenario.execute_steps()) == [5]
+    assert not wrapped.called
@@ -0,0 +1,206 @@
+
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from powerfulseal.policy import Scheduler, IntervalSchedule, CronSchedule
+
+
+def timestamp(*args):
+    return datetime(*args).timestamp()
+
+
+@pytest.mark.parametrize("expression, now, expected", [
+    ("* * * * *", (2018, 1, 1, 10, 0, 30), (2018, 1, 1, 10, 1)),
+    ("*/15 * * * *", (2018, 1, 1, 10, 15), (2018, 1, 1, 10, 30)),
+    ("0 3 * * *", (2018, 1, 1, 10, 0), (2018, 1, 2, 3, 0)),
+    ("30 9-17/4 * * *", (2018, 1, 1, 13, 31), (2018, 1, 1, 17, 30)),
+    ("0 0 1 */3 *", (2018, 2, 10, 0, 0), (2018, 4, 1, 0, 0)),
+    # 2018-01-01 is a monday, 0 and 7 are sunday
+    ("0 12 * * 0", (2018, 1, 1, 0, 0), (2018, 1, 7, 12, 0)),
+    ("0 12 * * 7", (2018, 1, 1, 0, 0), (2018, 1, 7, 12, 0)),
+    ("0 12 * * 1-5", (2018, 1, 5, 13, 0), (2018, 1, 8, 12, 0)),
+    # either the day of month or the day of week
+    ("0 0 15 * 3", (2018, 1, 1, 0, 0), (2018, 1, 3, 0, 0)),
+    ("0 0 29 2 *", (2018, 1, 1, 0, 0), (2020, 2, 29, 0, 0)),
+    ("@daily", (2018, 12, 31, 23, 59), (2019, 1, 1, 0, 0)),
+])
+def test_cron_next_run(expression, now, expected):
+    schedule = CronSchedule(expression)
+    assert schedule.next_run(timestamp(*now)) == timestamp(*expected)
+
+
+@pytest.mark.parametrize("expression", [
+    "* * * *", "60 * * * *", "* 5-2 * * *", "*/0 * * * *", "a * * * *",
+    "0 0 31 2 *",
+])
+def test_cron_rejects_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression).next_run(0)
+
+
+def test_interval_waits_for_the_end_of_the_run():
+    schedule = IntervalSchedule(10, 5, random=lambda a, b: b)
+    assert schedule.first_run(100) == 100
+    assert schedule.next_run(100) is None
+    assert schedule.next_run(100, 130) == 145
+
+
+def test_runs_jobs_independently_with_a_global_cap():
+    scheduler = Scheduler(max_concurrent=2)
+    release = threading.Event()
+    running = []
+    max_running = []
+    lock = threading.Lock()
+
+    def slow():
+        with lock:
+            running.append(1)
+            max_running.append(len(running))
+        release.wait(5)
+        with lock:
+            running.pop()
+
+    fast = MagicMock()
+    for i in range(3):
+        scheduler.add("slow%d" % i, slow, IntervalSchedule(0), max_runs=1)
+    scheduler.add("fast", fast, IntervalSchedule(0), max_runs=1)
+    thread = threading.Thread(target=scheduler.run)
+    thread.start()
+    # the slow jobs take both workers, the others wait for one
+    while len(running) < 2:
+        release.wait(0.01)
+    assert scheduler.active == 2
+    assert not fast.called
+    release.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert fast.call_count == 1
+    assert max(max_running) == 2
+    assert [job.runs for job in scheduler.jobs] == [1, 1, 1, 1]
+
+
+def test_skips_cron_runs_overlapping_with_the_previous_one():
+    now = [timestamp(2018, 1, 1, 10, 0)]
+    scheduler = Scheduler(clock=lambda: now[0])
+    scheduler.executor = MagicMock()
+    job = scheduler.add("job", MagicMock(), CronSchedule("* * * * *"))
+    now[0] += 60
+    scheduler.run_pending()
+    assert job.running
+    assert scheduler.executor.submit.call_count == 1
+    # still running a minute later
+    now[0] += 60
+    assert scheduler.run_pending() == now[0] + 60
+    assert job.skipped == 1
+    assert scheduler.executor.submit.call_count == 1
+    scheduler.run_job(job)
+    assert not job.running
+    now[0] += 60
+    scheduler.run_pending()
+    assert scheduler.executor.submit.call_count == 2
+
+
+def test_stops_on_the_first_error():
+    scheduler = Scheduler(logger=MagicMock())
+    error = Exception("boom")
+    function = MagicMock(side_effect=error)
+    other = MagicMock()
+    job = scheduler.add("job", function, IntervalSchedule(0), max_runs=3)
+    scheduler.add("other", other, IntervalSchedule(3600), max_runs=3,
+        first_run=scheduler.clock() + 3600)
+    with pytest.raises(Exception) as excinfo:
+        scheduler.run()
+    assert excinfo.value is error
+    assert function.call_count == 1
+    assert job.errors == 1
+    assert not other.called
+
+
+def test_stop():
+    scheduler = Scheduler()
+    scheduler.add("job", MagicMock(), IntervalSchedule(3600))
+    thread = threading.Thread(target=scheduler.run)
+    thread.start()
+    scheduler.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_suspended_runs_dont_hold_a_worker():
+    now = [1000]
+    scheduler = Scheduler(max_concurrent=1, clock=lambda: now[0])
+    scheduler.executor = MagicMock()
+    calls = []
+
+    def waiting():
+        calls.append(("waiting", now[0]))
+        yield 300
+        calls.append(("waiting resumed", now[0]))
+
+    waiting_job = scheduler.add("waiting", waiting, IntervalSchedule(60), max_runs=1)
+    other_job = scheduler.add("other", lambda: calls.append(("other", now[0])),
+        IntervalSchedule(60), max_runs=2)
+
+    assert scheduler.run_pending() is None
+    assert scheduler.executor.submit.call_count == 1
+    scheduler.run_job(waiting_job)
+    assert waiting_job.running and waiting_job.resume_at == 1300
+    assert scheduler.active == 0
+
+    # the other job gets the worker while the first one is suspended
+    assert scheduler.run_pending() == 1300
+    scheduler.run_job(other_job)
+    now[0] = 1100
+    assert scheduler.run_pending() == 1300
+    scheduler.run_job(other_job)
+
+    now[0] = 1300
+    assert scheduler.run_pending() is None
+    scheduler.run_job(waiting_job)
+    assert calls == [
+        ("waiting", 1000), ("other", 1000), ("other", 1100),
+        ("waiting resumed", 1300),
+    ]
+    assert not waiting_job.running and waiting_job.runs == 1
+    assert other_job.runs == 2
+
+
+def test_a_suspended_run_due_with_its_next_run_is_resumed_once():
+    now = [timestamp(2018, 1, 1, 10, 0)]
+    scheduler = Scheduler(clock=lambda: now[0])
+    scheduler.executor = MagicMock()
+
+    def waiting():
+        yield 150
+
+    job = scheduler.add("job", waiting, CronSchedule("* * * * *"))
+    now[0] += 60
+    scheduler.run_pending()
+    scheduler.run_job(job)
+    assert job.resume_at == now[0] + 150
+    # the next cron run (due first) and the resume are both due
+    now[0] += 150
+    assert job.next_run < job.resume_at
+    scheduler.run_pending()
+    assert scheduler.executor.submit.call_count == 2
+    assert job.skipped == 1
+    assert job.resume_at is None
+    assert job.next_run > now[0]
+    assert scheduler.active == 1
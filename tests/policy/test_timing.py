@@ -0,0 +1,103 @@
+# Copyright 2017 Bloomberg Finance L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+from unittest.mock import MagicMock
+
+from powerfulseal.policy import ScenarioHook, LoggingHook
+from powerfulseal.policy.scenario import Scenario
+
+
+class NoopScenario(Scenario):
+
+    def match(self):
+        return [1, 2, 3, 4]
+
+    def act(self, items):
+        pass
+
+
+class CollectingHook(ScenarioHook):
+
+    def __init__(self):
+        self.timings = []
+        self.records = []
+
+    def on_timing(self, scenario, record, timing):
+        self.timings.append(timing)
+
+    def on_run(self, scenario, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def scenario():
+    scenario = NoopScenario(name="timed", schema={
+        "filters": [
+            {"randomSample": {"size": 2}},
+        ],
+        "actions": [
+            {"touch": {"maxParallel": 2}},
+            {"wait": {"seconds": 0}},
+        ],
+    })
+    scenario.action_methods = lambda: {
+        "touch": lambda item, params: None,
+        "wait": scenario.action_wait,
+    }
+    return scenario
+
+
+def test_execute_times_each_phase(scenario):
+    hook = CollectingHook()
+    scenario.add_hook(hook)
+    scenario.execute()
+    assert len(hook.records) == 1
+    record = hook.records[0]
+    assert record is scenario.last_run
+    assert record.scenario == "timed"
+    assert record.seconds >= 0
+    phases = [(timing.phase, timing.name) for timing in record.timings
+              if timing.phase != "item"]
+    assert phases == [
+        ("match", "match"),
+        ("filter", "randomSample"),
+        ("action", "touch"),
+        ("action", "wait"),
+    ]
+    assert (record.timings[0].size_in, record.timings[0].size_out) == (None, 4)
+    assert (record.timings[1].size_in, record.timings[1].size_out) == (4, 2)
+    items = [timing for timing in record.timings if timing.phase == "item"]
+    assert len(items) == 2
+    assert hook.timings == record.timings
+    assert record.to_dict()["timings"][0]["phase"] == "match"
+
+
+def test_hooks_get_the_record_when_execute_raises(scenario):
+    hook = CollectingHook()
+    scenario.add_hook(hook)
+    scenario.match = MagicMock(side_effect=ValueError())
+    with pytest.raises(ValueError):
+        scenario.execute()
+    assert len(hook.records) == 1
+    assert hook.records[0].timings[0].phase == "match"
+    assert scenario.current_run is None
+
+
+def test_logging_hook_logs_the_slowest_item(scenario):
+    logger = MagicMock()
+    scenario.add_hook(LoggingHook(logger=logger))
+    scenario.execute()
+    assert "slowest item" in logger.info.call_args[0][0]